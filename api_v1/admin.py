@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Test, Question, Answer, Category, Tag, ReportedIssue, PromptConfiguration
+from .models import Test, Question, Answer, Category, Tag, ReportedIssue, PromptConfiguration, Attempt, AttemptAnswer
 
 # -----------------------------------------------------------------------------
 # Konfiguracja Panelu Administracyjnego
@@ -147,6 +147,24 @@ class ReportedIssueAdmin(admin.ModelAdmin):
     )
 
 
+class AttemptAnswerInline(admin.TabularInline):
+    """Odpowiedzi podejścia (tylko do odczytu)."""
+    model = AttemptAnswer
+    extra = 0
+    can_delete = False
+    fields = ('question_index', 'question', 'selected', 'is_correct', 'user_answer', 'task_id')
+    readonly_fields = fields
+
+
+@admin.register(Attempt)
+class AttemptAdmin(admin.ModelAdmin):
+    """Konfiguracja panelu admina dla modelu Attempt (tylko do odczytu)."""
+    list_display = ('id', 'score', 'max_score', 'created_at')
+    search_fields = ('id', 'session_id')
+    readonly_fields = ('id', 'session_id', 'score', 'max_score', 'created_at')
+    inlines = [AttemptAnswerInline]
+
+
 @admin.register(PromptConfiguration)
 class PromptConfigurationAdmin(admin.ModelAdmin):
     """Konfiguracja panelu admina dla modelu PromptConfiguration."""
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from google.api_core.exceptions import GoogleAPICallError
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Asynchroniczne wywołania modelu oceniającego
+# -----------------------------------------------------------------------------
+#
+# Zadanie oceny prawie cały czas czeka na odpowiedź Gemini, a worker prefork
+# zajmuje na to cały proces. `AsyncGrader` pozwala jednemu procesowi
+# prowadzić wiele zapytań naraz (używa go `grading_batch.flush_pending`,
+# gdy `GRADING_ASYNC_CONCURRENCY > 1`):
+#
+# 1.  **Semafor** ogranicza liczbę zapytań w toku
+#     (`GRADING_ASYNC_CONCURRENCY`).
+#
+# 2.  **Kubełek żetonów** ogranicza tempo zapytań procesu
+#     (`GRADING_RATE_LIMIT` na sekundę, z zapasem `GRADING_RATE_BURST`).
+#
+# 3.  **Ponowienia**: błędy 429 i 5xx ponawiane są do `GRADING_MAX_RETRIES`
+#     razy z wykładniczym opóźnieniem i pełnym losowym rozrzutem, aby
+#     wiele zapytań odrzuconych naraz nie wróciło naraz. Na czas
+#     oczekiwania zapytanie zwalnia miejsce w semaforze.
+#
+# Pętla zdarzeń jest jedna na wątek workera i żyje między zadaniami, bo
+# asynchroniczny klient Gemini jest związany z pętlą, w której powstał.
+#
+# -----------------------------------------------------------------------------
+
+RETRY_MAX_DELAY = 30.0
+
+_state = threading.local()
+
+
+def is_retryable(exc):
+    """Czy błąd API jest przejściowy (429 - limit zapytań, 5xx - błąd serwera)."""
+    code = getattr(exc, 'code', None) if isinstance(exc, GoogleAPICallError) else None
+    return isinstance(code, int) and (code == 429 or code >= 500)
+
+
+def backoff_delay(attempt, base_delay, max_delay=RETRY_MAX_DELAY):
+    """Opóźnienie przed ponowieniem numer `attempt` (od 0), z pełnym rozrzutem."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class TokenBucket:
+    """Kubełek żetonów: średnio `rate` pozwoleń na sekundę, najwyżej `capacity` naraz."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class AsyncGrader:
+    """Wysyła prompty do modelu z limitem współbieżności, tempa i ponowieniami."""
+
+    def __init__(self, model, concurrency, rate=0, burst=1, max_retries=3, base_delay=0.5):
+        self.model = model
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._semaphore = None
+
+    @classmethod
+    def from_settings(cls, model):
+        return cls(
+            model,
+            concurrency=settings.GRADING_ASYNC_CONCURRENCY,
+            rate=settings.GRADING_RATE_LIMIT,
+            burst=settings.GRADING_RATE_BURST,
+            max_retries=settings.GRADING_MAX_RETRIES,
+            base_delay=settings.GRADING_RETRY_BASE_DELAY,
+        )
+
+    async def _call(self, prompt):
+        if hasattr(self.model, 'generate_content_async'):
+            return await self.model.generate_content_async(prompt)
+        return await asyncio.to_thread(self.model.generate_content, prompt)
+
+    async def generate(self, prompt):
+        """Zwraca tekst odpowiedzi modelu; błąd po wyczerpaniu ponowień jest zgłaszany dalej."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                if self.bucket is not None:
+                    await self.bucket.acquire()
+                try:
+                    return (await self._call(prompt)).text
+                except Exception as exc:
+                    if attempt >= self.max_retries or not is_retryable(exc):
+                        raise
+                    error = exc
+            delay = backoff_delay(attempt, self.base_delay)
+            logger.warning("Błąd przejściowy API AI (%s), ponowienie %d za %.2f s.", error, attempt + 1, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def get_grader(model):
+    """
+    Zwraca `AsyncGrader` dla modelu, wspólny dla kolejnych zadań w wątku
+    workera - limit tempa obowiązuje więc między zadaniami, nie tylko w nich.
+    """
+    grader = getattr(_state, 'grader', None)
+    if grader is None or grader.model is not model:
+        grader = _state.grader = AsyncGrader.from_settings(model)
+    return grader
+
+
+def run(coro):
+    """Wykonuje korutynę w trwałej pętli zdarzeń bieżącego wątku."""
+    loop = getattr(_state, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = _state.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(coro)
@@ -0,0 +1,299 @@
+import json
+import logging
+import os
+import socket
+import threading
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Attempt, AttemptAnswer, Question
+from .tasks import flush_attempt_log
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Zapis podejść z opóźnieniem (write-behind)
+# -----------------------------------------------------------------------------
+#
+# Zapis podejścia (jeden wiersz `Attempt` i kilkadziesiąt `AttemptAnswer`)
+# bezpośrednio w żądaniu dokładałby zapytania do bazy na gorącej ścieżce,
+# akurat w szczycie egzaminu. Zamiast tego:
+#
+# 1.  `/score_attempt/` dopisuje podejście (z nadanym już `id`) do strumienia
+#     Redis (XADD) i dopiero wtedy odpowiada klientowi. Potwierdzone
+#     podejście jest więc zapisane w Redisie.
+#
+# 2.  Zadanie Celery `flush_attempt_log` (planowane jak przy ocenie
+#     zbiorczej: po `ATTEMPT_LOG_WINDOW` sekundach albo od razu po
+#     `ATTEMPT_LOG_BATCH_SIZE` wpisach) czyta strumień w grupie konsumentów
+#     i zapisuje partie jednym `bulk_create` na tabelę, w jednej transakcji.
+#     Oba sposoby planowania chronią flagi SET NX, więc przy pełnej partii
+#     nie kolejkujemy osobnego zadania na każde żądanie.
+#
+# 3.  Wpisy potwierdzane są w strumieniu (XACK + XDEL) dopiero po zatwierdzeniu
+#     transakcji. Jeśli worker padnie wcześniej, wpisy zostają w grupie
+#     jako nieobsłużone i po `ATTEMPT_LOG_CLAIM_IDLE` sekundach przejmuje je
+#     kolejny konsument (XAUTOCLAIM). Ponowny zapis jest bezpieczny: `id`
+#     podejść nadawane są z góry, a `bulk_create` pomija istniejące wiersze.
+#
+# 4.  Gdy zapis partii się nie uda, podejścia zapisywane są pojedynczo, aby
+#     jedno błędne nie blokowało pozostałych. Wpis, którego nie udało się
+#     zapisać po `ATTEMPT_LOG_MAX_DELIVERIES` dostarczeniach (licznik
+#     z XPENDING), trafia do strumienia błędnych wpisów (`DEAD_KEY`) zamiast
+#     wracać bez końca. Gdy nie uda się zapisać żadnego podejścia (np. baza
+#     jest niedostępna), błąd jest zgłaszany, a wpisy czekają na przejęcie.
+#
+# Bez Redisa (development, testy) oraz gdy zapis do strumienia się nie uda,
+# podejście zapisywane jest w bazie od razu. Strumień jest jedyną kopią
+# podejść do czasu zapisu, więc Redis musi mieć włączony AOF i trwały wolumen
+# (patrz `docker-compose.yml`), a strumień - bazę oddzieloną od cache.
+#
+# -----------------------------------------------------------------------------
+
+
+class RedisAttemptStream:
+    """Strumień podejść czekających na zapis, z grupą konsumentów."""
+
+    STREAM_KEY = 'attempt_log:stream'
+    GROUP = 'attempt-writers'
+    FLUSH_KEY = 'attempt_log:flush_scheduled'
+    FLUSH_NOW_KEY = 'attempt_log:flush_now'
+    DEAD_KEY = 'attempt_log:dead'
+
+    def __init__(self, client):
+        self._client = client
+        self._group_ready = False
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+
+        return cls(redis.Redis.from_url(url))
+
+    def append(self, record):
+        """Dopisuje podejście do strumienia i zwraca liczbę czekających wpisów."""
+        pipe = self._client.pipeline(transaction=False)
+        pipe.xadd(self.STREAM_KEY, {'data': json.dumps(record)})
+        pipe.xlen(self.STREAM_KEY)
+        _, length = pipe.execute()
+        return length
+
+    def _ensure_group(self):
+        if self._group_ready:
+            return
+        import redis
+
+        try:
+            self._client.xgroup_create(self.STREAM_KEY, self.GROUP, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        self._group_ready = True
+
+    def read(self, consumer, count, min_idle_ms):
+        """
+        Zwraca do `count` wpisów `(id, podejście)`: najpierw przejęte od
+        konsumentów, którzy ich nie potwierdzili przez `min_idle_ms`, potem nowe.
+        """
+        self._ensure_group()
+        _, messages, *_ = self._client.xautoclaim(
+            self.STREAM_KEY, self.GROUP, consumer, min_idle_time=min_idle_ms, start_id='0-0', count=count,
+        )
+        if not messages:
+            response = self._client.xreadgroup(self.GROUP, consumer, {self.STREAM_KEY: '>'}, count=count)
+            messages = response[0][1] if response else []
+        return [(message_id, json.loads(fields[b'data'])) for message_id, fields in messages if fields]
+
+    def ack(self, message_ids):
+        if not message_ids:
+            return
+        pipe = self._client.pipeline(transaction=True)
+        pipe.xack(self.STREAM_KEY, self.GROUP, *message_ids)
+        pipe.xdel(self.STREAM_KEY, *message_ids)
+        pipe.execute()
+
+    def delivery_count(self, message_id):
+        """Liczba dostarczeń niepotwierdzonego wpisu (0, gdy nie czeka)."""
+        pending = self._client.xpending_range(self.STREAM_KEY, self.GROUP, min=message_id, max=message_id, count=1)
+        return pending[0]['times_delivered'] if pending else 0
+
+    def dead_letter(self, message_id, record, error):
+        """Przenosi wpis do strumienia błędnych wpisów i potwierdza go."""
+        pipe = self._client.pipeline(transaction=True)
+        pipe.xadd(self.DEAD_KEY, {'data': json.dumps(record), 'error': error})
+        pipe.xack(self.STREAM_KEY, self.GROUP, message_id)
+        pipe.xdel(self.STREAM_KEY, message_id)
+        pipe.execute()
+
+    def schedule_flush(self, window):
+        # Flaga wygasa sama, gdyby zaplanowane zadanie nigdy się nie wykonało.
+        return bool(self._client.set(self.FLUSH_KEY, 1, nx=True, px=int(window * 1000) + 60000))
+
+    def schedule_flush_now(self):
+        # Jedno natychmiastowe zadanie na pełną partię, a nie jedno na żądanie.
+        return bool(self._client.set(self.FLUSH_NOW_KEY, 1, nx=True, px=60000))
+
+    def clear_flush(self):
+        pipe = self._client.pipeline(transaction=False)
+        pipe.delete(self.FLUSH_KEY)
+        pipe.delete(self.FLUSH_NOW_KEY)
+        pipe.execute()
+
+
+_stream = None
+_stream_lock = threading.Lock()
+
+
+def get_attempt_stream():
+    """Strumień podejść albo None, gdy nie skonfigurowano Redisa."""
+    global _stream
+    if _stream is None and settings.ATTEMPT_LOG_REDIS_URL:
+        with _stream_lock:
+            if _stream is None:
+                _stream = RedisAttemptStream.from_url(settings.ATTEMPT_LOG_REDIS_URL)
+    return _stream
+
+
+def reset_attempt_stream(stream=None):
+    """Ustawia (lub zapomina) strumień podejść, np. w testach."""
+    global _stream
+    _stream = stream
+
+
+def build_attempt_record(session_id, score, max_score, answers):
+    """
+    Rekord podejścia do zapisu. `answers` to słowniki z kluczami
+    `question_id`, `question_index` oraz `selected` i `is_correct` (pytania
+    zamknięte) albo `user_answer` i `task_id` (pytania otwarte).
+    """
+    return {
+        'id': str(uuid.uuid4()),
+        'session_id': session_id,
+        'score': score,
+        'max_score': max_score,
+        'created_at': timezone.now().isoformat(),
+        'answers': answers,
+    }
+
+
+def record_attempt(record):
+    """
+    Przyjmuje podejście do zapisu: dopisuje je do strumienia i w razie
+    potrzeby planuje `flush_attempt_log`, a bez Redisa zapisuje je od razu.
+    """
+    stream = get_attempt_stream()
+    if stream is not None:
+        try:
+            pending = stream.append(record)
+        except Exception:
+            logger.warning("Nie udało się dopisać podejścia do strumienia - zapis bezpośredni.", exc_info=True)
+        else:
+            if pending >= settings.ATTEMPT_LOG_BATCH_SIZE:
+                if stream.schedule_flush_now():
+                    flush_attempt_log.delay()
+            elif stream.schedule_flush(settings.ATTEMPT_LOG_WINDOW):
+                flush_attempt_log.apply_async(countdown=settings.ATTEMPT_LOG_WINDOW)
+            return
+    write_attempts([record])
+
+
+def write_attempts(records):
+    """Zapisuje podejścia jednym `bulk_create` na tabelę, w jednej transakcji."""
+    # Pytania usunięte przed zapisem zapisujemy jako puste odwołanie, aby
+    # jedno z nich nie blokowało zapisu całej partii.
+    question_ids = {answer['question_id'] for record in records for answer in record['answers']}
+    existing = {str(question_id) for question_id in Question.objects.filter(id__in=question_ids).values_list('id', flat=True)}
+
+    attempts = []
+    answers = []
+    for record in records:
+        attempts.append(Attempt(
+            id=record['id'],
+            session_id=record['session_id'],
+            score=record['score'],
+            max_score=record['max_score'],
+            created_at=parse_datetime(record['created_at']),
+        ))
+        answers.extend(
+            AttemptAnswer(
+                attempt_id=record['id'],
+                question_id=answer['question_id'] if answer['question_id'] in existing else None,
+                question_index=answer['question_index'],
+                selected=answer.get('selected'),
+                user_answer=answer.get('user_answer'),
+                is_correct=answer.get('is_correct'),
+                task_id=answer.get('task_id'),
+            )
+            for answer in record['answers']
+        )
+    # Wpisy mogą wrócić po awarii workera przed potwierdzeniem - istniejące
+    # wiersze (ten sam `id` lub para podejście/indeks pytania) są pomijane.
+    with transaction.atomic():
+        Attempt.objects.bulk_create(attempts, batch_size=1000, ignore_conflicts=True)
+        AttemptAnswer.objects.bulk_create(answers, batch_size=1000, ignore_conflicts=True)
+
+
+def consumer_name():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def drain_attempt_log(stream=None, max_batches=None):
+    """
+    Zapisuje w bazie podejścia czekające w strumieniu, partiami po
+    `ATTEMPT_LOG_BATCH_SIZE`. Zwraca liczbę zapisanych podejść.
+    """
+    stream = stream or get_attempt_stream()
+    if stream is None:
+        return 0
+    # Flagę zdejmujemy przed odczytem, aby podejścia dopisane w trakcie
+    # opróżniania zaplanowały kolejne zadanie.
+    stream.clear_flush()
+    consumer = consumer_name()
+    written = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        messages = stream.read(consumer, settings.ATTEMPT_LOG_BATCH_SIZE, int(settings.ATTEMPT_LOG_CLAIM_IDLE * 1000))
+        if not messages:
+            break
+        try:
+            write_attempts([record for _, record in messages])
+        except Exception:
+            logger.warning("Zapis partii podejść nie powiódł się - zapis pojedynczo.", exc_info=True)
+            written += write_one_by_one(stream, messages)
+        else:
+            stream.ack([message_id for message_id, _ in messages])
+            written += len(messages)
+        batches += 1
+    return written
+
+
+def write_one_by_one(stream, messages):
+    """
+    Zapisuje podejścia z partii pojedynczo i potwierdza zapisane. Wpisy
+    odrzucane po `ATTEMPT_LOG_MAX_DELIVERIES` dostarczeniach przenosi do
+    strumienia błędnych wpisów. Gdy nic nie udało się zapisać ani przenieść,
+    zgłasza ostatni błąd. Zwraca liczbę zapisanych podejść.
+    """
+    written = []
+    handled = 0
+    error = None
+    for message_id, record in messages:
+        try:
+            write_attempts([record])
+        except Exception as e:
+            error = e
+            if stream.delivery_count(message_id) >= settings.ATTEMPT_LOG_MAX_DELIVERIES:
+                logger.error("Podejście %s odrzucone po %d próbach zapisu - przeniesione do %s.",
+                             record.get('id'), settings.ATTEMPT_LOG_MAX_DELIVERIES, stream.DEAD_KEY, exc_info=True)
+                stream.dead_letter(message_id, record, repr(e))
+                handled += 1
+        else:
+            written.append(message_id)
+    stream.ack(written)
+    if error is not None and not written and not handled:
+        raise error
+    return len(written)
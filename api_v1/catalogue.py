@@ -0,0 +1,80 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .models import CatalogueVersion
+
+# -----------------------------------------------------------------------------
+# Wersja katalogu testów
+# -----------------------------------------------------------------------------
+#
+# Lista testów (`TestListView`) zmienia się tylko przy imporcie lub edycji
+# danych w panelu admina, a jej wyliczenie wymaga agregacji po wszystkich
+# pytaniach. Dlatego odpowiedź trzymamy w cache pod kluczem zawierającym
+# numer wersji katalogu:
+#
+# 1.  **Numer wersji** żyje w bazie danych (`CatalogueVersion`), więc widzą
+#     go wszystkie procesy: gunicorn, workery Celery i komendy zarządzające
+#     (import, budowa migawki). Sygnały podbijają go przy każdej zmianie
+#     testów, pytań, kategorii lub tagów (patrz `signals.py`). Stare wpisy
+#     po prostu przestają być odczytywane.
+#
+# 2.  **Kopia w cache**: Odczyt na gorącej ścieżce trafia do cache, gdzie
+#     numer leży najwyżej `CATALOGUE_VERSION_TIMEOUT` sekund. Podbicie od razu
+#     nadpisuje kopię w cache; procesy bez współdzielonego cache (LocMem)
+#     widzą zmianę z innego procesu najpóźniej po tym czasie.
+#
+# 3.  **ETag**: Numer wersji jest jednocześnie ETagiem odpowiedzi, więc
+#     klient z aktualnym katalogiem dostaje 304 bez żadnej pracy po stronie
+#     bazy danych.
+#
+# -----------------------------------------------------------------------------
+
+CATALOGUE_VERSION_KEY = 'catalogue_version'
+TEST_LIST_CACHE_KEY = 'test_list:{version}'
+
+
+def get_catalogue_version():
+    """Zwraca bieżący numer wersji katalogu (z cache, a w razie braku z bazy)."""
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        version = read_catalogue_version()
+        cache.set(CATALOGUE_VERSION_KEY, version, timeout=settings.CATALOGUE_VERSION_TIMEOUT)
+    return version
+
+
+def read_catalogue_version():
+    """
+    Odczytuje numer wersji z bazy. Brakujący wiersz jest inicjowany
+    znacznikiem czasu, aby nie powtórzyć wersji, pod którą mogą jeszcze leżeć
+    stare odpowiedzi w cache.
+    """
+    row, _ = CatalogueVersion.objects.get_or_create(id=1, defaults={'value': time.time_ns() // 1000})
+    return row.value
+
+
+def bump_catalogue_version():
+    """Podbija numer wersji katalogu, unieważniając odpowiedzi w cache."""
+    # Nowa wersja to co najmniej bieżący znacznik czasu, więc nie powtarza
+    # się nawet po odtworzeniu bazy z kopii przy zachowanym cache.
+    now = time.time_ns() // 1000
+    if not CatalogueVersion.objects.filter(id=1).update(value=Greatest(F('value') + 1, Value(now))):
+        CatalogueVersion.objects.get_or_create(id=1, defaults={'value': now})
+    version = CatalogueVersion.objects.values_list('value', flat=True).get(id=1)
+    cache.set(CATALOGUE_VERSION_KEY, version, timeout=settings.CATALOGUE_VERSION_TIMEOUT)
+    return version
+
+
+def catalogue_etag(version):
+    return f'"catalogue-{version}"'
+
+
+def get_cached_test_list(version):
+    return cache.get(TEST_LIST_CACHE_KEY.format(version=version))
+
+
+def set_cached_test_list(version, data):
+    cache.set(TEST_LIST_CACHE_KEY.format(version=version), data, timeout=settings.CATALOGUE_CACHE_TIMEOUT)
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import re
+import threading
+import time
+
+# -----------------------------------------------------------------------------
+# Lokalny zamiennik modelu Gemini
+# -----------------------------------------------------------------------------
+#
+# Udaje `genai.GenerativeModel` na potrzeby benchmarków i testów: odpowiada
+# po zadanym opóźnieniu (stały koszt wywołania + koszt każdej ocenianej
+# odpowiedzi), rozpoznaje prompty zbiorcze (`grading_batch.py`), liczy
+# wywołania i równoległe zapytania w toku. Włączany w workerach
+# ustawieniem `GRADING_FAKE_MODEL`.
+#
+# -----------------------------------------------------------------------------
+
+_BATCH_ITEM_RE = re.compile(r'<<ODPOWIEDŹ (\d+) [0-9a-f]+>>')
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Model zwracający zawsze poprawny JSON oceny. `latency` to koszt jednego
+    wywołania (w sekundach), a `per_item_latency` - koszt każdej odpowiedzi
+    w prompcie zbiorczym. Wyjątki z `errors` zgłaszane są po kolei przez
+    pierwsze wywołania (np. symulacja błędów 429/503).
+    """
+
+    def __init__(self, latency=0.05, per_item_latency=0.005, score=1, errors=()):
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.score = score
+        self.errors = list(errors)
+        self.calls = 0
+        self.graded_items = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _grade(self, item_id=None):
+        grade = {"score": self.score, "feedback": "Ocena testowa."}
+        if item_id is not None:
+            grade = {"id": item_id, **grade}
+        return grade
+
+    def _start(self, prompt):
+        """Rejestruje wywołanie; zwraca czas odpowiedzi i jej treść."""
+        item_ids = [int(item_id) for item_id in _BATCH_ITEM_RE.findall(prompt)]
+        items = len(item_ids) or 1
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            error = self.errors.pop(0) if self.errors else None
+            if error is None:
+                self.graded_items += items
+        if error is not None:
+            self._finish()
+            raise error
+        if item_ids:
+            text = json.dumps([self._grade(item_id) for item_id in item_ids])
+        else:
+            text = json.dumps(self._grade())
+        return self.latency + self.per_item_latency * items, FakeResponse(text)
+
+    def _finish(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def generate_content(self, prompt):
+        delay, response = self._start(prompt)
+        try:
+            time.sleep(delay)
+            return response
+        finally:
+            self._finish()
+
+    async def generate_content_async(self, prompt):
+        delay, response = self._start(prompt)
+        try:
+            await asyncio.sleep(delay)
+            return response
+        finally:
+            self._finish()
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import PromptConfiguration
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Cache wyników oceny odpowiedzi otwartych
+# -----------------------------------------------------------------------------
+#
+# W klasie wielu uczniów wysyła niemal identyczne, krótkie odpowiedzi na to
+# samo pytanie, a każda z nich trafiała do Gemini. Wynik oceny zapisujemy
+# pod skrótem z:
+#
+#   - znormalizowanej odpowiedzi (wielkość liter, białe znaki, końcowa
+#     interpunkcja nie mają znaczenia),
+#   - treści pytania, kryteriów oceny i maksymalnej liczby punktów,
+#   - wersji aktywnego promptu (zmiana promptu = nowe klucze).
+#
+# W produkcji cache trzymany jest w Redisie: każdy wpis ma TTL, a zbiór
+# posortowany po czasie ostatniego użycia pozwala usuwać najdawniej używane
+# wpisy po przekroczeniu limitu (LRU). Bez Redisa (development, testy)
+# używamy ograniczonego słownika w pamięci procesu.
+#
+# -----------------------------------------------------------------------------
+
+PROMPT_VERSION_CACHE_KEY = 'grading_prompt_version'
+
+_TRAILING_PUNCTUATION = '.,;:!?…'
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_answer(text):
+    """Sprowadza odpowiedź do postaci kanonicznej używanej w kluczu cache."""
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    text = _WHITESPACE_RE.sub(' ', text).strip()
+    return text.rstrip(_TRAILING_PUNCTUATION + ' ')
+
+
+def grading_cache_key(user_answer, question_text, grading_criteria, max_points, prompt_version):
+    """Skrót SHA-256 wszystkich danych, od których zależy wynik oceny."""
+    payload = json.dumps(
+        [normalize_answer(user_answer), question_text, grading_criteria, str(max_points), prompt_version],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def prompt_version(prompt_config):
+    """Wersja promptu: jego ID i skrót treści szablonu."""
+    digest = hashlib.sha256(prompt_config.prompt_text.encode('utf-8')).hexdigest()[:16]
+    return f"{prompt_config.pk}:{digest}"
+
+
+def get_active_prompt_version():
+    """
+    Zwraca wersję aktywnego promptu (None, gdy go brak). Wartość trzymana
+    jest w cache najwyżej `GRADING_PROMPT_VERSION_TIMEOUT` sekund i usuwana
+    sygnałem przy zmianie promptów. Bez współdzielonego cache sygnał czyści
+    tylko kopię procesu, który zapisał prompt - pozostałe (np. workery
+    Celery) czytają nową wersję z bazy po wygaśnięciu swojej kopii.
+    """
+    version = cache.get(PROMPT_VERSION_CACHE_KEY)
+    if version is None:
+        prompt_config = PromptConfiguration.objects.filter(is_active=True).first()
+        version = prompt_version(prompt_config) if prompt_config else ''
+        cache.set(PROMPT_VERSION_CACHE_KEY, version, timeout=settings.GRADING_PROMPT_VERSION_TIMEOUT)
+    return version or None
+
+
+def invalidate_prompt_version():
+    cache.delete(PROMPT_VERSION_CACHE_KEY)
+
+
+class LocalGradingCache:
+    """Cache LRU z TTL w pamięci procesu (development i testy)."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._metrics = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._metrics['hits'] += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self._metrics['misses'] += 1
+            return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._metrics['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._metrics, entries=len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._metrics = dict.fromkeys(self._metrics, 0)
+
+
+class RedisGradingCache:
+    """
+    Cache LRU z TTL w Redisie. Odczyt (z odświeżeniem pozycji LRU
+    i licznikiem trafień) oraz zapis (z usunięciem nadmiarowych wpisów)
+    to pojedyncze skrypty Lua, czyli jedno zapytanie do Redisa każdy.
+    """
+
+    ENTRY_KEY = 'grading_cache:entry:{key}'
+    LRU_KEY = 'grading_cache:lru'
+    METRICS_KEY = 'grading_cache:metrics'
+
+    GET_SCRIPT = """
+    local value = redis.call('GET', KEYS[1])
+    if value then
+        redis.call('ZADD', KEYS[2], ARGV[1], ARGV[2])
+        redis.call('HINCRBY', KEYS[3], 'hits', 1)
+    else
+        redis.call('ZREM', KEYS[2], ARGV[2])
+        redis.call('HINCRBY', KEYS[3], 'misses', 1)
+    end
+    return value
+    """
+
+    SET_SCRIPT = """
+    redis.call('SET', KEYS[1], ARGV[3], 'EX', ARGV[4])
+    redis.call('ZADD', KEYS[2], ARGV[1], ARGV[2])
+    local excess = redis.call('ZCARD', KEYS[2]) - tonumber(ARGV[5])
+    if excess > 0 then
+        local evicted = redis.call('ZPOPMIN', KEYS[2], excess)
+        for i = 1, #evicted, 2 do
+            redis.call('DEL', ARGV[6] .. evicted[i])
+        end
+        redis.call('HINCRBY', KEYS[3], 'evictions', excess)
+    end
+    return excess
+    """
+
+    def __init__(self, url, ttl, max_entries):
+        import redis
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._client = redis.Redis.from_url(url)
+        self._get = self._client.register_script(self.GET_SCRIPT)
+        self._set = self._client.register_script(self.SET_SCRIPT)
+        self._entry_prefix = self.ENTRY_KEY.format(key='')
+
+    def get(self, key):
+        raw = self._get(keys=[self.ENTRY_KEY.format(key=key), self.LRU_KEY, self.METRICS_KEY], args=[time.time(), key])
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        self._set(
+            keys=[self.ENTRY_KEY.format(key=key), self.LRU_KEY, self.METRICS_KEY],
+            args=[time.time(), key, json.dumps(value), self.ttl, self.max_entries, self._entry_prefix],
+        )
+
+    def stats(self):
+        pipe = self._client.pipeline(transaction=False)
+        pipe.hgetall(self.METRICS_KEY)
+        pipe.zcard(self.LRU_KEY)
+        metrics, entries = pipe.execute()
+        stats = {name: int(metrics.get(name.encode(), 0)) for name in ('hits', 'misses', 'evictions')}
+        stats['entries'] = entries
+        return stats
+
+    def clear(self):
+        keys = [self.ENTRY_KEY.format(key=key.decode()) for key in self._client.zrange(self.LRU_KEY, 0, -1)]
+        self._client.delete(self.LRU_KEY, self.METRICS_KEY, *keys)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_grading_cache():
+    """
+    Zwraca backend cache ocen (Redis, gdy ustawiono `GRADING_CACHE_REDIS_URL`,
+    w przeciwnym razie pamięć procesu) albo None, gdy cache jest wyłączony
+    (`GRADING_CACHE_TTL = 0`).
+    """
+    global _backend
+    if settings.GRADING_CACHE_TTL <= 0:
+        return None
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if settings.GRADING_CACHE_REDIS_URL:
+                    _backend = RedisGradingCache(settings.GRADING_CACHE_REDIS_URL, settings.GRADING_CACHE_TTL, settings.GRADING_CACHE_MAX_ENTRIES)
+                else:
+                    _backend = LocalGradingCache(settings.GRADING_CACHE_TTL, settings.GRADING_CACHE_MAX_ENTRIES)
+    return _backend
+
+
+def reset_grading_cache():
+    """Zapomina wybrany backend (np. po zmianie ustawień w testach)."""
+    global _backend
+    _backend = None
+
+
+def get_cached_grade(key):
+    """
+    Zwraca zapisany wynik oceny albo None. Błąd cache nigdy nie blokuje
+    oceniania - traktujemy go jak brak trafienia.
+    """
+    backend = get_grading_cache()
+    if backend is None:
+        return None
+    try:
+        return backend.get(key)
+    except Exception:
+        logger.warning("Nie udało się odczytać cache ocen.", exc_info=True)
+        return None
+
+
+def store_grade(key, result):
+    backend = get_grading_cache()
+    if backend is None:
+        return
+    try:
+        backend.set(key, result)
+    except Exception:
+        logger.warning("Nie udało się zapisać wyniku oceny w cache.", exc_info=True)
+
+
+def grading_cache_stats():
+    """Liczniki cache ocen wraz ze współczynnikiem trafień."""
+    backend = get_grading_cache()
+    if backend is None:
+        return {'enabled': False}
+    stats = backend.stats()
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    stats['enabled'] = True
+    return stats
@@ -0,0 +1,187 @@
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from celery.signals import before_task_publish, task_prerun, task_postrun, worker_process_shutdown
+from django.conf import settings
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Telemetria oceniania AI
+# -----------------------------------------------------------------------------
+#
+# Ocena odpowiedzi przechodzi przez kolejkę Celery i model Gemini, a do tej
+# pory logowane były tylko wyjątki. Mierzymy:
+#
+# 1.  **Czekanie w kolejce**: `before_task_publish` dopisuje do nagłówków
+#     zadania czas wysłania (`enqueued_at`), a `task_prerun` liczy czas do
+#     startu zadania (dla zadań z `countdown` - od zaplanowanego `eta`).
+#     Odpowiedzi oceniane zbiorczo mierzone są od wpisania do kolejki
+#     oczekujących do zdjęcia jej przez `flush_grading_batch`.
+#
+# 2.  **Etapy oceny** (`span`): budowa promptu, wywołanie modelu oraz
+#     dekodowanie i walidacja odpowiedzi, osobno dla oceny pojedynczej
+#     (`single`) i zbiorczej (`batch`). Każdy etap trafia do histogramu
+#     i do logu (poziom DEBUG, pola w `extra`).
+#
+# 3.  **Błędy**: liczniki nieudanych wywołań modelu i odpowiedzi, których
+#     nie dało się zdekodować (`invalid_json`) lub które nie mają wymaganych
+#     kluczy (`missing_keys`, `missing_grade` dla pominiętej odpowiedzi
+#     z partii).
+#
+# Workery nie mają serwera HTTP, więc przy ustawionym `GRADING_METRICS_DIR`
+# każdy proces workera zapisuje swoje metryki (z etykietą `worker`) do
+# pliku `celery-<host>-<pid>.prom` dla kolektora plików tekstowych
+# (np. node_exporter `--collector.textfile.directory`), najczęściej co
+# `GRADING_METRICS_INTERVAL` sekund. Czas czekania w kolejce porównuje
+# zegary procesu web i workera, więc wymaga synchronizacji czasu (NTP).
+#
+# -----------------------------------------------------------------------------
+
+STAGE_PROMPT = 'prompt_build'
+STAGE_MODEL = 'model_call'
+STAGE_PARSE = 'parse'
+
+MODE_SINGLE = 'single'
+MODE_BATCH = 'batch'
+
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+MODEL_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0)
+
+TASK_QUEUE_WAIT = REGISTRY.histogram('celery_task_queue_wait_seconds', 'Czas od wysłania zadania do jego startu.', ('task',), WAIT_BUCKETS)
+TASK_DURATION = REGISTRY.histogram('celery_task_duration_seconds', 'Czas wykonania zadania Celery.', ('task',), MODEL_BUCKETS)
+TASKS = REGISTRY.counter('celery_tasks', 'Liczba wykonanych zadań Celery.', ('task', 'state'))
+PENDING_WAIT = REGISTRY.histogram('grading_pending_wait_seconds', 'Czas czekania odpowiedzi w kolejce oceny zbiorczej.', (), WAIT_BUCKETS)
+STAGE_DURATION = REGISTRY.histogram('grading_stage_duration_seconds', 'Czas etapu oceny odpowiedzi.', ('stage', 'mode'), MODEL_BUCKETS)
+MODEL_ERRORS = REGISTRY.counter('grading_model_errors', 'Liczba nieudanych wywołań modelu.', ('mode', 'error'))
+PARSE_FAILURES = REGISTRY.counter('grading_parse_failures', 'Liczba odpowiedzi modelu, których nie dało się użyć.', ('mode', 'reason'))
+
+ENQUEUED_AT_HEADER = 'enqueued_at'
+
+
+@contextmanager
+def span(stage, mode=MODE_SINGLE, **fields):
+    """Mierzy etap oceny: histogram `grading_stage_duration_seconds` i log DEBUG."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_DURATION.observe(duration, stage, mode)
+        logger.debug(
+            "Etap oceny %s (%s): %.1f ms", stage, mode, duration * 1000,
+            extra={'grading_stage': stage, 'grading_mode': mode, 'duration_ms': duration * 1000, **fields},
+        )
+
+
+@contextmanager
+def model_call(mode=MODE_SINGLE, **fields):
+    """`span` wywołania modelu, zliczający nieudane wywołania według typu wyjątku."""
+    try:
+        with span(STAGE_MODEL, mode, **fields):
+            yield
+    except Exception as e:
+        MODEL_ERRORS.inc(mode, type(e).__name__)
+        raise
+
+
+def record_parse_failure(mode, reason, amount=1):
+    PARSE_FAILURES.inc(mode, reason, amount=amount)
+
+
+def record_pending_wait(items, now=None):
+    """Czas czekania odpowiedzi zdjętych z kolejki oceny zbiorczej."""
+    now = time.time() if now is None else now
+    for item in items:
+        enqueued_at = item.get('enqueued_at')
+        if enqueued_at is not None:
+            PENDING_WAIT.observe(max(now - enqueued_at, 0.0))
+
+
+# --- Sygnały Celery ---
+
+_task_starts = threading.local()
+
+
+@before_task_publish.connect
+def stamp_enqueue_time(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+
+def queue_wait(request, now=None):
+    """Czas czekania zadania w kolejce (od wysłania lub `eta`) albo None."""
+    enqueued_at = getattr(request, ENQUEUED_AT_HEADER, None)
+    if enqueued_at is None:
+        return None
+    now = time.time() if now is None else now
+    ready_at = float(enqueued_at)
+    eta = getattr(request, 'eta', None)
+    if eta:
+        eta = datetime.fromisoformat(eta) if isinstance(eta, str) else eta
+        ready_at = max(ready_at, eta.timestamp())
+    return max(now - ready_at, 0.0)
+
+
+@task_prerun.connect
+def task_started(task_id=None, task=None, **kwargs):
+    wait = queue_wait(task.request)
+    if wait is not None:
+        TASK_QUEUE_WAIT.observe(wait, task.name)
+    _task_starts.__dict__[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def task_finished(task_id=None, task=None, state=None, **kwargs):
+    start = _task_starts.__dict__.pop(task_id, None)
+    if start is not None:
+        TASK_DURATION.observe(time.perf_counter() - start, task.name)
+    TASKS.inc(task.name, state or 'UNKNOWN')
+    maybe_write_textfile()
+
+
+# --- Eksport do pliku tekstowego ---
+
+_last_write = {'time': 0.0}
+
+
+def worker_label():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def textfile_path():
+    return os.path.join(settings.GRADING_METRICS_DIR, f'celery-{worker_label()}.prom')
+
+
+def write_textfile():
+    REGISTRY.write_textfile(textfile_path(), {'worker': worker_label()})
+    _last_write['time'] = time.monotonic()
+
+
+def maybe_write_textfile():
+    """Zapisuje metryki procesu, jeśli od ostatniego zapisu minęło `GRADING_METRICS_INTERVAL`."""
+    if not settings.GRADING_METRICS_DIR:
+        return
+    if time.monotonic() - _last_write['time'] < settings.GRADING_METRICS_INTERVAL:
+        return
+    try:
+        write_textfile()
+    except OSError:
+        logger.warning("Nie udało się zapisać metryk workera do pliku.", exc_info=True)
+
+
+@worker_process_shutdown.connect
+def remove_textfile(**kwargs):
+    # Plik zakończonego procesu nie może dalej raportować jego liczników.
+    if settings.GRADING_METRICS_DIR:
+        try:
+            os.unlink(textfile_path())
+        except OSError:
+            pass
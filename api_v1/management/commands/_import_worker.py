@@ -0,0 +1,37 @@
+"""
+Funkcje uruchamiane w procesach potomnych `import_quizzes --workers N`.
+
+Moduł celowo nie importuje modeli na najwyższym poziomie: przy metodzie
+startu `spawn` (Windows, macOS) proces potomny musi najpierw wykonać
+`django.setup()` w `init_worker`, a dopiero potem załadować komendę.
+"""
+import io
+import os
+from pathlib import Path
+
+
+def init_worker():
+    """Inicjalizuje Django w procesie potomnym (jeśli nie jest już gotowe)."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_project.settings')
+    from django.apps import apps
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def import_file(path, incremental=False, stream=False, batch_size=None):
+    """
+    Waliduje i importuje jeden plik w bieżącym procesie. Zwraca słownik
+    z podsumowaniem pliku (None przy błędzie) i przechwyconymi komunikatami,
+    które proces główny wypisze.
+    """
+    from api_v1.management.commands.import_quizzes import Command
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    command = Command(stdout=stdout, stderr=stderr)
+    command.incremental = incremental
+    command.stream = stream
+    if batch_size:
+        command.batch_size = batch_size
+    summary = command.process_file(Path(path))
+    return {'path': path, 'summary': summary, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
@@ -0,0 +1,148 @@
+"""
+Strumieniowe odczytywanie dużych plików quizów.
+
+`json.loads` materializuje cały plik w pamięci, zanim zapiszemy pierwszy
+wiersz. `QuizStreamReader` czyta plik porcjami i dekoduje po jednym pytaniu
+z tablicy `questions` naraz (`json.JSONDecoder.raw_decode`), więc zużycie
+pamięci zależy od rozmiaru porcji i pojedynczego pytania, a nie całego pliku.
+"""
+import codecs
+import hashlib
+import json
+from pathlib import Path
+
+# Rozmiar porcji pliku wczytywanej jednorazowo (w bajtach).
+CHUNK_SIZE = 1024 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+def file_sha256(file_path: Path, chunk_size=CHUNK_SIZE):
+    """Skrót SHA-256 zawartości pliku liczony porcjami."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class QuizStreamReader:
+    """
+    Czyta plik quizu o strukturze `{"scope": ..., "category": ...,
+    "questions": [...]}` bez wczytywania go w całości.
+
+    `iter_questions()` zwraca kolejne pytania z tablicy `questions`. Pola
+    najwyższego poziomu (poza `questions`) trafiają do słownika `header`,
+    a typ wartości `questions` do `questions_type`. Oba są kompletne dopiero
+    po wyczerpaniu generatora - pola mogą występować także za pytaniami.
+    """
+
+    def __init__(self, file_path: Path, chunk_size=CHUNK_SIZE):
+        self.file_path = Path(file_path)
+        self.chunk_size = chunk_size
+        self.header = {}
+        self.questions_type = None
+        self._decoder = json.JSONDecoder()
+
+    def iter_questions(self):
+        self.header = {}
+        self.questions_type = None
+        with open(self.file_path, 'rb') as f:
+            self._file = f
+            self._utf8 = codecs.getincrementaldecoder('utf-8-sig')()
+            self._buf, self._pos, self._eof = '', 0, False
+
+            self._expect('{')
+            if self._peek() == '}':
+                self._pos += 1
+                return
+            while True:
+                key = self._decode_value()
+                if not isinstance(key, str):
+                    self._error("Oczekiwano klucza tekstowego")
+                self._expect(':')
+                if key == 'questions' and self._peek() == '[':
+                    self._pos += 1
+                    self.questions_type = 'list'
+                    yield from self._iter_array()
+                elif key == 'questions':
+                    self.questions_type = type(self._decode_value()).__name__
+                else:
+                    self.header[key] = self._decode_value()
+
+                separator = self._next_char()
+                if separator == '}':
+                    return
+                if separator != ',':
+                    self._error("Oczekiwano ',' lub '}'")
+
+    # --- Skaner ---
+
+    def _iter_array(self):
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            yield self._decode_value()
+            separator = self._next_char()
+            if separator == ']':
+                return
+            if separator != ',':
+                self._error("Oczekiwano ',' lub ']'")
+
+    def _fill(self):
+        """Dokleja kolejną porcję pliku do bufora. Zwraca False na końcu pliku."""
+        if self._eof:
+            return False
+        if self._pos:
+            # Odrzucamy już przetworzoną część bufora.
+            self._buf, self._pos = self._buf[self._pos:], 0
+        chunk = self._file.read(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            self._buf += self._utf8.decode(b'', final=True)
+            return False
+        self._buf += self._utf8.decode(chunk)
+        return True
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buf) or not self._fill():
+                return
+
+    def _peek(self):
+        self._skip_whitespace()
+        if self._pos >= len(self._buf):
+            self._error("Nieoczekiwany koniec pliku")
+        return self._buf[self._pos]
+
+    def _next_char(self):
+        char = self._peek()
+        self._pos += 1
+        return char
+
+    def _expect(self, char):
+        if self._next_char() != char:
+            self._error(f"Oczekiwano '{char}'")
+
+    def _decode_value(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # Wartość może być ucięta na granicy porcji.
+                if self._fill():
+                    continue
+                raise
+            # Liczba (lub literał) kończąca się równo z buforem może mieć
+            # dalszy ciąg w następnej porcji.
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _error(self, message):
+        raise json.JSONDecodeError(message, self._buf, self._pos)
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api_v1.snapshot import build_snapshot, QuizSnapshot
+
+
+class Command(BaseCommand):
+    """
+    Buduje migawkę banku pytań (patrz `api_v1/snapshot.py`) i publikuje ją
+    jako bieżącą. `import_quizzes` robi to samo automatycznie po imporcie.
+    """
+    help = 'Buduje niezmienną migawkę banku pytań, z której /questions/ losuje pytania bez zapytań do bazy.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', type=str, help='Katalog migawek (domyślnie QUIZ_SNAPSHOT_DIR).')
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.QUIZ_SNAPSHOT_DIR
+        if not directory:
+            raise CommandError("Nie ustawiono QUIZ_SNAPSHOT_DIR ani opcji --dir.")
+        path = build_snapshot(directory)
+        snapshot = QuizSnapshot(path)
+        self.stdout.write(self.style.SUCCESS(f"Zbudowano migawkę '{path.name}' ({snapshot.count} pytań)."))
@@ -1,12 +1,40 @@
+import hashlib
 import json
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
+from django.db import connection, connections, transaction
+from django.db.models import Count
 from tqdm import tqdm
 
 # Poprawny import modeli z ich właściwej lokalizacji
 from api_v1.models import Category, Tag, Test, Question, Answer
 from api_v1.management.commands.validate_quiz_json import Command as ValidateQuizCommand
+from api_v1.management.commands import _import_worker as import_worker
+from api_v1.management.commands._quiz_stream import QuizStreamReader, file_sha256
+from api_v1.signals import bulk_question_changes
+from api_v1.snapshot import build_snapshot
+
+# Liczba wierszy wstawianych jednym zapytaniem INSERT przy imporcie.
+BULK_BATCH_SIZE = 1000
+
+
+def question_key(q_data):
+    """
+    Zwraca stabilny klucz pytania w pliku: jego `id`, a gdy go brak -
+    skrót treści pytania.
+    """
+    if q_data.get('id') is not None:
+        return f"id:{q_data['id']}"
+    return f"text:{hashlib.sha256(q_data.get('questionText', '').encode('utf-8')).hexdigest()}"
+
+
+def question_content_hash(q_data):
+    """Skrót SHA-256 kanonicznej (posortowanej) reprezentacji JSON pytania."""
+    return hashlib.sha256(json.dumps(q_data, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
 
 class Command(BaseCommand):
     """
@@ -15,18 +43,36 @@ class Command(BaseCommand):
     """
     help = 'Importuje testy i pytania (w tym otwarte i z obrazkami) z plików JSON i weryfikuje poprawność importu.'
 
+    # Nadpisywane opcjami `--incremental`, `--stream` i `--batch-size`
+    # (oraz w procesach roboczych).
+    incremental = False
+    stream = False
+    batch_size = BULK_BATCH_SIZE
+
     def add_arguments(self, parser):
         parser.add_argument('path', type=str, help='Ścieżka do katalogu zawierającego pliki JSON z quizami lub do pojedynczego pliku JSON.')
         parser.add_argument('--clean', action='store_true', help='Usuwa wszystkie istniejące dane przed importem.')
+        parser.add_argument('--workers', type=int, default=1, help='Liczba procesów importujących pliki równolegle (domyślnie 1).')
+        parser.add_argument('--incremental', action='store_true', help='Import przyrostowy: pomija niezmienione pliki, a w zmienionych aktualizuje tylko zmienione pytania.')
+        parser.add_argument('--stream', action='store_true', help='Odczytuje pliki strumieniowo, pytanie po pytaniu, bez wczytywania całego pliku do pamięci.')
+        parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE, help=f'Liczba pytań zapisywanych jedną partią w trybie --stream (domyślnie {BULK_BATCH_SIZE}).')
 
     def handle(self, *args, **options):
         input_path = Path(options['path'])
+        if options['incremental'] and options['stream']:
+            # Synchronizacja wymaga kluczy wszystkich pytań pliku naraz, a import
+            # strumieniowy zastępowałby pytania (zmieniając ich ID) po cichu.
+            raise CommandError("Opcji --incremental nie można łączyć z --stream.")
+        self.incremental = options['incremental']
+        self.stream = options['stream']
+        self.batch_size = max(options['batch_size'], 1)
 
         if options['clean']:
             self.stdout.write(self.style.WARNING("Rozpoczynanie czyszczenia bazy danych..."))
-            Test.objects.all().delete()
-            Category.objects.all().delete()
-            Tag.objects.all().delete()
+            with transaction.atomic(), bulk_question_changes():
+                Test.objects.all().delete()
+                Category.objects.all().delete()
+                Tag.objects.all().delete()
             self.stdout.write(self.style.SUCCESS("Baza danych została wyczyszczona."))
 
         json_files_to_import = []
@@ -49,101 +95,429 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING("Brak plików JSON do zaimportowania."))
             return
 
-        self.imported_files = []  # Initialize the list here
-        for file_path in tqdm(json_files_to_import, desc="Importowanie quizów"):
-            imported = False
-            # Uruchamiamy walidację dla każdego pliku
-            validator = ValidateQuizCommand()
-            validation_errors = validator.validate_quiz_data(self.load_json(file_path))
-
-            if validation_errors:
-                self.stdout.write(self.style.ERROR(f"\nBłąd walidacji pliku '{file_path.name}'. Pomijanie importu."))
-                for error in validation_errors:
-                    self.stdout.write(self.style.ERROR(f"- {error}"))
-            else:
-                try:
-                    self.stdout.write(self.style.SUCCESS(f"\nPlik '{file_path.name}' przeszedł walidację. Rozpoczynanie importu..."))
-                    self.import_quiz_from_file(file_path)
-                    imported = True
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f"\nBłąd podczas importu pliku '{file_path.name}': {e}. Pomijanie."))
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite blokuje całą bazę przy zapisie, więc równoległe transakcje
+            # kończyłyby się błędem "database is locked".
+            self.stdout.write(self.style.WARNING("SQLite nie obsługuje równoległych zapisów - import zostanie wykonany w jednym procesie."))
+            workers = 1
+
+        if workers > 1 and len(json_files_to_import) > 1:
+            summaries = self.import_files_in_parallel(json_files_to_import, workers)
+        else:
+            summaries = [self.process_file(file_path) for file_path in tqdm(json_files_to_import, desc="Importowanie quizów")]
 
-            if imported:
-                self.imported_files.append(file_path)
+        # Dalej trzymamy tylko zwięzłe podsumowania plików - sparsowane dane
+        # zostały zwolnione zaraz po zapisie każdego pliku.
+        self.imported_files = [summary for summary in summaries if summary]
 
         self.stdout.write(self.style.SUCCESS("\nImport zakończony. Rozpoczynanie weryfikacji..."))
         self.verify_import(self.imported_files, len(json_files_to_import))
+        self.publish_snapshot()
+
+    def publish_snapshot(self):
+        """Buduje migawkę banku pytań, jeśli ustawiono `QUIZ_SNAPSHOT_DIR`."""
+        if not settings.QUIZ_SNAPSHOT_DIR:
+            return
+        path = build_snapshot(settings.QUIZ_SNAPSHOT_DIR)
+        self.stdout.write(self.style.SUCCESS(f"Opublikowano migawkę banku pytań: {path.name}"))
+
+    def process_file(self, file_path: Path):
+        """
+        Wczytuje (jednokrotnie), waliduje i importuje pojedynczy plik.
+        Zwraca podsumowanie pliku (patrz `summarize_quiz`), jeśli plik został
+        poprawnie zaimportowany, a w przeciwnym razie None.
+        """
+        if self.stream:
+            return self.process_file_streaming(file_path)
+
+        data, content_hash = self.load_json(file_path, with_hash=True)
+
+        if self.incremental and self.is_unchanged(data.get('scope', file_path.stem), content_hash):
+            self.stdout.write(f"\nPlik '{file_path.name}' nie zmienił się od ostatniego importu. Pomijanie.")
+            return self.summarize_quiz(file_path, data, content_hash)
+
+        # Uruchamiamy walidację dla każdego pliku
+        validator = ValidateQuizCommand()
+        validation_errors = validator.validate_quiz_data(data)
+
+        if validation_errors:
+            self.stdout.write(self.style.ERROR(f"\nBłąd walidacji pliku '{file_path.name}'. Pomijanie importu."))
+            for error in validation_errors:
+                self.stdout.write(self.style.ERROR(f"- {error}"))
+            return None
+
+        try:
+            self.stdout.write(self.style.SUCCESS(f"\nPlik '{file_path.name}' przeszedł walidację. Rozpoczynanie importu..."))
+            if not self.import_quiz_from_file(file_path, data, content_hash):
+                return None
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"\nBłąd podczas importu pliku '{file_path.name}': {e}. Pomijanie."))
+            return None
+        return self.summarize_quiz(file_path, data, content_hash)
+
+    def process_file_streaming(self, file_path: Path):
+        """
+        Wariant `process_file` dla trybu `--stream`. Plik czytany jest dwa
+        razy, zawsze porcjami: pierwszy przebieg waliduje pytania (każde
+        osobno, `validate_question`), zbiera nazwy tagów i liczy podsumowanie,
+        a drugi zapisuje pytania partiami po `batch_size`. W pamięci nie ma
+        nigdy więcej niż jednej partii pytań.
+        """
+        validator = ValidateQuizCommand()
+        reader = QuizStreamReader(file_path)
+        summary = {'file_name': file_path.name, 'questions': 0, 'answers': 0}
+        tag_names = set()
+
+        try:
+            summary['content_hash'] = file_sha256(file_path)
+            for index, q_data in enumerate(reader.iter_questions()):
+                validator.validate_question(q_data, index)
+                summary['questions'] += 1
+                if isinstance(q_data, dict):
+                    if q_data.get('type') != 'open-ended':
+                        summary['answers'] += len(q_data.get('options', []))
+                    if q_data.get('questionText') and isinstance(q_data.get('tags'), list):
+                        tag_names.update(q_data['tags'])
+        except json.JSONDecodeError as e:
+            self.stdout.write(self.style.ERROR(f"\nBłąd dekodowania JSON w pliku '{file_path.name}': {e}. Pomijanie."))
+            return None
 
-    def import_quiz_from_file(self, file_path: Path):
+        summary['title'] = reader.header.get('scope', file_path.stem)
+        question_errors = validator.validation_errors
+        validator.validation_errors = []
+        validator.validate_quiz_header(reader.header, reader.questions_type)
+        validation_errors = validator.validation_errors + question_errors
+
+        if validation_errors:
+            self.stdout.write(self.style.ERROR(f"\nBłąd walidacji pliku '{file_path.name}'. Pomijanie importu."))
+            for error in validation_errors:
+                self.stdout.write(self.style.ERROR(f"- {error}"))
+            return None
+
+        try:
+            self.stdout.write(self.style.SUCCESS(f"\nPlik '{file_path.name}' przeszedł walidację. Rozpoczynanie importu strumieniowego..."))
+            self.import_quiz_streaming(file_path, reader, summary, tag_names)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"\nBłąd podczas importu pliku '{file_path.name}': {e}. Pomijanie."))
+            return None
+        return summary
+
+    def import_quiz_streaming(self, file_path: Path, reader, summary, tag_names):
+        """
+        Zapisuje test i jego pytania, czytając plik pytanie po pytaniu.
+        Całość wykonywana jest w jednej transakcji, więc błąd w połowie pliku
+        nie zostawia w bazie częściowo zaimportowanego testu (tryb
+        przyrostowy nie jest dostępny - patrz `handle`).
+        """
+        header = reader.header
+        category_obj = self.resolve_category(header.get('category'))
+        tag_ids = self.resolve_tags(tag_names)
+
+        with transaction.atomic():
+            self.lock_test_title(summary['title'])
+            test_obj, created = Test.objects.update_or_create(
+                title=summary['title'],
+                defaults={
+                    'description': header.get('description', f"Test importowany z pliku {file_path.name}."),
+                    'content_hash': summary['content_hash'],
+                }
+            )
+            if category_obj:
+                test_obj.categories.set([category_obj])
+
+            with bulk_question_changes(test_obj.id):
+                if not created:
+                    test_obj.questions.all().delete()
+
+                batch = []
+                with tqdm(desc=f"Pytania z '{file_path.name}'", total=summary['questions'], unit=' pyt.', leave=False) as progress:
+                    for q_data in reader.iter_questions():
+                        batch.append(q_data)
+                        progress.update()
+                        if len(batch) >= self.batch_size:
+                            self.bulk_insert_questions(test_obj, batch, tag_ids)
+                            batch = []
+                    self.bulk_insert_questions(test_obj, batch, tag_ids)
+
+    def summarize_quiz(self, file_path: Path, data, content_hash):
+        """
+        Zwraca zwięzłe podsumowanie pliku używane przy weryfikacji importu:
+        tytuł testu, liczbę pytań i odpowiedzi oraz skrót zawartości.
+        """
+        questions_data = data.get('questions', [])
+        return {
+            'file_name': file_path.name,
+            'title': data.get('scope', file_path.stem),
+            'questions': len(questions_data),
+            'answers': sum(len(q.get('options', [])) for q in questions_data if q.get('type') != 'open-ended'),
+            'content_hash': content_hash,
+        }
+
+    def import_files_in_parallel(self, file_paths, workers):
+        """
+        Importuje pliki w puli procesów. Każdy proces ma własne połączenie
+        z bazą i zapisuje każdy plik w osobnej transakcji. Komunikaty
+        z procesów są wypisywane w procesie głównym, a podsumowania
+        zaimportowanych plików trafiają do wspólnego raportu weryfikacji.
+        """
+        # Procesy potomne nie mogą współdzielić otwartego połączenia rodzica.
+        connections.close_all()
+
+        summaries = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=import_worker.init_worker) as pool:
+            futures = {pool.submit(import_worker.import_file, str(file_path), self.incremental, self.stream, self.batch_size): file_path for file_path in file_paths}
+            for future in tqdm(as_completed(futures), total=len(futures), desc=f"Importowanie quizów ({workers} procesów)"):
+                file_path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"\nBłąd podczas importu pliku '{file_path.name}': {e}. Pomijanie."))
+                    continue
+                self.stdout.write(result['stdout'], ending='')
+                self.stderr.write(result['stderr'], ending='')
+                summaries.append(result['summary'])
+        return summaries
+
+    def is_unchanged(self, test_title, content_hash):
+        """Sprawdza, czy test został już zaimportowany z pliku o tej samej treści."""
+        return Test.objects.filter(title=test_title, content_hash=content_hash).exists()
+
+    def import_quiz_from_file(self, file_path: Path, data=None, content_hash=''):
         try:
-            with file_path.open('r', encoding='utf-8') as f:
-                data = json.load(f)
+            if data is None:
+                data, content_hash = self.load_json(file_path, with_hash=True)
 
             test_title = data.get('scope', file_path.stem)
             category_name = data.get('category')
+            questions_data = data.get('questions', [])
+
+            # Wspólne wiersze (kategorie, tagi) tworzymy przed główną transakcją
+            # pliku, krótkimi zapytaniami bez blokowania ich do końca importu.
+            category_obj = self.resolve_category(category_name)
+            tag_ids = self.resolve_tags({
+                name for q_data in questions_data if q_data.get('questionText')
+                for name in q_data.get('tags', [])
+            })
 
             with transaction.atomic():
-                category_obj = None
-                if category_name:
-                    category_obj, _ = Category.objects.get_or_create(name=category_name)
+                # Równoległe procesy importujące test o tym samym tytule muszą
+                # się serializować, inaczej powstałyby dwa testy.
+                self.lock_test_title(test_title)
 
                 test_obj, created = Test.objects.update_or_create(
                     title=test_title,
-                    defaults={'description': data.get('description', f"Test importowany z pliku {file_path.name}.")}
+                    defaults={
+                        'description': data.get('description', f"Test importowany z pliku {file_path.name}."),
+                        'content_hash': content_hash,
+                    }
                 )
                 if category_obj:
                     test_obj.categories.set([category_obj])
 
-                if not created:
-                    test_obj.questions.all().delete()
-
-                tags_cache = {}
-                for q_data in data.get('questions', []):
-                    q_text = q_data.get('questionText')
-                    if not q_text: continue
-                    
-                    q_type = q_data.get('type', 'single-choice')
-                    if q_type not in [Question.SINGLE_CHOICE, Question.MULTIPLE_CHOICE, Question.OPEN_ENDED]:
-                        q_type = Question.SINGLE_CHOICE
-
-                    question_obj = Question.objects.create(
-                        test=test_obj,
-                        text=q_text,
-                        image=q_data.get('image'), # <-- TUTAJ ZMIANA: Dodajemy import obrazka
-                        explanation=q_data.get('explanation', ''),
-                        question_type=q_type,
-                        grading_criteria=q_data.get('gradingCriteria'),
-                        max_points=q_data.get('maxPoints')
-                    )
-
-                    tags_to_assign = []
-                    for tag_name in q_data.get('tags', []):
-                        tag_obj = tags_cache.get(tag_name)
-                        if not tag_obj:
-                            tag_obj, _ = Tag.objects.get_or_create(name=tag_name)
-                            tags_cache[tag_name] = tag_obj
-                        tags_to_assign.append(tag_obj)
-                    if tags_to_assign:
-                        question_obj.tags.set(tags_to_assign)
-
-                    if q_type in [Question.SINGLE_CHOICE, Question.MULTIPLE_CHOICE]:
-                        correct_indices = q_data.get('correctAnswers', [])
-                        for i, opt_text in enumerate(q_data.get('options', [])):
-                            Answer.objects.create(question=question_obj, text=opt_text, is_correct=(i in correct_indices))
+                # Sygnały pytań są wyciszone na czas importu - liczniki testu
+                # przeliczamy raz na końcu bloku, a cache unieważniamy po
+                # zatwierdzeniu transakcji.
+                with bulk_question_changes(test_obj.id):
+                    if created:
+                        self.bulk_insert_questions(test_obj, questions_data, tag_ids)
+                    elif self.incremental:
+                        stats = self.sync_questions(test_obj, questions_data, tag_ids)
+                        self.stdout.write(
+                            f"Synchronizacja '{test_title}': dodano {stats['created']}, zaktualizowano {stats['updated']}, "
+                            f"usunięto {stats['deleted']}, bez zmian {stats['unchanged']}."
+                        )
+                    else:
+                        test_obj.questions.all().delete()
+                        self.bulk_insert_questions(test_obj, questions_data, tag_ids)
+            return True
 
         except json.JSONDecodeError:
             self.stderr.write(self.style.ERROR(f"Błąd: Plik '{file_path.name}' zawiera nieprawidłowy JSON."))
         except Exception as e:
             self.stderr.write(self.style.ERROR(f"Nieoczekiwany błąd importu pliku '{file_path.name}': {e}"))
-
-    def load_json(self, file_path: Path):
+        return False
+
+    def build_question_rows(self, test_obj, q_data, tag_ids, question_id=None):
+        """
+        Buduje (bez zapisu) obiekt pytania wraz z jego odpowiedziami
+        i powiązaniami z tagami. Zwraca None dla pytań bez treści.
+        """
+        q_text = q_data.get('questionText')
+        if not q_text:
+            return None
+
+        q_type = q_data.get('type', 'single-choice')
+        if q_type not in [Question.SINGLE_CHOICE, Question.MULTIPLE_CHOICE, Question.OPEN_ENDED]:
+            q_type = Question.SINGLE_CHOICE
+
+        question_obj = Question(
+            id=question_id or uuid.uuid4(),
+            test=test_obj,
+            text=q_text,
+            image=q_data.get('image'),
+            explanation=q_data.get('explanation', ''),
+            question_type=q_type,
+            grading_criteria=q_data.get('gradingCriteria'),
+            max_points=q_data.get('maxPoints'),
+            source_key=question_key(q_data),
+            content_hash=question_content_hash(q_data),
+        )
+
+        answers = []
+        if q_type in [Question.SINGLE_CHOICE, Question.MULTIPLE_CHOICE]:
+            correct_indices = q_data.get('correctAnswers', [])
+            for i, opt_text in enumerate(q_data.get('options', [])):
+                answers.append(Answer(id=uuid.uuid4(), question_id=question_obj.id, text=opt_text, is_correct=(i in correct_indices)))
+
+        QuestionTag = Question.tags.through
+        question_tags = [
+            QuestionTag(question_id=question_obj.id, tag_id=tag_ids[name])
+            for name in dict.fromkeys(q_data.get('tags', []))
+        ]
+        return question_obj, answers, question_tags
+
+    def bulk_insert_questions(self, test_obj, questions_data, tag_ids):
+        """
+        Zapisuje pytania, odpowiedzi i powiązania z tagami za pomocą
+        `bulk_create`. Identyfikatory UUID generowane są po stronie Pythona,
+        więc nie musimy niczego odczytywać z bazy po wstawieniu wierszy.
+        """
+        questions, answers, question_tags = [], [], []
+        for q_data in questions_data:
+            rows = self.build_question_rows(test_obj, q_data, tag_ids)
+            if rows:
+                questions.append(rows[0])
+                answers.extend(rows[1])
+                question_tags.extend(rows[2])
+
+        Question.objects.bulk_create(questions, batch_size=BULK_BATCH_SIZE)
+        Answer.objects.bulk_create(answers, batch_size=BULK_BATCH_SIZE)
+        Question.tags.through.objects.bulk_create(question_tags, batch_size=BULK_BATCH_SIZE)
+        return len(questions)
+
+    def sync_questions(self, test_obj, questions_data, tag_ids):
+        """
+        Przyrostowo synchronizuje pytania istniejącego testu z danymi z pliku.
+        Pytania dopasowywane są po stabilnym kluczu (`source_key`): niezmienione
+        zostają nietknięte, zmienione są aktualizowane w miejscu (z zachowaniem
+        ID, a więc i zgłoszeń `ReportedIssue`), a usunięte z pliku - kasowane.
+        Pytania zaimportowane przed wprowadzeniem kluczy (pusty `source_key`)
+        dopasowywane są po treści, unikalnej w obrębie testu, i przy tej
+        okazji dostają klucz i skrót.
+        """
+        incoming = {}
+        for q_data in questions_data:
+            if q_data.get('questionText'):
+                incoming.setdefault(question_key(q_data), []).append(q_data)
+
+        if any(len(items) > 1 for items in incoming.values()):
+            # Bez unikalnych kluczy nie da się jednoznacznie dopasować pytań.
+            self.stdout.write(self.style.WARNING(f"Plik testu '{test_obj.title}' zawiera powtórzone identyfikatory pytań - pełny import zamiast synchronizacji."))
+            deleted = test_obj.questions.count()
+            test_obj.questions.all().delete()
+            created = self.bulk_insert_questions(test_obj, questions_data, tag_ids)
+            return {'created': created, 'updated': 0, 'deleted': deleted, 'unchanged': 0}
+
+        existing, legacy = {}, {}
+        for question_id, key, question_hash, text in test_obj.questions.values_list('id', 'source_key', 'content_hash', 'text'):
+            if key:
+                existing[key] = (question_id, question_hash)
+            else:
+                legacy[text] = question_id
+        for key, items in incoming.items():
+            if key not in existing and items[0]['questionText'] in legacy:
+                # Pusty skrót nigdy nie jest zgodny, więc pytanie zostanie
+                # zaktualizowane w miejscu razem z kluczem.
+                existing[key] = (legacy.pop(items[0]['questionText']), '')
+
+        removed_ids = [question_id for key, (question_id, _) in existing.items() if key not in incoming]
+        removed_ids.extend(legacy.values())
+        new_data = [items[0] for key, items in incoming.items() if key not in existing]
+        changed = [
+            (existing[key][0], items[0]) for key, items in incoming.items()
+            if key in existing and existing[key][1] != question_content_hash(items[0])
+        ]
+
+        # Kolejność ma znaczenie dla ograniczenia unikalności treści pytań
+        # w teście: najpierw usuwamy, potem aktualizujemy, na końcu dodajemy.
+        if removed_ids:
+            Question.objects.filter(id__in=removed_ids).delete()
+
+        if changed:
+            changed_ids = [question_id for question_id, _ in changed]
+            rows = [self.build_question_rows(test_obj, q_data, tag_ids, question_id=question_id) for question_id, q_data in changed]
+            Answer.objects.filter(question_id__in=changed_ids).delete()
+            Question.tags.through.objects.filter(question_id__in=changed_ids).delete()
+            Question.objects.bulk_update(
+                [row[0] for row in rows],
+                ['text', 'image', 'explanation', 'question_type', 'grading_criteria', 'max_points', 'source_key', 'content_hash'],
+                batch_size=BULK_BATCH_SIZE,
+            )
+            Answer.objects.bulk_create([answer for row in rows for answer in row[1]], batch_size=BULK_BATCH_SIZE)
+            Question.tags.through.objects.bulk_create([link for row in rows for link in row[2]], batch_size=BULK_BATCH_SIZE)
+
+        created = self.bulk_insert_questions(test_obj, new_data, tag_ids)
+        return {
+            'created': created,
+            'updated': len(changed),
+            'deleted': len(removed_ids),
+            'unchanged': len(incoming) - len(new_data) - len(changed),
+        }
+
+    def lock_test_title(self, title):
+        """
+        Zakłada blokadę doradczą (PostgreSQL) na tytuł testu do końca bieżącej
+        transakcji. SQLite i tak serializuje wszystkie zapisy.
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"quiz-import:{title}"])
+
+    def resolve_category(self, category_name):
+        """
+        Zwraca kategorię o podanej nazwie, tworząc ją w razie potrzeby.
+        `ignore_conflicts` sprawia, że równoległe importy nie tworzą
+        duplikatów ani nie zgłaszają błędów unikalności.
+        """
+        if not category_name:
+            return None
+        Category.objects.bulk_create([Category(name=category_name)], ignore_conflicts=True)
+        return Category.objects.get(name=category_name)
+
+    def resolve_tags(self, tag_names):
+        """
+        Zwraca słownik `{nazwa_tagu: id}`. Brakujące tagi tworzone są jednym
+        `bulk_create(ignore_conflicts=True)`, a identyfikatory wszystkich
+        pobierane jednym zapytaniem. Nazwy wstawiamy w stałej (posortowanej)
+        kolejności, aby równoległe importy blokowały wiersze w tym samym
+        porządku i nie mogły się zakleszczyć.
+        """
+        if not tag_names:
+            return {}
+        Tag.objects.bulk_create([Tag(name=name) for name in sorted(tag_names)], ignore_conflicts=True, batch_size=BULK_BATCH_SIZE)
+        return dict(Tag.objects.filter(name__in=tag_names).values_list('name', 'id'))
+
+    def load_json(self, file_path: Path, with_hash=False):
+        """
+        Wczytuje i dekoduje plik JSON. Z `with_hash=True` zwraca dodatkowo
+        skrót SHA-256 zawartości pliku, liczony z tych samych bajtów.
+        """
         try:
-            with file_path.open('r', encoding='utf-8') as f:
-                return json.load(f)
+            raw = file_path.read_bytes()
+            data = json.loads(raw)
         except json.JSONDecodeError as e:
             raise CommandError(f"Błąd dekodowania JSON w pliku '{file_path}': {e}")
+        if with_hash:
+            return data, hashlib.sha256(raw).hexdigest()
+        return data
 
     def verify_import(self, imported_files: list, total_files: int):
+        """
+        Porównuje liczby pytań i odpowiedzi z podsumowań plików z bazą danych.
+        Stan bazy odczytujemy jednym zapytaniem agregującym dla wszystkich
+        zaimportowanych testów.
+        """
         self.stdout.write("=" * 70)
         self.stdout.write("RAPORT WERYFIKACJI IMPORTU")
         self.stdout.write("=" * 70)
@@ -152,44 +526,44 @@ class Command(BaseCommand):
         total_q_json, total_q_db = 0, 0
         total_a_json, total_a_db = 0, 0
 
-        for file_path in tqdm(imported_files, desc="Weryfikowanie importu"):
-            try:
-                with file_path.open('r', encoding='utf-8') as f:
-                    data = json.load(f)
+        titles = {summary['title'] for summary in imported_files}
+        db_counts = {
+            title: (questions, answers)
+            for title, questions, answers in Test.objects.filter(title__in=titles)
+            .values('title')
+            .annotate(question_total=Count('questions', distinct=True), answer_total=Count('questions__answers'))
+            .values_list('title', 'question_total', 'answer_total')
+            .order_by()
+        }
+
+        for summary in imported_files:
+            test_title = summary['title']
+            q_in_json = summary['questions']
+            a_in_json = summary['answers']
+
+            total_q_json += q_in_json
+            total_a_json += a_in_json
+
+            if test_title not in db_counts:
+                self.stdout.write(self.style.ERROR(f"BŁĄD: Nie znaleziono w DB testu '{test_title}' dla pliku {summary['file_name']}"))
+                all_ok = False
+                continue
 
-                test_title = data.get('scope', file_path.stem)
-                questions_data = data.get('questions', [])
-                q_in_json = len(questions_data)
-                a_in_json = sum(len(q.get('options', [])) for q in questions_data if q.get('type') != 'open-ended')
+            q_in_db, a_in_db = db_counts[test_title]
+            total_q_db += q_in_db
+            total_a_db += a_in_db
 
-                total_q_json += q_in_json
-                total_a_json += a_in_json
+            has_error = False
+            if q_in_json != q_in_db:
+                self.stdout.write(self.style.ERROR(f"BŁĄD: '{test_title}' -> Niezgodność pytań! JSON: {q_in_json}, DB: {q_in_db}"))
+                has_error = True
+
+            if a_in_json != a_in_db:
+                self.stdout.write(self.style.ERROR(f"BŁĄD: '{test_title}' -> Niezgodność odpowiedzi! JSON: {a_in_json}, DB: {a_in_db}"))
+                has_error = True
+
+            if has_error: all_ok = False
 
-                try:
-                    test_obj = Test.objects.get(title=test_title)
-                    q_in_db = test_obj.questions.count()
-                    a_in_db = Answer.objects.filter(question__test=test_obj).count()
-
-                    total_q_db += q_in_db
-                    total_a_db += a_in_db
-                    
-                    has_error = False
-                    if q_in_json != q_in_db:
-                        self.stdout.write(self.style.ERROR(f"BŁĄD: '{test_title}' -> Niezgodność pytań! JSON: {q_in_json}, DB: {q_in_db}"))
-                        has_error = True
-                    
-                    if a_in_json != a_in_db:
-                        self.stdout.write(self.style.ERROR(f"BŁĄD: '{test_title}' -> Niezgodność odpowiedzi! JSON: {a_in_json}, DB: {a_in_db}"))
-                        has_error = True
-
-                    if has_error: all_ok = False
-                except Test.DoesNotExist:
-                    self.stdout.write(self.style.ERROR(f"BŁĄD: Nie znaleziono w DB testu '{test_title}' dla pliku {file_path.name}"))
-                    all_ok = False
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Krytyczny błąd weryfikacji pliku '{file_path.name}': {e}"))
-                all_ok = False
-        
         self.stdout.write("-" * 70)
         self.stdout.write(f"Próbowano zaimportować łącznie {total_files} plików.")
         self.stdout.write(f"Pominięto {total_files - len(imported_files)} plików z powodu błędów walidacji lub importu.")
@@ -1,16 +1,114 @@
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from django.core.management.base import BaseCommand, CommandError
 
+# -----------------------------------------------------------------------------
+# Szybka ścieżka walidacji
+# -----------------------------------------------------------------------------
+#
+# Zdecydowana większość plików jest poprawna, a szczegółowa walidacja buduje
+# prefiks komunikatu dla każdego pytania, nawet gdy nie znajdzie błędu.
+# Dlatego najpierw sprawdzamy pytanie funkcją skompilowaną ze schematu
+# (`QUESTION_SCHEMA`), która zwraca tylko True/False i niczego nie formatuje.
+# Szczegółowe komunikaty budujemy wyłącznie dla pytań, które jej nie przejdą.
+#
+# -----------------------------------------------------------------------------
+
+QUESTION_SCHEMA = {
+    'required': ('questionText', 'type'),
+    'required_by_type': {
+        'single-choice': ('options', 'correctAnswers'),
+        'multiple-choice': ('options', 'correctAnswers'),
+        'open-ended': ('gradingCriteria', 'maxPoints'),
+    },
+    'optional_types': {'explanation': str, 'image': str, 'tags': list},
+}
+
+
+def compile_question_check(schema):
+    """
+    Kompiluje schemat pytania do funkcji `check(question) -> bool`, zgodnej
+    z `Command.validate_question` (True wtedy i tylko wtedy, gdy szczegółowa
+    walidacja nie zgłosiłaby żadnego błędu).
+    """
+    required = schema['required']
+    required_by_type = {q_type: required + fields for q_type, fields in schema['required_by_type'].items()}
+    optional_types = tuple(schema['optional_types'].items())
+
+    def check(question):
+        if type(question) is not dict:
+            return False
+        q_type = question.get('type')
+        fields = required_by_type.get(q_type) if type(q_type) is str else None
+        if fields is None:
+            return False
+        for field in fields:
+            if field not in question:
+                return False
+        for field, field_type in optional_types:
+            if field in question and not isinstance(question[field], field_type):
+                return False
+        if q_type == 'open-ended':
+            return True
+
+        options, correct = question['options'], question['correctAnswers']
+        if type(options) is not list or len(options) < 2 or type(correct) is not list or not correct:
+            return False
+        if q_type == 'single-choice' and len(correct) != 1:
+            return False
+        size = len(options)
+        for index in correct:
+            if not isinstance(index, int) or not 0 <= index < size:
+                return False
+        return True
+
+    return check
+
+
+is_valid_question = compile_question_check(QUESTION_SCHEMA)
+
+
+def validate_file(path, max_errors=None):
+    """
+    Waliduje jeden plik i zwraca wynik gotowy do serializacji do JSON.
+    Funkcja modułu (a nie metoda), aby można ją było uruchamiać w puli procesów.
+    """
+    result = {'file': str(path), 'valid': False, 'errors': []}
+    try:
+        with open(path, 'rb') as f:
+            data = json.loads(f.read())
+    except (OSError, ValueError) as e:
+        result['errors'].append(f"Błąd dekodowania JSON: {e}")
+        return result
+    if not isinstance(data, dict):
+        result['errors'].append("Plik nie zawiera obiektu JSON z quizem.")
+        return result
+
+    validator = Command()
+    validator.max_errors = max_errors
+    result['errors'] = validator.validate_quiz_data(data)
+    result['valid'] = not result['errors']
+    return result
+
+
+class _TooManyErrors(Exception):
+    """Przerywa walidację pliku po osiągnięciu limitu `--max-errors`."""
+
+
 class Command(BaseCommand):
-    help = 'Weryfikuje plik JSON z quizem pod kątem kompletności i poprawności struktury danych.'
+    help = 'Weryfikuje pliki JSON z quizami (pojedynczy plik lub cały katalog) pod kątem kompletności i poprawności struktury danych.'
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.validation_errors = []
+        self.max_errors = None
 
     def _add_error(self, message):
         self.validation_errors.append(message)
+        if self.max_errors and len(self.validation_errors) >= self.max_errors:
+            raise _TooManyErrors
 
     def _format_question_error(self, index, question_id, message):
         if question_id != 'brak_id':
@@ -24,14 +122,48 @@ class Command(BaseCommand):
                 self._add_error(f"Brak klucza '{field}' w {object_name}.")
 
     def add_arguments(self, parser):
-        parser.add_argument('path', type=str, help='Ścieżka do pliku JSON z quizem.')
+        parser.add_argument('path', type=str, help='Ścieżka do pliku JSON z quizem lub do katalogu z plikami JSON.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Liczba procesów walidujących pliki katalogu równolegle (domyślnie liczba rdzeni).')
+        parser.add_argument('--max-errors', type=int, default=None, help='Przerywa walidację pliku po znalezieniu podanej liczby błędów.')
+        parser.add_argument('--json', action='store_true', help='Wypisuje wynik jako podsumowanie w formacie JSON.')
 
     def handle(self, *args, **options):
-        file_path = Path(options['path'])
+        input_path = Path(options['path'])
+        self.max_errors = options['max_errors']
+
+        if input_path.is_dir():
+            file_paths = sorted(input_path.glob('*.json'))
+            if not file_paths and not options['json']:
+                self.stdout.write(self.style.WARNING(f"W katalogu '{input_path}' nie znaleziono żadnych plików .json."))
+                return
+            results = self.validate_files(file_paths, options['workers'])
+        elif input_path.is_file() and input_path.suffix.lower() == '.json':
+            if not options['json']:
+                return self.validate_single_file(input_path)
+            results = [validate_file(input_path, self.max_errors)]
+        else:
+            raise CommandError(f"Podana ścieżka '{input_path}' nie wskazuje na prawidłowy plik JSON ani katalog.")
+
+        invalid = [result for result in results if not result['valid']]
+        if options['json']:
+            summary = {'files': len(results), 'valid': len(results) - len(invalid), 'invalid': len(invalid), 'results': results}
+            self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2))
+        else:
+            self.write_report(results, invalid)
+
+        # Niezerowy kod wyjścia, aby komenda mogła blokować CI.
+        if invalid:
+            raise CommandError(f"Niepoprawne pliki: {len(invalid)} z {len(results)}.")
 
-        if not file_path.is_file() or file_path.suffix.lower() != '.json':
-            raise CommandError(f"Podana ścieżka '{file_path}' nie wskazuje na prawidłowy plik JSON.")
+    def write_report(self, results, invalid):
+        for result in invalid:
+            self.stdout.write(self.style.ERROR(f"\nZnaleziono błędy walidacji w pliku '{result['file']}':"))
+            for error in result['errors']:
+                self.stdout.write(self.style.ERROR(f"- {error}"))
+        summary_style = self.style.ERROR if invalid else self.style.SUCCESS
+        self.stdout.write(summary_style(f"\nPoprawne pliki: {len(results) - len(invalid)} z {len(results)}."))
 
+    def validate_single_file(self, file_path: Path):
         try:
             with file_path.open('r', encoding='utf-8') as f:
                 data = json.load(f)
@@ -44,25 +176,57 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR("\nZnaleziono błędy walidacji:"))
             for error in validation_errors:
                 self.stdout.write(self.style.ERROR(f"- {error}"))
-            return
+            raise CommandError(f"Plik '{file_path}' nie przeszedł walidacji.")
 
         self.stdout.write(self.style.SUCCESS("Plik JSON przeszedł pomyślnie walidację. Można go zaimportować."))
 
+    def validate_files(self, file_paths, workers):
+        """
+        Waliduje pliki w puli procesów (walidacja to czysty Python, więc wątki
+        nie dałyby przyspieszenia). Pliki przydzielane są procesom paczkami,
+        aby przy tysiącach małych plików nie płacić za komunikację z każdym osobno.
+        """
+        if workers <= 1 or len(file_paths) <= 1:
+            return [validate_file(path, self.max_errors) for path in file_paths]
+
+        chunksize = max(1, len(file_paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(validate_file, file_paths, [self.max_errors] * len(file_paths), chunksize=chunksize))
+
     def validate_quiz_data(self, data):
         self.validation_errors = []  # Reset errors for each file
 
-        self._validate_required_fields(data, ['scope', 'category', 'questions'], "quizu")
-
-        if 'questions' in data and not isinstance(data['questions'], list):
-            self._add_error("Klucz 'questions' musi zawierać listę pytań.")
+        try:
+            questions_type = type(data['questions']).__name__ if 'questions' in data else None
+            self.validate_quiz_header(data, questions_type)
 
-        # Walidacja pytań
-        for i, question in enumerate(data.get('questions', [])):
-            self.validate_question(question, i)
+            # Walidacja pytań
+            for i, question in enumerate(data.get('questions', [])):
+                self.validate_question(question, i)
+        except _TooManyErrors:
+            pass
 
         return self.validation_errors
 
+    def validate_quiz_header(self, header, questions_type):
+        """
+        Waliduje pola najwyższego poziomu quizu. `questions_type` to nazwa
+        typu wartości klucza `questions` ('list' dla poprawnego pliku) albo
+        None, gdy klucza brak - dzięki temu nagłówek można sprawdzić także
+        przy strumieniowym odczycie, bez wczytywania listy pytań.
+        """
+        self._validate_required_fields(header, ['scope', 'category'], "quizu")
+
+        if questions_type is None:
+            self._add_error("Brak klucza 'questions' w quizu.")
+        elif questions_type != 'list':
+            self._add_error("Klucz 'questions' musi zawierać listę pytań.")
+
     def validate_question(self, question, index):
+        # Szybka ścieżka: poprawne pytanie nie wymaga budowania komunikatów.
+        if is_valid_question(question):
+            return
+
         if not isinstance(question, dict):
             self._add_error(f"Pytanie {index + 1}: Nie jest obiektem JSON.")
             return  # Dalej nie ma sensu sprawdzać
@@ -105,4 +269,4 @@ class Command(BaseCommand):
             self._add_error(f"{error_prefix}Pole 'image' (ścieżka do obrazka) powinno być ciągiem znaków.")
 
         if 'tags' in question and not isinstance(question['tags'], list):
-            self._add_error(f"{error_prefix}Pole 'tags' powinno być listą.")
\ No newline at end of file
+            self._add_error(f"{error_prefix}Pole 'tags' powinno być listą.")
@@ -0,0 +1,168 @@
+import bisect
+import math
+import os
+import tempfile
+import threading
+
+# -----------------------------------------------------------------------------
+# Metryki w formacie Prometheusa
+# -----------------------------------------------------------------------------
+#
+# Minimalny rejestr liczników i histogramów (bez zależności od
+# `prometheus_client`), renderowany w tekstowym formacie ekspozycji
+# Prometheusa:
+#
+# 1.  **Koszt**: Obserwacja to wyszukanie kubełka (`bisect`) i kilka dodawań
+#     pod jedną blokadą metryki, więc metryki mogą być włączone w produkcji.
+#
+# 2.  **Etykiety**: Wartości etykiet muszą mieć ograniczoną liczbę wariantów
+#     (np. nazwa widoku z `resolver_match`, a nie ścieżka URL).
+#
+# 3.  **Eksport**: Procesy web udostępniają rejestr na `/api/v1/metrics/`.
+#     Procesy bez serwera HTTP (workery Celery) zapisują go do pliku dla
+#     kolektora plików tekstowych (`write_textfile`).
+#
+# Każdy proces ma własny rejestr, więc przy wielu procesach gunicorna każdy
+# scrape widzi jeden z nich - gunicorn uruchamiany jest z jednym procesem
+# i wieloma wątkami (`gthread`).
+#
+# -----------------------------------------------------------------------------
+
+# Domyślne kubełki czasu (w sekundach), od 1 ms do 30 s.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Licznik rosnący, osobny dla każdej kombinacji wartości etykiet."""
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self, const_labels=()):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}_total{_format_labels(self.label_names, label_values, const_labels)} {_format_value(value)}'
+
+
+class Histogram:
+    """Histogram z kubełkami skumulowanymi w chwili renderowania."""
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # {etykiety: [liczniki kubełków (ostatni = +Inf), suma, liczba]}
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, *label_values):
+        entry = self._values.get(label_values)
+        return entry[2] if entry else 0
+
+    def sum(self, *label_values):
+        entry = self._values.get(label_values)
+        return entry[1] if entry else 0.0
+
+    def samples(self, const_labels=()):
+        with self._lock:
+            values = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items())
+        for label_values, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, label_values, [*const_labels, ('le', _format_value(float(bound)))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.label_names, label_values, const_labels)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {count}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def render(self, const_labels=None):
+        """
+        Wszystkie metryki w tekstowym formacie ekspozycji Prometheusa.
+        `const_labels` to etykiety dodawane do każdej serii (np. proces workera).
+        """
+        const_labels = tuple((const_labels or {}).items())
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            lines.extend(metric.samples(const_labels))
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path, const_labels=None):
+        """Atomowo zapisuje metryki do pliku dla kolektora plików tekstowych."""
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False, encoding='utf-8') as f:
+            f.write(self.render(const_labels))
+        os.replace(f.name, path)
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
@@ -0,0 +1,113 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .metrics import REGISTRY
+
+# -----------------------------------------------------------------------------
+# Pomiar żądań
+# -----------------------------------------------------------------------------
+#
+# `RequestMetricsMiddleware` mierzy każde żądanie:
+#
+# 1.  **Czas całkowity** (od wejścia do middleware do zwrócenia odpowiedzi).
+#
+# 2.  **SQL**: liczba zapytań i łączny czas ich wykonania, zbierane przez
+#     `connection.execute_wrapper` (działa również przy `DEBUG=False`).
+#
+# 3.  **Serializacja**: czas renderowania odpowiedzi DRF (`Response.render`,
+#     czyli zamiana danych na JSON) - od `process_template_response` do
+#     wywołania zwrotnego po renderowaniu.
+#
+# 4.  **Rozmiar odpowiedzi** w bajtach (poza odpowiedziami strumieniowymi).
+#
+# Wyniki trafiają do nagłówka `Server-Timing` (widocznego w narzędziach
+# deweloperskich przeglądarki) oraz do histogramów per widok, dostępnych
+# w formacie Prometheusa na `/api/v1/metrics/` (patrz `metrics.py`).
+# Widoki identyfikowane są nazwą z `resolver_match` (np.
+# `api_v1:question-list`), a nie ścieżką, więc liczba serii jest stała.
+#
+# Pomiar wyłącza `REQUEST_METRICS_ENABLED=False`.
+#
+# -----------------------------------------------------------------------------
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+REQUESTS = REGISTRY.counter('http_requests', 'Liczba obsłużonych żądań HTTP.', ('view', 'method', 'status'))
+REQUEST_DURATION = REGISTRY.histogram('http_request_duration_seconds', 'Czas obsługi żądania HTTP.', ('view', 'method'))
+DB_QUERIES = REGISTRY.histogram('http_request_db_queries', 'Liczba zapytań SQL na żądanie.', ('view', 'method'), QUERY_COUNT_BUCKETS)
+DB_DURATION = REGISTRY.histogram('http_request_db_duration_seconds', 'Łączny czas zapytań SQL na żądanie.', ('view', 'method'))
+RENDER_DURATION = REGISTRY.histogram('http_response_render_duration_seconds', 'Czas serializacji (renderowania) odpowiedzi.', ('view', 'method'))
+RESPONSE_SIZE = REGISTRY.histogram('http_response_size_bytes', 'Rozmiar odpowiedzi HTTP.', ('view', 'method'), SIZE_BUCKETS)
+
+
+class RequestTimings:
+    """Pomiary jednego żądania; jednocześnie wrapper zapytań SQL."""
+
+    __slots__ = ('queries', 'db_time', 'render_start', 'render_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_start = None
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self, total):
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries", '
+            f'render;dur={self.render_time * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        timings = request._request_timings = RequestTimings()
+        with connection.execute_wrapper(timings):
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        response['Server-Timing'] = timings.server_timing(total)
+        self.observe(request, response, timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        timings = getattr(request, '_request_timings', None)
+        if timings is not None:
+            timings.render_start = time.perf_counter()
+
+            def render_finished(rendered):
+                timings.render_time = time.perf_counter() - timings.render_start
+
+            response.add_post_render_callback(render_finished)
+        return response
+
+    @staticmethod
+    def observe(request, response, timings, total):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unmatched'
+        method = request.method
+        REQUESTS.inc(view, method, str(response.status_code))
+        REQUEST_DURATION.observe(total, view, method)
+        DB_QUERIES.observe(timings.queries, view, method)
+        DB_DURATION.observe(timings.db_time, view, method)
+        RENDER_DURATION.observe(timings.render_time, view, method)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(len(response.content), view, method)
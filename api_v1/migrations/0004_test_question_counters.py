@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-18 02:36
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_question_counters(apps, schema_editor):
+    Test = apps.get_model('api_v1', 'Test')
+    counts = Test.objects.annotate(
+        total=Count('questions'),
+        open=Count('questions', filter=Q(questions__question_type='open-ended')),
+    ).values_list('id', 'total', 'open')
+    for test_id, total, open_count in counts:
+        Test.objects.filter(pk=test_id).update(
+            open_count=open_count,
+            closed_count=total - open_count,
+            total_count=total,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0003_add_default_prompt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='closed_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Liczba pytań zamkniętych w teście.'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='open_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Liczba pytań otwartych w teście.'),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='total_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Łączna liczba pytań w teście.'),
+        ),
+        migrations.AddIndex(
+            model_name='test',
+            index=models.Index(fields=['-created_at'], name='test_created_at_idx'),
+        ),
+        migrations.RunPython(populate_question_counters, migrations.RunPython.noop),
+    ]
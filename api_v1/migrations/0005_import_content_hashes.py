@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0004_test_question_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Skrót SHA-256 danych pytania z pliku źródłowego.', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='source_key',
+            field=models.CharField(blank=True, default='', editable=False, help_text="Stabilny klucz pytania w pliku źródłowym (np. jego 'id').", max_length=255),
+        ),
+        migrations.AddField(
+            model_name='test',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, help_text='Skrót SHA-256 pliku JSON, z którego test został ostatnio zaimportowany.', max_length=64),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:35
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0005_import_content_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Attempt',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('session_id', models.CharField(help_text='ID sesji quizu, w której rozwiązano test.', max_length=64)),
+                ('score', models.PositiveIntegerField(help_text='Liczba poprawnych odpowiedzi na pytania zamknięte.')),
+                ('max_score', models.PositiveIntegerField(help_text='Liczba pytań zamkniętych w sesji quizu.')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Data i czas przyjęcia podejścia.')),
+            ],
+            options={
+                'verbose_name': 'Podejście',
+                'verbose_name_plural': 'Podejścia',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at'], name='attempt_created_at_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AttemptAnswer',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('question_index', models.PositiveSmallIntegerField(help_text='Pozycja pytania w sesji quizu.')),
+                ('selected', models.JSONField(blank=True, help_text='Indeksy wybranych odpowiedzi (w kolejności `Answer.Meta.ordering`) dla pytań zamkniętych.', null=True)),
+                ('user_answer', models.TextField(blank=True, help_text='Odpowiedź użytkownika dla pytań otwartych.', null=True)),
+                ('is_correct', models.BooleanField(help_text='Wynik pytania zamkniętego; puste dla pytań otwartych.', null=True)),
+                ('task_id', models.CharField(blank=True, help_text='ID zadania oceny AI dla pytań otwartych.', max_length=255, null=True)),
+                ('attempt', models.ForeignKey(help_text='Podejście, do którego należy odpowiedź.', on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='api_v1.attempt')),
+                ('question', models.ForeignKey(help_text='Pytanie (puste, jeśli zostało usunięte).', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attempt_answers', to='api_v1.question')),
+            ],
+            options={
+                'verbose_name': 'Odpowiedź w podejściu',
+                'verbose_name_plural': 'Odpowiedzi w podejściach',
+                'ordering': ['question_index'],
+                'indexes': [models.Index(fields=['attempt'], name='attempt_answer_attempt_idx'), models.Index(fields=['question'], name='attempt_answer_question_idx')],
+                'constraints': [models.UniqueConstraint(fields=('attempt', 'question_index'), name='unique_attempt_question_index')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0006_attempts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['test', 'question_type', 'id'], name='question_sampling_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='question',
+            name='question_test_id_idx',
+        ),
+    ]
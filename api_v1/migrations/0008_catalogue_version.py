@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_v1', '0007_question_sampling_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, editable=False, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(help_text='Bieżący numer wersji katalogu.')),
+            ],
+            options={
+                'verbose_name': 'Wersja katalogu',
+                'verbose_name_plural': 'Wersje katalogu',
+            },
+        ),
+    ]
@@ -29,6 +29,7 @@ from django.db import models
 
 import uuid
 from django.db import models
+from django.utils import timezone
 
 class Category(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, help_text="Unikalny identyfikator UUID dla kategorii.")
@@ -63,14 +64,72 @@ class Test(models.Model):
     updated_at = models.DateTimeField(auto_now=True, help_text="Data i czas ostatniej aktualizacji testu.")
     categories = models.ManyToManyField(Category, related_name="tests", blank=True, help_text="Kategorie, do których należy test.")
 
+    # Zdenormalizowane liczniki pytań. Utrzymywane przy zapisie pytań
+    # (sygnały w `signals.py`) oraz przez `refresh_question_counts()` po
+    # operacjach masowych, dzięki czemu lista testów nie wymaga agregacji.
+    open_count = models.PositiveIntegerField(default=0, editable=False, help_text="Liczba pytań otwartych w teście.")
+    closed_count = models.PositiveIntegerField(default=0, editable=False, help_text="Liczba pytań zamkniętych w teście.")
+    total_count = models.PositiveIntegerField(default=0, editable=False, help_text="Łączna liczba pytań w teście.")
+
+    COUNTER_FIELDS = ('open_count', 'closed_count', 'total_count')
+
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False, help_text="Skrót SHA-256 pliku JSON, z którego test został ostatnio zaimportowany.")
+
     class Meta:
         verbose_name = "Test"
         verbose_name_plural = "Testy"
         ordering = ['-created_at']
+        indexes = [models.Index(fields=['-created_at'], name='test_created_at_idx')]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        # Liczniki są aktualizowane wyłącznie atomowymi UPDATE-ami, więc zwykły
+        # zapis istniejącego testu nie może ich nadpisać wartościami, które
+        # obiekt w pamięci wczytał wcześniej.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    def refresh_question_counts(self):
+        """
+        Przelicza liczniki pytań jednym zapytaniem agregującym i zapisuje je
+        w bazie. Używane po operacjach masowych, które omijają sygnały.
+        """
+        Test.refresh_question_counts_for([self.pk])
+        self.refresh_from_db(fields=self.COUNTER_FIELDS)
+
+    @staticmethod
+    def refresh_question_counts_for(test_ids):
+        """Przelicza liczniki pytań dla podanych testów (jedno zapytanie agregujące)."""
+        counts = {
+            str(row['test_id']): row
+            for row in Question.objects.filter(test_id__in=test_ids).order_by().values('test_id').annotate(
+                total=models.Count('id'),
+                open=models.Count('id', filter=models.Q(question_type=Question.OPEN_ENDED)),
+            )
+        }
+        for test_id in test_ids:
+            row = counts.get(str(test_id), {'total': 0, 'open': 0})
+            Test.objects.filter(pk=test_id).update(
+                open_count=row['open'],
+                closed_count=row['total'] - row['open'],
+                total_count=row['total'],
+            )
+
+    @staticmethod
+    def adjust_question_counts(test_id, question_type, delta):
+        """Atomowo zmienia liczniki testu o `delta` dla pytania danego typu."""
+        kind = 'open_count' if question_type == Question.OPEN_ENDED else 'closed_count'
+        Test.objects.filter(pk=test_id).update(**{
+            kind: models.F(kind) + delta,
+            'total_count': models.F('total_count') + delta,
+        })
+
 class Question(models.Model):
     SINGLE_CHOICE = 'single-choice'
     MULTIPLE_CHOICE = 'multiple-choice'
@@ -107,11 +166,20 @@ class Question(models.Model):
 
     tags = models.ManyToManyField(Tag, related_name="questions", blank=True, help_text="Tagi powiązane z pytaniem.")
 
+    # Pola używane przez import przyrostowy (`import_quizzes --incremental`):
+    # stabilny klucz pytania w pliku źródłowym i skrót jego zawartości.
+    source_key = models.CharField(max_length=255, blank=True, default='', editable=False, help_text="Stabilny klucz pytania w pliku źródłowym (np. jego 'id').")
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False, help_text="Skrót SHA-256 danych pytania z pliku źródłowego.")
+
     class Meta:
         verbose_name = "Pytanie"
         verbose_name_plural = "Pytania"
         ordering = ['id']
-        indexes = [models.Index(fields=['test'], name='question_test_id_idx')]
+        # Indeks pokrywający zapytanie budujące indeks ID do losowania
+        # (`sampling.build_question_index`): filtr po teście i typie oraz
+        # ID odczytywane z samego indeksu, bez sięgania do szerokich wierszy
+        # (treść, wyjaśnienie, kryteria oceny).
+        indexes = [models.Index(fields=['test', 'question_type', 'id'], name='question_sampling_idx')]
         constraints = [models.UniqueConstraint(fields=['test', 'text'], name='unique_question_text_in_test')]
 
     def __str__(self):
@@ -203,6 +271,68 @@ class ReportedIssue(models.Model):
         return f"Zgłoszenie {self.id} dla pytania {self.question.id}"
 
 
+class Attempt(models.Model):
+    """
+    Zapisane podejście do quizu (wynik `/score_attempt/`). Wiersze trafiają
+    do bazy z opóźnieniem, partiami (patrz `attempt_log.py`), więc `id`
+    i `created_at` nadawane są w chwili przyjęcia podejścia.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    session_id = models.CharField(max_length=64, help_text="ID sesji quizu, w której rozwiązano test.")
+    score = models.PositiveIntegerField(help_text="Liczba poprawnych odpowiedzi na pytania zamknięte.")
+    max_score = models.PositiveIntegerField(help_text="Liczba pytań zamkniętych w sesji quizu.")
+    created_at = models.DateTimeField(default=timezone.now, help_text="Data i czas przyjęcia podejścia.")
+
+    class Meta:
+        verbose_name = "Podejście"
+        verbose_name_plural = "Podejścia"
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['-created_at'], name='attempt_created_at_idx')]
+
+    def __str__(self):
+        return f"Podejście {self.id} ({self.score}/{self.max_score})"
+
+
+class AttemptAnswer(models.Model):
+    """Odpowiedź na jedno pytanie w ramach podejścia."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    attempt = models.ForeignKey(Attempt, on_delete=models.CASCADE, related_name="answers", help_text="Podejście, do którego należy odpowiedź.")
+    question = models.ForeignKey(Question, on_delete=models.SET_NULL, null=True, related_name="attempt_answers", help_text="Pytanie (puste, jeśli zostało usunięte).")
+    question_index = models.PositiveSmallIntegerField(help_text="Pozycja pytania w sesji quizu.")
+    selected = models.JSONField(blank=True, null=True, help_text="Indeksy wybranych odpowiedzi (w kolejności `Answer.Meta.ordering`) dla pytań zamkniętych.")
+    user_answer = models.TextField(blank=True, null=True, help_text="Odpowiedź użytkownika dla pytań otwartych.")
+    is_correct = models.BooleanField(null=True, help_text="Wynik pytania zamkniętego; puste dla pytań otwartych.")
+    task_id = models.CharField(max_length=255, blank=True, null=True, help_text="ID zadania oceny AI dla pytań otwartych.")
+
+    class Meta:
+        verbose_name = "Odpowiedź w podejściu"
+        verbose_name_plural = "Odpowiedzi w podejściach"
+        ordering = ['question_index']
+        indexes = [
+            models.Index(fields=['attempt'], name='attempt_answer_attempt_idx'),
+            models.Index(fields=['question'], name='attempt_answer_question_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['attempt', 'question_index'], name='unique_attempt_question_index'),
+        ]
+
+
+class CatalogueVersion(models.Model):
+    """
+    Numer wersji katalogu testów - jeden wiersz wspólny dla wszystkich
+    procesów (patrz `catalogue.py`). Cache trzyma jedynie jego kopię.
+    """
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1, editable=False)
+    value = models.BigIntegerField(help_text="Bieżący numer wersji katalogu.")
+
+    class Meta:
+        verbose_name = "Wersja katalogu"
+        verbose_name_plural = "Wersje katalogu"
+
+    def __str__(self):
+        return f"Wersja katalogu {self.value}"
+
+
 class PromptConfiguration(models.Model):
     name = models.CharField(max_length=100, unique=True, help_text="Unikalna nazwa dla promptu, np. 'default_grading_prompt'")
     prompt_text = models.TextField(help_text="Szablon promptu. Użyj {zmiennych} dla dynamicznych danych.")
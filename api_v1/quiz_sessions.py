@@ -0,0 +1,126 @@
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .catalogue import get_catalogue_version
+from .models import Question
+from .snapshot import get_current_snapshot
+
+# -----------------------------------------------------------------------------
+# Sesje quizu po stronie serwera
+# -----------------------------------------------------------------------------
+#
+# Bez sesji klient odsyła przy każdej ocenie treść pytania, kryteria oceny
+# i maksymalną liczbę punktów, a serwer ocenia to, co dostał. Z parametrem
+# `session=true` widok `/questions/` zapisuje we współdzielonym cache
+# (Redis) zwarty opis quizu i zwraca jego ID:
+#
+# 1.  **Zawartość sesji**: lista `[id_pytania, permutacja_opcji]` w kolejności
+#     quizu. Permutacja to indeksy odpowiedzi (w kolejności
+#     `Answer.Meta.ordering`) w kolejności, w jakiej pokazano je klientowi,
+#     albo None dla pytań otwartych.
+#
+# 2.  **Ocena**: `/check_answer/` i `/check_answers/` przyjmują
+#     `{"sessionId", "questionIndex", "userAnswer"}`. Treść pytania, kryteria
+#     i punkty pochodzą z migawki banku pytań (patrz `snapshot.py`) albo
+#     z cache danych pytania (klucz z wersją katalogu), a dopiero w ostateczności
+#     z bazy danych - nigdy od klienta.
+#
+# Sesja wygasa po `QUIZ_SESSION_TTL` sekundach.
+#
+# **Ograniczenie**: sesja ukrywa przed przeglądarką tylko kryteria oceny.
+# `correctAnswers` pytań zamkniętych wciąż trafiają do klienta, bo frontend
+# ocenia je lokalnie zaraz po potwierdzeniu wyboru (natychmiastowa
+# informacja zwrotna i przegląd odpowiedzi). Wynik pytań zamkniętych
+# liczony w przeglądarce nie jest więc wiarygodny - ocenę po stronie
+# serwera daje `/score_attempt/` (patrz `scoring.py`), którego frontend
+# jeszcze nie używa.
+#
+# -----------------------------------------------------------------------------
+
+SESSION_CACHE_KEY = 'quiz_session:{session_id}'
+QUESTION_GRADING_CACHE_KEY = 'question_grading:{version}:{question_id}'
+
+
+class QuizSessionError(Exception):
+    """Błąd odwołania do sesji quizu; `code` trafia do odpowiedzi API."""
+
+    def __init__(self, code, message, status_code=400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+
+
+def create_session(questions, permutations):
+    """Zapisuje sesję dla zserializowanych pytań quizu i zwraca jej ID."""
+    session_id = uuid.uuid4().hex
+    entries = [[question['id'], permutation] for question, permutation in zip(questions, permutations)]
+    cache.set(SESSION_CACHE_KEY.format(session_id=session_id), entries, timeout=settings.QUIZ_SESSION_TTL)
+    return session_id
+
+
+def get_session(session_id):
+    """Lista `[id_pytania, permutacja]` sesji albo None, gdy sesja wygasła."""
+    if not isinstance(session_id, str) or not session_id:
+        return None
+    return cache.get(SESSION_CACHE_KEY.format(session_id=session_id))
+
+
+def get_question_grading_data(question_id):
+    """
+    Zwraca `(treść, kryteria, maks. punkty)` pytania otwartego albo None,
+    gdy pytanie nie istnieje lub nie jest otwarte.
+    """
+    snapshot = get_current_snapshot()
+    if snapshot is not None:
+        position = snapshot.position_of(question_id)
+        if position is None:
+            return None
+        _, _, text, _, question_type, _, grading_criteria, max_points, _, _ = snapshot.record(position)
+        return (text, grading_criteria, max_points) if question_type == Question.OPEN_ENDED else None
+
+    key = QUESTION_GRADING_CACHE_KEY.format(version=get_catalogue_version(), question_id=question_id)
+    data = cache.get(key)
+    if data is None:
+        row = (
+            Question.objects
+            .filter(id=question_id, question_type=Question.OPEN_ENDED)
+            .values_list('text', 'grading_criteria', 'max_points')
+            .first()
+        )
+        # Brak pytania zapisujemy jako pustą listę, aby nie odpytywać bazy ponownie.
+        data = list(row) if row else []
+        cache.set(key, data, timeout=settings.QUIZ_SESSION_TTL)
+    return tuple(data) if data else None
+
+
+def is_valid_question_index(entries, question_index):
+    return not isinstance(question_index, bool) and isinstance(question_index, int) and 0 <= question_index < len(entries)
+
+
+def resolve_answer(session_id, question_index, user_answer, sessions=None):
+    """
+    Zwraca argumenty `generate_ai_answer` `(odpowiedź, kryteria, treść,
+    punkty)` dla pytania `question_index` sesji. `sessions` to opcjonalny
+    słownik już wczytanych sesji (ocena wielu odpowiedzi naraz).
+    """
+    if sessions is None:
+        sessions = {}
+    if not isinstance(session_id, str):
+        entries = None
+    elif session_id in sessions:
+        entries = sessions[session_id]
+    else:
+        entries = sessions[session_id] = get_session(session_id)
+    if entries is None:
+        raise QuizSessionError("SESSION_NOT_FOUND", "Sesja quizu nie istnieje lub wygasła.", status_code=404)
+
+    if not is_valid_question_index(entries, question_index):
+        raise QuizSessionError("INVALID_QUESTION_INDEX", "Nieprawidłowy indeks pytania w sesji quizu.")
+    data = get_question_grading_data(entries[question_index][0])
+    if data is None:
+        raise QuizSessionError("INVALID_QUESTION_INDEX", "Indeks nie wskazuje pytania otwartego w sesji quizu.")
+    question_text, grading_criteria, max_points = data
+    return (user_answer, grading_criteria, question_text, max_points)
@@ -0,0 +1,173 @@
+import bisect
+import random
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Question
+
+# -----------------------------------------------------------------------------
+# Silnik losowania pytań
+# -----------------------------------------------------------------------------
+#
+# `order_by('?')` zmusza bazę danych do posortowania WSZYSTKICH pasujących
+# wierszy po `random()` przy każdym starcie quizu. Przy dużych bankach pytań
+# to najwolniejsza operacja w całym API.
+#
+# Zamiast tego:
+#
+# 1.  **Indeks ID**: Dla każdego testu trzymamy w cache słownik
+#     `{typ_pytania: [id, id, ...]}`. Indeks budowany jest jednym wąskim
+#     zapytaniem (tylko kolumny `test_id`, `question_type`, `id`, odczytywane
+#     z samego indeksu pokrywającego `question_sampling_idx`) i
+#     unieważniany sygnałami przy każdej zmianie pytań (patrz `signals.py`).
+#     Każdy proces trzyma też własną kopię indeksu, sprawdzaną krótkim
+#     tokenem wersji we współdzielonym cache (Redis).
+#
+# 2.  **Losowanie bez sortowania**: Listy ID z wybranych testów i typów
+#     traktujemy jak jedną wirtualną tablicę. Losujemy N pozycji z zakresu
+#     `range(total)` i mapujemy je na konkretne listy przez `bisect`, więc
+#     nie trzeba niczego sklejać ani sortować. Losowość pochodzi z wyboru
+#     pozycji w indeksie, więc pytania nie potrzebują kolumny z kluczem
+#     losowym (`random_key`) ani indeksu na niej.
+#
+# 3.  **Pobranie tylko wybranych wierszy**: Dopiero na końcu pobieramy z bazy
+#     pełne dane N wylosowanych pytań (`id__in`), w kolejności losowania.
+#
+# -----------------------------------------------------------------------------
+
+INDEX_CACHE_KEY = 'question_index:{test_id}:{token}'
+INDEX_TOKEN_CACHE_KEY = 'question_index_token:{test_id}'
+
+# Typy pytań odpowiadające poszczególnym trybom quizu.
+MODE_QUESTION_TYPES = {
+    'open': (Question.OPEN_ENDED,),
+    'closed': (Question.SINGLE_CHOICE, Question.MULTIPLE_CHOICE),
+    'mixed': (Question.SINGLE_CHOICE, Question.MULTIPLE_CHOICE, Question.OPEN_ENDED),
+}
+
+# Kopie indeksów trzymane w pamięci procesu: `{test_id: (token, indeks)}`.
+# Kopia jest ważna tak długo, jak jej token zgadza się z tokenem we
+# współdzielonym cache, więc na gorącej ścieżce pobieramy z cache tylko
+# krótkie tokeny, a nie całe (zserializowane) listy ID.
+_local_indexes = {}
+
+
+def build_question_index(test_ids):
+    """
+    Buduje indeks `{test_id: {typ_pytania: [id, ...]}}` dla podanych testów
+    jednym zapytaniem do bazy. Testy bez pytań dostają pusty słownik, aby
+    również trafiły do cache.
+
+    Zapytanie czyta tylko indeks `question_sampling_idx` (test, typ, ID),
+    bez sięgania do wierszy tabeli, a wiersze pobierane są strumieniowo.
+    """
+    index = {str(test_id): {} for test_id in test_ids}
+    test_keys = {}
+    rows = (
+        Question.objects
+        .filter(test_id__in=test_ids)
+        .order_by()
+        .values_list('test_id', 'question_type', 'id')
+        .iterator(chunk_size=10000)
+    )
+    for test_id, question_type, question_id in rows:
+        test_key = test_keys.get(test_id)
+        if test_key is None:
+            test_key = test_keys[test_id] = str(test_id)
+        index[test_key].setdefault(question_type, []).append(str(question_id))
+    return index
+
+
+def get_question_index(test_ids):
+    """
+    Zwraca indeks ID pytań dla podanych testów.
+
+    Kolejność źródeł: kopia w pamięci procesu (jeśli token jest aktualny),
+    współdzielony cache, a na końcu baza danych (jedno zapytanie dla
+    wszystkich brakujących testów).
+    """
+    test_ids = [str(test_id) for test_id in test_ids]
+    token_keys = {INDEX_TOKEN_CACHE_KEY.format(test_id=test_id): test_id for test_id in test_ids}
+    tokens = {token_keys[key]: token for key, token in cache.get_many(token_keys.keys()).items()}
+
+    index = {}
+    stale = {}
+    for test_id in test_ids:
+        token = tokens.get(test_id)
+        local = _local_indexes.get(test_id)
+        if token is not None and local is not None and local[0] == token:
+            index[test_id] = local[1]
+        elif token is not None:
+            stale[INDEX_CACHE_KEY.format(test_id=test_id, token=token)] = test_id
+
+    if stale:
+        for key, entry in cache.get_many(stale.keys()).items():
+            test_id = stale[key]
+            index[test_id] = entry
+            _local_indexes[test_id] = (tokens[test_id], entry)
+
+    missing = [test_id for test_id in test_ids if test_id not in index]
+    if missing:
+        timeout = settings.QUESTION_INDEX_CACHE_TIMEOUT
+        built = build_question_index(missing)
+        to_cache = {}
+        for test_id, entry in built.items():
+            token = uuid.uuid4().hex
+            to_cache[INDEX_TOKEN_CACHE_KEY.format(test_id=test_id)] = token
+            to_cache[INDEX_CACHE_KEY.format(test_id=test_id, token=token)] = entry
+            _local_indexes[test_id] = (token, entry)
+        cache.set_many(to_cache, timeout=timeout)
+        index.update(built)
+    return index
+
+
+def invalidate_question_index(*test_ids):
+    """
+    Unieważnia indeksy podanych testów we wszystkich procesach, usuwając
+    ich tokeny ze współdzielonego cache. Kolejne losowanie je odbuduje.
+    """
+    test_ids = {str(test_id) for test_id in test_ids if test_id}
+    for test_id in test_ids:
+        _local_indexes.pop(test_id, None)
+    cache.delete_many([INDEX_TOKEN_CACHE_KEY.format(test_id=test_id) for test_id in test_ids])
+
+
+def sample_question_ids(test_ids, mode, num_questions, rng=random):
+    """
+    Losuje do `num_questions` ID pytań (bez powtórzeń) spośród pytań
+    wybranych testów, zgodnych z trybem `mode`. Kolejność wyniku jest losowa.
+    """
+    question_types = MODE_QUESTION_TYPES[mode]
+    index = get_question_index(test_ids)
+
+    segments = []
+    offsets = []
+    total = 0
+    for test_id in dict.fromkeys(str(test_id) for test_id in test_ids):
+        for question_type in question_types:
+            ids = index.get(test_id, {}).get(question_type)
+            if ids:
+                offsets.append(total)
+                segments.append(ids)
+                total += len(ids)
+
+    picks = rng.sample(range(total), min(max(num_questions, 0), total))
+    result = []
+    for position in picks:
+        segment = bisect.bisect_right(offsets, position) - 1
+        result.append(segments[segment][position - offsets[segment]])
+    return result
+
+
+def fetch_questions(question_ids, queryset=None):
+    """
+    Pobiera pełne obiekty pytań dla podanych ID i zwraca je w tej samej
+    kolejności. ID, których nie ma już w bazie (np. nieaktualny indeks),
+    są pomijane.
+    """
+    if queryset is None:
+        queryset = Question.objects.all()
+    by_id = {str(question.id): question for question in queryset.filter(id__in=question_ids)}
+    return [by_id[question_id] for question_id in question_ids if question_id in by_id]
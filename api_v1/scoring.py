@@ -0,0 +1,202 @@
+import threading
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .catalogue import get_catalogue_version
+from .models import Answer, Question
+from .snapshot import get_current_snapshot
+
+# -----------------------------------------------------------------------------
+# Ocena pytań zamkniętych po stronie serwera
+# -----------------------------------------------------------------------------
+#
+# `/score_attempt/` przyjmuje całe podejście w sesji quizu (patrz
+# `quiz_sessions.py`) i ocenia wszystkie pytania zamknięte w jednym
+# przejściu:
+#
+# 1.  **Klucz odpowiedzi**: Dla każdego pytania trzymamy krotkę
+#     `(typ, maska_poprawnych, liczba_opcji)`. Bit `i` maski oznacza, że
+#     odpowiedź nr `i` (w kolejności `Answer.Meta.ordering`) jest poprawna.
+#
+# 2.  **Ocena**: Wybrane przez klienta indeksy opcji mapujemy przez
+#     permutację z sesji na indeksy odpowiedzi i składamy w maskę. Odpowiedź
+#     jest poprawna, gdy maski są równe - jak w przeglądarce (równość zbiorów).
+#
+# 3.  **Cache**: Klucze trzymane są w pamięci procesu pod bieżącą wersją
+#     katalogu testów, a brakujące pobierane z migawki banku pytań, ze
+#     współdzielonego cache albo (jednym zapytaniem) z bazy danych. Zmiana
+#     pytań podbija wersję katalogu, więc stare klucze przestają być używane.
+#     Kopia w pamięci procesu to LRU ograniczone do `LOCAL_KEYS_MAX_ENTRIES`
+#     wpisów, czyszczone przy zmianie wersji katalogu.
+#
+# 4.  **Nieaktualne sesje**: Jeśli liczba odpowiedzi pytania zmieniła się po
+#     utworzeniu sesji, permutacja z sesji nie pasuje do klucza. Takiej
+#     odpowiedzi nie da się ocenić - zgłaszamy `StaleSessionError` (409).
+#
+# -----------------------------------------------------------------------------
+
+ANSWER_KEY_CACHE_KEY = 'answer_key:{version}:{question_id}'
+
+LOCAL_KEYS_MAX_ENTRIES = 20000
+
+
+class StaleSessionError(ValueError):
+    """Permutacja z sesji nie pasuje do bieżącego klucza odpowiedzi pytania."""
+
+
+class LocalAnswerKeys:
+    """
+    Klucze odpowiedzi w pamięci procesu: LRU dla jednej wersji katalogu,
+    bezpieczne przy wielu wątkach workera.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, version, question_ids):
+        with self._lock:
+            if self.version != version:
+                self.version = version
+                self._entries.clear()
+            keys = {}
+            for question_id in question_ids:
+                key = self._entries.get(question_id)
+                if key is not None:
+                    self._entries.move_to_end(question_id)
+                    keys[question_id] = key
+            return keys
+
+    def set_many(self, version, keys):
+        with self._lock:
+            if self.version != version:
+                return
+            self._entries.update(keys)
+            for question_id in keys:
+                self._entries.move_to_end(question_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self.version = None
+            self._entries.clear()
+
+
+_local_keys = LocalAnswerKeys(LOCAL_KEYS_MAX_ENTRIES)
+
+
+def build_answer_keys(question_ids):
+    """Buduje klucze odpowiedzi podanych pytań dwoma zapytaniami do bazy."""
+    keys = {}
+    correct = defaultdict(list)
+    for question_id, is_correct in Answer.objects.filter(question_id__in=question_ids).order_by('id').values_list('question_id', 'is_correct'):
+        correct[str(question_id)].append(is_correct)
+    for question_id, question_type in Question.objects.filter(id__in=question_ids).order_by().values_list('id', 'question_type'):
+        question_id = str(question_id)
+        keys[question_id] = answer_key(question_type, correct.get(question_id, []))
+    return keys
+
+
+def answer_key(question_type, correct_flags):
+    """Klucz `(typ, maska_poprawnych, liczba_opcji)` z flag poprawności odpowiedzi."""
+    mask = 0
+    for index, is_correct in enumerate(correct_flags):
+        if is_correct:
+            mask |= 1 << index
+    return (question_type, mask, len(correct_flags))
+
+
+def get_answer_keys(question_ids, version=None):
+    """
+    Zwraca `{id_pytania: klucz}` dla podanych pytań (pytań, których nie ma
+    w bazie, brak w wyniku).
+    """
+    if version is None:
+        version = get_catalogue_version()
+    keys = _local_keys.get_many(version, question_ids)
+    missing = [question_id for question_id in question_ids if question_id not in keys]
+    if not missing:
+        return keys
+
+    snapshot = get_current_snapshot()
+    if snapshot is not None and snapshot.catalogue_version == version:
+        for question_id in missing:
+            position = snapshot.position_of(question_id)
+            if position is not None:
+                record = snapshot.record(position)
+                keys[question_id] = answer_key(record[4], [is_correct for _, is_correct in record[9]])
+        _local_keys.set_many(version, {question_id: keys[question_id] for question_id in missing if question_id in keys})
+        return keys
+
+    cache_keys = {ANSWER_KEY_CACHE_KEY.format(version=version, question_id=question_id): question_id for question_id in missing}
+    for cache_key, key in cache.get_many(cache_keys.keys()).items():
+        question_id = cache_keys[cache_key]
+        keys[question_id] = tuple(key)
+    missing = [question_id for question_id in missing if question_id not in keys]
+    if missing:
+        built = build_answer_keys(missing)
+        cache.set_many(
+            {ANSWER_KEY_CACHE_KEY.format(version=version, question_id=question_id): key for question_id, key in built.items()},
+            timeout=settings.QUIZ_SESSION_TTL,
+        )
+        keys.update(built)
+    _local_keys.set_many(version, {question_id: keys[question_id] for question_id in question_ids if question_id in keys})
+    return keys
+
+
+def selection_mask(selected, permutation, option_count):
+    """
+    Maska odpowiedzi wybranych przez klienta (indeksy opcji w kolejności
+    wyświetlania) albo None, gdy wybór jest nieprawidłowy lub permutacja
+    z sesji nie pasuje do liczby opcji.
+    """
+    if not isinstance(selected, list) or (permutation and len(permutation) != option_count):
+        return None
+    mask = 0
+    for index in selected:
+        if isinstance(index, bool) or not isinstance(index, int) or not 0 <= index < option_count:
+            return None
+        mask |= 1 << (permutation[index] if permutation else index)
+    return mask
+
+
+def displayed_indices(mask, permutation):
+    """Indeksy poprawnych opcji w kolejności, w jakiej pokazano je klientowi."""
+    order = permutation or range(mask.bit_length())
+    return [position for position, index in enumerate(order) if mask >> index & 1]
+
+
+def score_closed_answers(entries, answers, keys):
+    """
+    Ocenia odpowiedzi na pytania zamknięte. `entries` to wpisy sesji
+    `[id_pytania, permutacja]`, `answers` - pary `(indeks_pytania, wybrane)`,
+    `keys` - klucze odpowiedzi. Zwraca listę wyników w kolejności `answers`
+    albo zgłasza ValueError z indeksem błędnej odpowiedzi (StaleSessionError,
+    gdy pytanie zmieniło się po utworzeniu sesji).
+    """
+    results = []
+    for position, (question_index, selected) in enumerate(answers):
+        question_id, permutation = entries[question_index]
+        key = keys.get(question_id)
+        if key is None or key[0] == Question.OPEN_ENDED:
+            raise ValueError(position)
+        _, correct_mask, option_count = key
+        if permutation and len(permutation) != option_count:
+            raise StaleSessionError(position)
+        mask = selection_mask(selected, permutation, option_count)
+        if mask is None:
+            raise ValueError(position)
+        results.append({
+            'questionIndex': question_index,
+            'correct': mask == correct_mask,
+            'correctAnswers': displayed_indices(correct_mask, permutation),
+        })
+    return results
@@ -1,3 +1,6 @@
+import random
+from collections import defaultdict
+
 from rest_framework import serializers
 from .models import Test, Question, Answer, Category, Tag, ReportedIssue
 from django.db.models import Count, Q
@@ -25,8 +28,9 @@ from django.db.models import Count, Q
 #     listy stringów (ich nazw), co jest zgodne z oczekiwaniami frontendu.
 #
 # 4.  **SerializerMethodField**: Użyte do generowania pól, których wartości
-#     muszą być obliczone dynamicznie (np. `options` i `correctAnswers`
-#     w pytaniu lub `question_counts` w teście). To pozwala nam idealnie
+#     muszą być obliczone lub złożone dynamicznie (np. `options` i
+#     `correctAnswers` w pytaniu lub `question_counts` w teście, złożone
+#     z liczników zapisanych w modelu `Test`). To pozwala nam idealnie
 #     odwzorować starą strukturę JSON.
 #
 # 5.  **source**: Atrybut używany do mapowania pól modelu na inne nazwy
@@ -63,7 +67,7 @@ class QuestionSerializer(serializers.ModelSerializer):
     maxPoints = serializers.IntegerField(source='max_points')
     image = serializers.URLField()
     
-    test_id = serializers.UUIDField(source='test.id')
+    test_id = serializers.UUIDField()
     # Zagnieżdżony serializer dla tagów, zwracający listę ich nazw
     tags = serializers.StringRelatedField(many=True)
 
@@ -99,6 +103,88 @@ class QuestionSerializer(serializers.ModelSerializer):
         return correct_indices
 
 
+# -----------------------------------------------------------------------------
+# Szybka ścieżka serializacji pytań
+# -----------------------------------------------------------------------------
+#
+# Przy quizach z setkami pytań większość czasu `QuestionListView` zajmowała
+# maszyneria pól DRF (`QuestionSerializer`), a potem drugie przejście po
+# danych, które tasowało opcje. `serialize_questions` buduje identyczny JSON
+# bezpośrednio z krotek `values_list` (trzy zapytania: pytania, odpowiedzi,
+# tagi) i w jednym przejściu po pytaniu składa opcje, indeksy poprawnych
+# odpowiedzi i ich tasowanie. `QuestionSerializer` zostaje jako wzorzec
+# formatu (patrz testy i `benchmarks/bench_serialization.py`).
+#
+# -----------------------------------------------------------------------------
+
+QUESTION_ROW_FIELDS = ('id', 'test_id', 'text', 'image', 'question_type', 'explanation', 'grading_criteria', 'max_points')
+CHOICE_QUESTION_TYPES = (Question.SINGLE_CHOICE, Question.MULTIPLE_CHOICE)
+
+
+def serialize_questions(question_ids, rng=random, permutations=None):
+    """
+    Zwraca listę słowników w formacie `QuestionSerializer` (z opcjami
+    pytań zamkniętych już potasowanymi) dla podanych ID, w ich kolejności.
+    ID, których nie ma w bazie, są pomijane. Tasowanie zużywa `rng`
+    dokładnie tak jak wzorzec `shuffle_serialized_options` z `benchmarks/common.py`.
+
+    Jeśli podano listę `permutations`, dla każdego zwróconego pytania
+    dopisywana jest do niej permutacja opcji (indeksy odpowiedzi w kolejności
+    `Answer.Meta.ordering` w kolejności wyświetlania) albo None.
+    """
+    rows = {
+        str(row[0]): row
+        for row in Question.objects.filter(id__in=question_ids).order_by().values_list(*QUESTION_ROW_FIELDS)
+    }
+    if not rows:
+        return []
+
+    # Kolejność odpowiedzi i tagów odpowiada domyślnemu sortowaniu modeli
+    # (`Answer.Meta.ordering`, `Tag.Meta.ordering`), tak jak przy prefetch.
+    answers = defaultdict(list)
+    for question_id, text, is_correct in (
+        Answer.objects.filter(question_id__in=question_ids).order_by('id').values_list('question_id', 'text', 'is_correct')
+    ):
+        answers[question_id].append((text, is_correct))
+
+    tags = defaultdict(list)
+    for question_id, name in (
+        Question.tags.through.objects.filter(question_id__in=question_ids).order_by('tag__name').values_list('question_id', 'tag__name')
+    ):
+        tags[question_id].append(name)
+
+    data = []
+    for question_id in question_ids:
+        row = rows.get(str(question_id))
+        if row is None:
+            continue
+        pk, test_id, text, image, question_type, explanation, grading_criteria, max_points = row
+
+        question_answers = answers.get(pk, [])
+        permutation = None
+        if question_type in CHOICE_QUESTION_TYPES and question_answers:
+            permutation = list(range(len(question_answers)))
+            rng.shuffle(permutation)
+            question_answers = [question_answers[index] for index in permutation]
+        if permutations is not None:
+            permutations.append(permutation)
+
+        data.append({
+            'id': str(pk),
+            'test_id': str(test_id),
+            'questionText': text,
+            'image': image,
+            'type': question_type,
+            'tags': tags.get(pk, []),
+            'options': [answer_text for answer_text, _ in question_answers],
+            'correctAnswers': [index for index, (_, is_correct) in enumerate(question_answers) if is_correct],
+            'explanation': explanation,
+            'gradingCriteria': grading_criteria,
+            'maxPoints': max_points,
+        })
+    return data
+
+
 class QuestionCountSerializer(serializers.Serializer):
     """
     Wewnętrzny serializator dla zagnieżdżonych liczników pytań.
@@ -131,26 +217,15 @@ class TestMetadataSerializer(serializers.ModelSerializer):
 
     def get_question_counts(self, obj):
         """
-
-        Dynamicznie oblicza liczbę pytań otwartych, zamkniętych i wszystkich
-        dla danego testu. `obj.questions` jest wydajne dzięki `prefetch_related` w widoku.
+        Zwraca liczbę pytań otwartych, zamkniętych i wszystkich dla danego
+        testu. Liczniki są zdenormalizowane w modelu `Test`, więc nie
+        wymagają żadnych dodatkowych zapytań.
         """
-        
-        # Sprawdzamy, czy dane zostały załadowane z adnotacją
-        if hasattr(obj, 'open_questions_count'):
-            counts = {
-                'open': obj.open_questions_count,
-                'closed': obj.closed_questions_count,
-                'total': obj.total_questions_count,
-            }
-        else: # Fallback, jeśli adnotacje nie są dostępne (mniej wydajne)
-             all_questions = obj.questions.all()
-             counts = {
-                 'open': all_questions.filter(question_type=Question.OPEN_ENDED).count(),
-                 'closed': all_questions.filter(question_type__in=[Question.SINGLE_CHOICE, Question.MULTIPLE_CHOICE]).count(),
-                 'total': all_questions.count()
-             }
-
+        counts = {
+            'open': obj.open_count,
+            'closed': obj.closed_count,
+            'total': obj.total_count,
+        }
         serializer = QuestionCountSerializer(data=counts)
         serializer.is_valid(raise_exception=True)
         return serializer.data
@@ -0,0 +1,142 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .catalogue import bump_catalogue_version
+from .grading_cache import invalidate_prompt_version
+from .models import Answer, Category, PromptConfiguration, Question, Tag, Test
+from .sampling import invalidate_question_index
+
+# -----------------------------------------------------------------------------
+# Sygnały utrzymujące spójność danych pochodnych (liczniki, cache, indeksy).
+# Rejestrowane w `ApiV1Config.ready()`.
+#
+# Liczniki poprawiane są w tej samej transakcji co zmiana, natomiast cache
+# (wersja katalogu, indeksy losowania) unieważniamy dopiero po jej
+# zatwierdzeniu (`transaction.on_commit`). Inaczej równoległe żądanie
+# między unieważnieniem a zatwierdzeniem odczytałoby stare wiersze
+# i zapisało je w cache pod nową wersją - np. w panelu admina, gdzie
+# pytanie i jego odpowiedzi zapisywane są w jednym bloku `atomic`.
+# -----------------------------------------------------------------------------
+
+_state = threading.local()
+
+
+def _question_signals_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+@contextmanager
+def bulk_question_changes(*test_ids):
+    """
+    Kontekst dla operacji masowych na pytaniach (import, `bulk_create`,
+    usuwanie całych testów). Wycisza odbiorniki sygnałów pytań działające
+    wiersz po wierszu, a po zakończeniu bloku jednorazowo przelicza liczniki
+    podanych testów. Cache (indeksy losowania, katalog testów) jest
+    unieważniany dopiero po zatwierdzeniu transakcji.
+    """
+    previous = _question_signals_suspended()
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+    Test.refresh_question_counts_for(test_ids)
+
+    def invalidate_caches():
+        invalidate_question_index(*test_ids)
+        bump_catalogue_version()
+
+    transaction.on_commit(invalidate_caches)
+
+
+@receiver(pre_save, sender=Question)
+def remember_previous_state(sender, instance, **kwargs):
+    """
+    Zapamiętuje poprzedni test i typ pytania, jeśli pytanie jest edytowane.
+    Dzięki temu po przeniesieniu pytania do innego testu (lub zmianie typu)
+    poprawiamy liczniki i unieważniamy indeksy obu testów.
+    """
+    instance._previous_test_id = None
+    instance._previous_question_type = None
+    if instance._state.adding or _question_signals_suspended():
+        return
+    previous = Question.objects.filter(pk=instance.pk).values_list('test_id', 'question_type').first()
+    if previous:
+        instance._previous_test_id, instance._previous_question_type = previous
+
+
+@receiver(post_save, sender=Question)
+def update_question_counts_on_save(sender, instance, created, **kwargs):
+    """Aktualizuje liczniki pytań testu w tej samej transakcji co zapis pytania."""
+    if _question_signals_suspended():
+        return
+    previous_test_id = getattr(instance, '_previous_test_id', None)
+    previous_type = getattr(instance, '_previous_question_type', None)
+    if not created and previous_test_id is None:
+        return
+    if not created:
+        if previous_test_id == instance.test_id and previous_type == instance.question_type:
+            return
+        Test.adjust_question_counts(previous_test_id, previous_type, -1)
+    Test.adjust_question_counts(instance.test_id, instance.question_type, 1)
+
+
+@receiver(post_delete, sender=Question)
+def update_question_counts_on_delete(sender, instance, **kwargs):
+    if _question_signals_suspended():
+        return
+    Test.adjust_question_counts(instance.test_id, instance.question_type, -1)
+
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_question_index_on_change(sender, instance, **kwargs):
+    """Unieważnia indeks ID pytań testu po dodaniu, edycji lub usunięciu pytania."""
+    if _question_signals_suspended():
+        return
+    test_ids = (instance.test_id, getattr(instance, '_previous_test_id', None))
+    transaction.on_commit(lambda: invalidate_question_index(*test_ids))
+
+
+@receiver([post_save, post_delete], sender=Test)
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=Answer)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Tag)
+def bump_catalogue_version_on_change(sender, **kwargs):
+    """
+    Każda zmiana testów, pytań, odpowiedzi (treść, `is_correct` - klucze
+    oceniania i migawka banku), kategorii lub tagów unieważnia katalog testów.
+    """
+    if sender in (Question, Answer) and _question_signals_suspended():
+        return
+    transaction.on_commit(bump_catalogue_version)
+
+
+@receiver(m2m_changed, sender=Test.categories.through)
+def bump_catalogue_version_on_categories_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(bump_catalogue_version)
+
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def bump_catalogue_version_on_tags_change(sender, action, **kwargs):
+    """
+    Zmiana tagów pytania (np. w panelu admina, już po zapisie samego pytania)
+    unieważnia indeks tagów i migawkę banku pytań.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear') and not _question_signals_suspended():
+        transaction.on_commit(bump_catalogue_version)
+
+
+@receiver([post_save, post_delete], sender=PromptConfiguration)
+def invalidate_prompt_version_on_change(sender, **kwargs):
+    """
+    Zmiana promptów zmienia wersję aktywnego promptu, a więc i klucze
+    cache ocen - stare wyniki przestają być używane.
+    """
+    transaction.on_commit(invalidate_prompt_version)
@@ -0,0 +1,273 @@
+import bisect
+import json
+import mmap
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+from .catalogue import get_catalogue_version
+from .models import Answer, Question
+from .sampling import MODE_QUESTION_TYPES
+from .serializers import CHOICE_QUESTION_TYPES, QUESTION_ROW_FIELDS
+
+# -----------------------------------------------------------------------------
+# Migawki banku pytań
+# -----------------------------------------------------------------------------
+#
+# Bank pytań zmienia się praktycznie tylko przy imporcie, a każde losowanie
+# quizu czytało go z bazy (indeks ID + trzy zapytania o wylosowane pytania).
+# Migawka to niezmienny plik z całym bankiem (pytania, odpowiedzi, tagi),
+# budowany po imporcie (`import_quizzes`, `build_quiz_snapshot`):
+#
+# 1.  **Format**: nagłówek, spis testów (JSON: zakresy pozycji pytań dla
+#     każdej pary test/typ), tablica przesunięć rekordów, posortowana
+#     tablica UUID pytań (wyszukiwanie po ID) i rekordy pytań (zwarty JSON).
+#     Pytania ułożone są według testu i typu, więc losowanie operuje na
+#     zakresach pozycji - bez żadnych list ID.
+#
+# 2.  **Współdzielenie**: Procesy gunicorna mapują plik w pamięć (`mmap`),
+#     więc wszystkie korzystają z tych samych stron pamięci podręcznej
+#     systemu. Dekodowane są tylko wylosowane rekordy.
+#
+# 3.  **Publikacja i podmiana**: Nowa migawka zapisywana jest do pliku
+#     tymczasowego i przenoszona pod docelową nazwę, a potem atomowo
+#     podmieniany jest wskaźnik `CURRENT`. Procesy sprawdzają wskaźnik przy
+#     każdym żądaniu (jedno `stat`) i przełączają się na nową wersję,
+#     a żądania w toku dokańczają pracę na starej.
+#
+# 4.  **Aktualność**: Migawka zapamiętuje wersję katalogu testów (patrz
+#     `catalogue.py`), przy której powstała. Każda późniejsza zmiana
+#     pytań (np. w panelu admina) podbija wersję katalogu, więc migawka
+#     przestaje być używana, a losowanie wraca do bazy danych do czasu
+#     zbudowania nowej migawki.
+#
+# Migawki są wyłączone, dopóki nie ustawiono `QUIZ_SNAPSHOT_DIR`.
+#
+# -----------------------------------------------------------------------------
+
+SNAPSHOT_MAGIC = b'QBSNAP01'
+# magic, wersja migawki, wersja katalogu, liczba pytań, długość spisu testów
+HEADER = struct.Struct('<8sQQII')
+POINTER_NAME = 'CURRENT'
+SNAPSHOTS_KEPT = 2
+UUID_SIZE = 16
+
+
+class QuizSnapshot:
+    """Migawka banku pytań zmapowana w pamięć (tylko do odczytu)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, self.catalogue_version, count, tests_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Plik '{self.path}' nie jest migawką banku pytań.")
+        self.count = count
+
+        position = HEADER.size
+        self.tests = json.loads(self._mmap[position:position + tests_size])
+        position += tests_size
+        view = memoryview(self._mmap)
+        self._offsets = view[position:position + 8 * (count + 1)].cast('Q')
+        position += 8 * (count + 1)
+        self._ids_start = position
+        position += UUID_SIZE * count
+        self._id_positions = view[position:position + 4 * count].cast('I')
+        self._records_start = position + 4 * count
+
+    def record(self, position):
+        """Rekord pytania: (id, test_id, treść, obrazek, typ, wyjaśnienie, kryteria, punkty, tagi, odpowiedzi)."""
+        start = self._records_start + self._offsets[position]
+        end = self._records_start + self._offsets[position + 1]
+        return json.loads(self._mmap[start:end])
+
+    def position_of(self, question_id):
+        """Pozycja pytania o podanym ID albo None (wyszukiwanie binarne po UUID)."""
+        try:
+            key = uuid.UUID(str(question_id)).bytes
+        except ValueError:
+            return None
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._id_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._id_at(low) == key:
+            return self._id_positions[low]
+        return None
+
+    def _id_at(self, index):
+        start = self._ids_start + index * UUID_SIZE
+        return self._mmap[start:start + UUID_SIZE]
+
+    def sample_positions(self, test_ids, mode, num_questions, rng=random):
+        """Odpowiednik `sampling.sample_question_ids` operujący na pozycjach migawki."""
+        starts = []
+        offsets = []
+        total = 0
+        for test_id in dict.fromkeys(str(test_id) for test_id in test_ids):
+            for question_type in MODE_QUESTION_TYPES[mode]:
+                start, count = self.tests.get(test_id, {}).get(question_type, (0, 0))
+                if count:
+                    offsets.append(total)
+                    starts.append(start)
+                    total += count
+
+        picks = rng.sample(range(total), min(max(num_questions, 0), total))
+        result = []
+        for pick in picks:
+            segment = bisect.bisect_right(offsets, pick) - 1
+            result.append(starts[segment] + pick - offsets[segment])
+        return result
+
+    def serialize(self, positions, rng=random, permutations=None):
+        """Odpowiednik `serializers.serialize_questions` dla pozycji migawki."""
+        data = []
+        for position in positions:
+            pk, test_id, text, image, question_type, explanation, grading_criteria, max_points, tags, answers = self.record(position)
+            permutation = None
+            if question_type in CHOICE_QUESTION_TYPES and answers:
+                permutation = list(range(len(answers)))
+                rng.shuffle(permutation)
+                answers = [answers[index] for index in permutation]
+            if permutations is not None:
+                permutations.append(permutation)
+            data.append({
+                'id': pk,
+                'test_id': test_id,
+                'questionText': text,
+                'image': image,
+                'type': question_type,
+                'tags': tags,
+                'options': [answer_text for answer_text, _ in answers],
+                'correctAnswers': [index for index, (_, is_correct) in enumerate(answers) if is_correct],
+                'explanation': explanation,
+                'gradingCriteria': grading_criteria,
+                'maxPoints': max_points,
+            })
+        return data
+
+    def sample_questions(self, test_ids, mode, num_questions, rng=random, permutations=None):
+        return self.serialize(self.sample_positions(test_ids, mode, num_questions, rng), rng, permutations)
+
+
+def build_snapshot(directory=None, chunk_size=5000):
+    """
+    Buduje migawkę całego banku pytań i publikuje ją jako bieżącą.
+    Zwraca ścieżkę nowego pliku.
+    """
+    directory = Path(directory or settings.QUIZ_SNAPSHOT_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    # Wersję katalogu odczytujemy przed odczytem danych: zmiana w trakcie
+    # budowania podbije ją, więc migawka od razu będzie uznana za nieaktualną.
+    catalogue_version = get_catalogue_version()
+
+    answers = defaultdict(list)
+    for question_id, text, is_correct in Answer.objects.order_by('id').values_list('question_id', 'text', 'is_correct').iterator(chunk_size=chunk_size):
+        answers[question_id].append((text, is_correct))
+    tags = defaultdict(list)
+    for question_id, name in Question.tags.through.objects.order_by('tag__name').values_list('question_id', 'tag__name').iterator(chunk_size=chunk_size):
+        tags[question_id].append(name)
+
+    tests = {}
+    offsets = [0]
+    ids = []
+    with tempfile.TemporaryFile(dir=directory) as records:
+        rows = Question.objects.order_by('test_id', 'question_type', 'id').values_list(*QUESTION_ROW_FIELDS)
+        for position, (pk, test_id, text, image, question_type, explanation, grading_criteria, max_points) in enumerate(rows.iterator(chunk_size=chunk_size)):
+            segment = tests.setdefault(str(test_id), {}).setdefault(question_type, [position, 0])
+            segment[1] += 1
+            record = json.dumps(
+                [str(pk), str(test_id), text, image, question_type, explanation, grading_criteria, max_points, tags.get(pk, []), answers.get(pk, [])],
+                ensure_ascii=False, separators=(',', ':'),
+            ).encode('utf-8')
+            records.write(record)
+            offsets.append(offsets[-1] + len(record))
+            ids.append((pk.bytes, position))
+
+        ids.sort()
+        version = time.time_ns()
+        tests_json = json.dumps(tests, separators=(',', ':')).encode('utf-8')
+        final_path = directory / f'quiz-bank-{version}.qbs'
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as out:
+            out.write(HEADER.pack(SNAPSHOT_MAGIC, version, catalogue_version, len(ids), len(tests_json)))
+            out.write(tests_json)
+            out.write(struct.pack(f'<{len(offsets)}Q', *offsets))
+            out.write(b''.join(key for key, _ in ids))
+            out.write(struct.pack(f'<{len(ids)}I', *(position for _, position in ids)))
+            records.seek(0)
+            while chunk := records.read(1 << 20):
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+    os.replace(out.name, final_path)
+
+    publish_snapshot(final_path)
+    return final_path
+
+
+def publish_snapshot(path):
+    """Atomowo ustawia migawkę jako bieżącą i usuwa najstarsze pliki."""
+    path = Path(path)
+    directory = path.parent
+    with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as pointer:
+        pointer.write(path.name)
+    os.replace(pointer.name, directory / POINTER_NAME)
+
+    # Usunięte pliki pozostają dostępne dla procesów, które wciąż je mapują.
+    snapshots = sorted(directory.glob('quiz-bank-*.qbs'), key=lambda p: int(p.stem.rsplit('-', 1)[1]))
+    for old in snapshots[:-SNAPSHOTS_KEPT]:
+        if old != path:
+            old.unlink(missing_ok=True)
+
+
+_loaded = None
+_loaded_pointer = None
+_load_lock = threading.Lock()
+
+
+def get_snapshot():
+    """
+    Zwraca bieżącą migawkę (wczytaną w tym procesie) albo None. Gdy
+    wskaźnik `CURRENT` się zmienił, wczytuje nową migawkę i podmienia ją
+    jednym przypisaniem.
+    """
+    global _loaded, _loaded_pointer
+    directory = settings.QUIZ_SNAPSHOT_DIR
+    if not directory:
+        return None
+    pointer_path = os.path.join(directory, POINTER_NAME)
+    try:
+        stat = os.stat(pointer_path)
+    except FileNotFoundError:
+        return None
+    pointer = (pointer_path, stat.st_ino, stat.st_mtime_ns)
+    if pointer == _loaded_pointer:
+        return _loaded
+
+    with _load_lock:
+        if pointer != _loaded_pointer:
+            with open(pointer_path, encoding='utf-8') as f:
+                snapshot_name = f.read().strip()
+            _loaded = QuizSnapshot(os.path.join(directory, snapshot_name))
+            _loaded_pointer = pointer
+    return _loaded
+
+
+def get_current_snapshot():
+    """Bieżąca migawka, o ile odpowiada aktualnej wersji katalogu testów."""
+    snapshot = get_snapshot()
+    if snapshot is None or snapshot.catalogue_version != get_catalogue_version():
+        return None
+    return snapshot
@@ -0,0 +1,235 @@
+import bisect
+import random
+import re
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .catalogue import get_catalogue_version
+from .models import Question
+from .sampling import MODE_QUESTION_TYPES
+
+# -----------------------------------------------------------------------------
+# Indeks odwrócony tag -> pytania
+# -----------------------------------------------------------------------------
+#
+# Quiz "z tematu" (`/questions/?tags=...`) wybiera pytania według wyrażenia
+# na tagach, np. `genetyka & (DNA | RNA)`. Filtr w bazie wymagałby przy
+# każdym żądaniu złączeń przez tabelę M2M, więc zamiast tego:
+#
+# 1.  **Indeks**: Dla każdego tagu trzymamy ID jego pytań pogrupowane według
+#     pary (test, typ pytania). W cache zapisany jest zwarty format -
+#     posortowane, sklejone 16-bajtowe UUID - pod kluczem z wersją katalogu
+#     testów (patrz `catalogue.py`), a każdy proces trzyma własną kopię,
+#     ważną tak długo, jak wersja katalogu się nie zmieni. Import, edycja
+#     pytań i zmiana ich tagów podbijają wersję, więc indeks odbudowywany
+#     jest jednym zapytaniem przy pierwszym kolejnym żądaniu.
+#
+# 2.  **Wyrażenia**: `&` (i), `|` (lub) i nawiasy; `&` wiąże silniej niż `|`.
+#     Wyrażenie liczone jest operacjami na zbiorach w pamięci procesu,
+#     osobno dla każdej pary (test, typ), więc filtr testów i trybu quizu
+#     odrzuca całe grupy bez przeglądania pojedynczych pytań.
+#
+# 3.  **Losowanie**: jak w `sampling.py` - N pozycji z wirtualnej tablicy
+#     wszystkich dopasowanych pytań, bez sklejania list.
+#
+# -----------------------------------------------------------------------------
+
+TAG_INDEX_CACHE_KEY = 'tag_index:{version}'
+UUID_SIZE = 16
+# Najwięcej tagów w jednym wyrażeniu.
+MAX_EXPRESSION_TAGS = 32
+
+_TOKEN_RE = re.compile(r'\s*(?:([&|()])|([^&|()]+))')
+
+# Indeks w pamięci procesu: krotka `(wersja katalogu, zwarty indeks, zbiory
+# ID już zdekodowanych tagów)`, podmieniana jednym przypisaniem, aby wątki
+# nie mieszały zbiorów z różnych wersji.
+_local_index = {'entry': None}
+
+
+class TagExpressionError(ValueError):
+    """Nieprawidłowe wyrażenie na tagach."""
+
+
+def parse_tag_expression(expression):
+    """
+    Parsuje wyrażenie na tagach do drzewa: `('tag', nazwa)`,
+    `('and', [...])` albo `('or', [...])`.
+    """
+    tokens = []
+    position = 0
+    expression = expression or ''
+    while position < len(expression):
+        match = _TOKEN_RE.match(expression, position)
+        if match is None:
+            break
+        operator, name = match.groups()
+        if operator:
+            tokens.append(operator)
+        elif name.strip():
+            tokens.append(('tag', name.strip()))
+        position = match.end()
+    if not tokens:
+        raise TagExpressionError("Wyrażenie na tagach jest puste.")
+    if sum(1 for token in tokens if isinstance(token, tuple)) > MAX_EXPRESSION_TAGS:
+        raise TagExpressionError(f"Wyrażenie może zawierać najwyżej {MAX_EXPRESSION_TAGS} tagów.")
+
+    def parse(position, operator, operand):
+        """Ciąg `operand (operator operand)*` zaczynający się od `position`."""
+        items = []
+        while True:
+            node, position = operand(position)
+            items.append(node)
+            if position < len(tokens) and tokens[position] == operator:
+                position += 1
+            else:
+                return (items[0] if len(items) == 1 else ('and' if operator == '&' else 'or', items)), position
+
+    def parse_or(position):
+        return parse(position, '|', parse_and)
+
+    def parse_and(position):
+        return parse(position, '&', parse_atom)
+
+    def parse_atom(position):
+        if position >= len(tokens):
+            raise TagExpressionError("Wyrażenie na tagach jest niekompletne.")
+        token = tokens[position]
+        if isinstance(token, tuple):
+            return token, position + 1
+        if token == '(':
+            node, position = parse_or(position + 1)
+            if position >= len(tokens) or tokens[position] != ')':
+                raise TagExpressionError("Brak nawiasu zamykającego w wyrażeniu na tagach.")
+            return node, position + 1
+        raise TagExpressionError(f"Nieoczekiwany symbol '{token}' w wyrażeniu na tagach.")
+
+    tree, position = parse_or(0)
+    if position != len(tokens):
+        raise TagExpressionError(f"Nieoczekiwany symbol '{tokens[position]}' w wyrażeniu na tagach.")
+    return tree
+
+
+def build_tag_index():
+    """
+    Buduje zwarty indeks `{tag: {test_id: {typ: bajty}}}` jednym zapytaniem,
+    z wierszami pobieranymi strumieniowo, jak w `build_question_index`.
+    """
+    postings = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+    test_keys = {}
+    rows = (
+        Question.tags.through.objects
+        .order_by()
+        .values_list('tag__name', 'question__test_id', 'question__question_type', 'question_id')
+        .iterator(chunk_size=10000)
+    )
+    for name, test_id, question_type, question_id in rows:
+        test_key = test_keys.get(test_id)
+        if test_key is None:
+            test_key = test_keys[test_id] = str(test_id)
+        postings[name][test_key][question_type].append(question_id.bytes)
+    return {
+        name: {
+            test_id: {question_type: b''.join(sorted(ids)) for question_type, ids in types.items()}
+            for test_id, types in tests.items()
+        }
+        for name, tests in postings.items()
+    }
+
+
+def get_tag_index(version=None):
+    """
+    Zwraca `(zwarty indeks, zdekodowane tagi)` dla bieżącej wersji katalogu
+    (z pamięci procesu, z cache albo zbudowany z bazy).
+    """
+    if version is None:
+        version = get_catalogue_version()
+    entry = _local_index['entry']
+    if entry is not None and entry[0] == version:
+        return entry[1], entry[2]
+
+    key = TAG_INDEX_CACHE_KEY.format(version=version)
+    compact = cache.get(key)
+    if compact is None:
+        compact = build_tag_index()
+        cache.set(key, compact, timeout=settings.QUESTION_INDEX_CACHE_TIMEOUT)
+    entry = _local_index['entry'] = (version, compact, {})
+    return entry[1], entry[2]
+
+
+def decode_ids(data):
+    """Tekstowe UUID ze sklejonych 16-bajtowych UUID."""
+    return frozenset(str(uuid.UUID(bytes=data[start:start + UUID_SIZE])) for start in range(0, len(data), UUID_SIZE))
+
+
+def tag_postings(name, compact, decoded):
+    """`{(test_id, typ): zbiór ID}` dla tagu, dekodowane raz na wersję katalogu."""
+    postings = decoded.get(name)
+    if postings is None:
+        postings = decoded[name] = {
+            (test_id, question_type): decode_ids(data)
+            for test_id, types in compact.get(name, {}).items()
+            for question_type, data in types.items()
+        }
+    return postings
+
+
+def evaluate(tree, leaf):
+    """Wylicza wyrażenie na grupach `{(test_id, typ): zbiór ID}` zwracanych przez `leaf`."""
+    if tree[0] == 'tag':
+        return leaf(tree[1])
+    groups = [evaluate(node, leaf) for node in tree[1]]
+    result = groups[0]
+    for other in groups[1:]:
+        if tree[0] == 'and':
+            result = {key: result[key] & other[key] for key in result.keys() & other.keys()}
+            result = {key: ids for key, ids in result.items() if ids}
+        else:
+            merged = dict(result)
+            for key, ids in other.items():
+                merged[key] = merged[key] | ids if key in merged else ids
+            result = merged
+    return result
+
+
+def select_question_ids(expression, mode, num_questions, test_ids=None, rng=random):
+    """
+    Losuje do `num_questions` ID pytań pasujących do wyrażenia na tagach
+    (np. `"a & (b | c)"` albo drzewa z `parse_tag_expression`), zgodnych
+    z trybem `mode` i - opcjonalnie - należących do testów `test_ids`.
+    """
+    tree = parse_tag_expression(expression) if isinstance(expression, str) else expression
+    question_types = set(MODE_QUESTION_TYPES[mode])
+    tests = {str(test_id) for test_id in test_ids} if test_ids else None
+    compact, decoded = get_tag_index()
+
+    def leaf(name):
+        return {
+            key: ids for key, ids in tag_postings(name, compact, decoded).items()
+            if key[1] in question_types and (tests is None or key[0] in tests)
+        }
+
+    groups = evaluate(tree, leaf)
+    segments = []
+    offsets = []
+    total = 0
+    for ids in groups.values():
+        offsets.append(total)
+        segments.append(ids)
+        total += len(ids)
+
+    picks = rng.sample(range(total), min(max(num_questions, 0), total))
+    # Zbiory nie są indeksowalne - listy tworzymy tylko dla grup, z których
+    # faktycznie coś wylosowano.
+    lists = {}
+    result = []
+    for position in picks:
+        segment = bisect.bisect_right(offsets, position) - 1
+        ids = lists.get(segment)
+        if ids is None:
+            ids = lists[segment] = list(segments[segment])
+        result.append(ids[position - offsets[segment]])
+    return result
@@ -0,0 +1,188 @@
+import logging
+import os
+import threading
+import time
+
+from celery import states
+from celery.backends.redis import RedisBackend
+from django.conf import settings
+
+from backend_project import celery_app
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# Powiadamianie o wynikach zadań oceny (long-polling)
+# -----------------------------------------------------------------------------
+#
+# Zamiast odpytywać `/task_result/<task_id>/` co 2 sekundy, klient wywołuje
+# `/task_result/<task_id>/wait/`, które czeka (do `TASK_RESULT_WAIT_TIMEOUT`
+# sekund) na zakończenie zadania i odpowiada w chwili zapisania wyniku.
+#
+# 1.  Backend wyników Celery w Redisie przy każdym zapisie wyniku publikuje
+#     go (PUBLISH) na kanale o nazwie klucza zadania
+#     (`celery-task-meta-<task_id>`) - workery nie wymagają zmian.
+#
+# 2.  Każdy proces web ma jeden wątek nasłuchujący (PSUBSCRIBE na wszystkie
+#     kanały wyników) i jedno połączenie z Redisem, niezależnie od liczby
+#     czekających żądań. Wątek budzi żądania czekające na dany `task_id`.
+#
+# 3.  Żądanie rejestruje się jako oczekujące przed odczytem bieżącego stanu
+#     zadania, więc wynik zapisany pomiędzy tymi krokami nie zostanie
+#     przeoczony.
+#
+# 4.  Czekające żądanie zajmuje wątek serwera, więc w procesie czeka naraz
+#     najwyżej `TASK_RESULT_MAX_WAITERS` żądań. Kolejne dostają od razu
+#     odpowiedź 202 i wracają do zwykłego odpytywania - pozostałe endpointy
+#     (w tym zapis wyników, na które czekają klienci) mają wolne wątki.
+#
+# Bez backendu Redis (np. w testach) `/wait/` zwraca bieżący stan od razu,
+# a klient wraca do zwykłego odpytywania.
+#
+# -----------------------------------------------------------------------------
+
+LISTENER_RECONNECT_DELAY = 1.0
+LISTENER_READY_TIMEOUT = 1.0
+
+
+def task_result_payload(task_id, meta):
+    """Odpowiedź w formacie `GetTaskResultView`."""
+    if not meta:
+        # Brak metadanych - zadanie najpewniej wciąż czeka w kolejce.
+        return {"status": states.PENDING, "task_id": task_id, "data": None}
+    return {"status": meta.get('status', 'UNKNOWN'), "task_id": task_id, "data": meta.get('result')}
+
+
+class _Waiter:
+    __slots__ = ('event', 'payload')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.payload = None
+
+
+class ResultNotifier:
+    """Budzi żądania czekające na wyniki zadań, nasłuchując na pub/sub Redisa."""
+
+    def __init__(self, backend, max_waiters=0):
+        self.backend = backend
+        # Miejsca dla czekających żądań (0 - bez limitu).
+        self._slots = threading.BoundedSemaphore(max_waiters) if max_waiters > 0 else None
+        self._waiters = {}
+        self._lock = threading.Lock()
+        self._listener = None
+        self._listener_pid = None
+        self._ready = threading.Event()
+
+    def _ensure_listener(self):
+        # Wątki nie przeżywają forka, więc każdy proces gunicorna uruchamia własny.
+        if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive() or self._listener_pid != os.getpid():
+                self._ready = threading.Event()
+                self._listener = threading.Thread(target=self._listen, name='task-result-listener', daemon=True)
+                self._listener_pid = os.getpid()
+                self._listener.start()
+        self._ready.wait(LISTENER_READY_TIMEOUT)
+
+    def _listen(self):
+        pattern = self.backend.task_keyprefix + '*'
+        while True:
+            try:
+                pubsub = self.backend.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(pattern)
+                self._ready.set()
+                for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        self.dispatch(message['channel'], message['data'])
+            except Exception:
+                logger.warning("Utracono połączenie nasłuchu wyników zadań, ponawiam.", exc_info=True)
+                time.sleep(LISTENER_RECONNECT_DELAY)
+
+    def dispatch(self, channel, payload):
+        """Przekazuje opublikowany wynik zadania czekającym na niego żądaniom."""
+        with self._lock:
+            waiters = self._waiters.get(channel, ())
+            for waiter in waiters:
+                waiter.payload = payload
+                waiter.event.set()
+
+    def wait(self, task_id, timeout):
+        """
+        Zwraca metadane zadania, gdy tylko zadanie się zakończy, albo jego
+        bieżący stan po upływie `timeout` sekund. Zwraca None, gdy wszystkie
+        miejsca dla czekających żądań są zajęte.
+        """
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            return None
+        try:
+            return self._wait(task_id, timeout)
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def _wait(self, task_id, timeout):
+        key = self.backend.get_key_for_task(task_id)
+        waiter = _Waiter()
+        with self._lock:
+            self._waiters.setdefault(key, []).append(waiter)
+        try:
+            self._ensure_listener()
+            meta = self.backend.get_task_meta(task_id)
+            if meta.get('status') in states.READY_STATES or timeout <= 0:
+                return meta
+            if waiter.event.wait(timeout):
+                return self.backend.decode_result(waiter.payload)
+            return meta
+        finally:
+            with self._lock:
+                waiters = self._waiters[key]
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._waiters[key]
+
+    def waiting(self):
+        """Liczba zadań, na które czekają żądania (do diagnostyki i testów)."""
+        with self._lock:
+            return len(self._waiters)
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_result_notifier():
+    """Zwraca `ResultNotifier` procesu albo None, gdy backend wyników to nie Redis."""
+    global _notifier
+    backend = celery_app.backend
+    if not isinstance(backend, RedisBackend):
+        return None
+    if _notifier is None or _notifier.backend is not backend:
+        with _notifier_lock:
+            if _notifier is None or _notifier.backend is not backend:
+                _notifier = ResultNotifier(backend, settings.TASK_RESULT_MAX_WAITERS)
+    return _notifier
+
+
+def get_task_metas(task_ids):
+    """
+    Metadane wielu zadań (None dla nieznanych), w kolejności `task_ids`.
+    Backend w Redisie odczytywany jest jednym MGET zamiast zapytania na zadanie.
+    """
+    backend = celery_app.backend
+    if not isinstance(backend, RedisBackend):
+        return [backend.get_task_meta(task_id) for task_id in task_ids]
+    values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids])
+    return [backend.decode_result(value) if value is not None else None for value in values]
+
+
+def wait_for_task_result(task_id, timeout):
+    """
+    Metadane zadania po jego zakończeniu lub po `timeout` sekundach albo
+    None, gdy proces nie ma wolnych miejsc dla czekających żądań.
+    """
+    notifier = get_result_notifier()
+    if notifier is None:
+        return celery_app.backend.get_task_meta(task_id)
+    return notifier.wait(task_id, timeout)
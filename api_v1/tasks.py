@@ -1,50 +1,189 @@
 import os
 import json
 import logging
+import threading
 from celery import shared_task
+from celery.signals import worker_process_init
+from django.conf import settings
 import google.generativeai as genai
 from .models import PromptConfiguration
+from .grading_cache import get_active_prompt_version, grading_cache_key, prompt_version, store_grade
+from .fake_model import FakeGenerativeModel
+from . import grading_telemetry
+from .grading_telemetry import MODE_SINGLE, STAGE_PARSE, STAGE_PROMPT, span
 
 logger = logging.getLogger(__name__)
 
+# -----------------------------------------------------------------------------
+# Stan procesu workera
+# -----------------------------------------------------------------------------
+#
+# Klient Gemini i aktywny prompt są tworzone raz na proces workera (przy
+# `worker_process_init`, czyli już po forku) i używane przez kolejne
+# zadania. Aktualność promptu sprawdzamy porównując jego wersję
+# (`get_active_prompt_version()`, jeden odczyt z cache) z wersją
+# zapamiętanego obiektu. Zapis promptu w adminie unieważnia tę wersję
+# sygnałem, a kopia w cache i tak wygasa po `GRADING_PROMPT_VERSION_TIMEOUT`
+# sekundach, więc prompt jest ponownie czytany z bazy tylko po zmianie, a bez
+# współdzielonego cache - najpóźniej po tym czasie.
+#
+# -----------------------------------------------------------------------------
+
+_worker_state = threading.local()
+
+API_KEY_MISSING_RESULT = {"error": "API_KEY_MISSING", "message": "Klucz API do usługi AI nie jest skonfigurowany na serwerze."}
+NO_ACTIVE_PROMPT_RESULT = {"error": "NO_ACTIVE_PROMPT", "message": "Brak aktywnego promptu w konfiguracji."}
+
+
+def api_key_configured():
+    return settings.GRADING_FAKE_MODEL or bool(os.environ.get("GEMINI_API_KEY"))
+
+
+def build_model():
+    """
+    Tworzy klienta modelu Gemini, a przy `GRADING_FAKE_MODEL` jego lokalny
+    zamiennik (benchmarki i testy obciążeniowe bez dostępu do API).
+    """
+    if settings.GRADING_FAKE_MODEL:
+        return FakeGenerativeModel()
+    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+    return genai.GenerativeModel('gemini-2.5-flash')
+
+
+def get_model():
+    """Zwraca klienta modelu utworzonego raz na proces (wątek) workera."""
+    model = getattr(_worker_state, 'model', None)
+    if model is None:
+        model = _worker_state.model = build_model()
+    return model
+
+
+def get_active_prompt():
+    """
+    Zwraca aktywny prompt (albo None) z pamięci procesu, czytając go z bazy
+    tylko wtedy, gdy zmieniła się jego wersja.
+    """
+    version = get_active_prompt_version()
+    if version is None:
+        return None
+    if getattr(_worker_state, 'prompt_version', None) != version:
+        prompt_config = PromptConfiguration.objects.filter(is_active=True).first()
+        _worker_state.prompt = prompt_config
+        _worker_state.prompt_version = prompt_version(prompt_config) if prompt_config else None
+    return _worker_state.prompt
+
+
+def reset_worker_state():
+    """Zapomina klienta modelu i prompt (np. po zmianie klucza API w testach)."""
+    _worker_state.__dict__.clear()
+
+
+@worker_process_init.connect
+def init_worker_state(**kwargs):
+    """Przygotowuje klienta modelu i prompt, zanim worker przyjmie pierwsze zadanie."""
+    reset_worker_state()
+    if not api_key_configured():
+        return
+    try:
+        get_model()
+        get_active_prompt()
+    except Exception:
+        # Zadania spróbują ponownie przy pierwszym użyciu.
+        logger.warning("Nie udało się przygotować klienta AI przy starcie workera.", exc_info=True)
+
+
+def render_prompt(prompt_config, user_answer, grading_criteria, question_text, max_points):
+    """Wstawia dane odpowiedzi do szablonu promptu z bazy danych."""
+    return prompt_config.prompt_text.format(
+        question_text=question_text,
+        grading_criteria=grading_criteria,
+        max_points=max_points,
+        user_answer=user_answer
+    )
+
+
+def parse_model_json(text):
+    """Dekoduje JSON z odpowiedzi modelu, usuwając ewentualne znaczniki markdown."""
+    cleaned_text = text.strip().replace('```json', '').replace('```', '').strip()
+    return json.loads(cleaned_text)
+
+
+def check_grade(response_json):
+    if not isinstance(response_json, dict) or 'score' not in response_json or 'feedback' not in response_json:
+        raise ValueError("Odpowiedź AI nie zawiera wymaganych kluczy 'score' i 'feedback'.")
+    return response_json
+
+
+def parse_grade(text, mode):
+    """`check_grade(parse_model_json(text))` ze zliczaniem nieudanych prób."""
+    try:
+        response_json = parse_model_json(text)
+    except ValueError:
+        grading_telemetry.record_parse_failure(mode, 'invalid_json')
+        raise
+    try:
+        return check_grade(response_json)
+    except ValueError:
+        grading_telemetry.record_parse_failure(mode, 'missing_keys')
+        raise
+
+
 @shared_task
 def generate_ai_answer(user_answer, grading_criteria, question_text, max_points):
     """
     An asynchronous task to grade a user's answer using the Gemini AI.
     """
-    GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-    if not GEMINI_API_KEY:
+    if not api_key_configured():
         logger.critical("Klucz API Gemini (GEMINI_API_KEY) nie jest skonfigurowany na serwerze.")
         # In a real app, you might want to handle this more gracefully
-        return {"error": "API_KEY_MISSING", "message": "Klucz API do usługi AI nie jest skonfigurowany na serwerze."}
+        return API_KEY_MISSING_RESULT
 
     try:
-        # Pobierz aktywny szablon promptu z bazy danych
-        prompt_config = PromptConfiguration.objects.filter(is_active=True).first()
-        if not prompt_config:
-            logger.error("Brak aktywnego promptu w konfiguracji bazy danych.")
-            return {"error": "NO_ACTIVE_PROMPT", "message": "Brak aktywnego promptu w konfiguracji."}
-
-        # Użyj szablonu z bazy danych i wstaw dynamiczne wartości
-        prompt = prompt_config.prompt_text.format(
-            question_text=question_text,
-            grading_criteria=grading_criteria,
-            max_points=max_points,
-            user_answer=user_answer
-        )
-
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        ai_response = model.generate_content(prompt)
+        with span(STAGE_PROMPT):
+            # Aktywny szablon promptu (z pamięci procesu, patrz `get_active_prompt`)
+            prompt_config = get_active_prompt()
+            if not prompt_config:
+                logger.error("Brak aktywnego promptu w konfiguracji bazy danych.")
+                return NO_ACTIVE_PROMPT_RESULT
 
-        cleaned_text = ai_response.text.strip().replace('```json', '').replace('```', '').strip()
-        response_json = json.loads(cleaned_text)
+            # Użyj szablonu z bazy danych i wstaw dynamiczne wartości
+            prompt = render_prompt(prompt_config, user_answer, grading_criteria, question_text, max_points)
 
-        if 'score' not in response_json or 'feedback' not in response_json:
-             raise ValueError("Odpowiedź AI nie zawiera wymaganych kluczy 'score' i 'feedback'.")
+        with grading_telemetry.model_call():
+            ai_response = get_model().generate_content(prompt)
+        with span(STAGE_PARSE):
+            response_json = parse_grade(ai_response.text, MODE_SINGLE)
 
+        # Zapamiętujemy poprawną ocenę - identyczne odpowiedzi na to samo
+        # pytanie nie trafią już do AI (patrz `grading_cache.py`).
+        store_grade(
+            grading_cache_key(user_answer, question_text, grading_criteria, max_points, prompt_version(prompt_config)),
+            response_json,
+        )
         return response_json
     except Exception as e:
         logger.exception("Wystąpił nieoczekiwany błąd podczas komunikacji z AI: %s", e)
         # Inform Celery that the task failed
-        raise
\ No newline at end of file
+        raise
+
+
+@shared_task(ignore_result=True)
+def flush_grading_batch():
+    """
+    Opróżnia kolejkę odpowiedzi czekających na ocenę zbiorczą (patrz
+    `grading_batch.py`), oceniając je partiami po `GRADING_BATCH_SIZE`.
+    """
+    from .grading_batch import flush_pending
+
+    flush_pending()
+
+
+@shared_task(ignore_result=True)
+def flush_attempt_log():
+    """
+    Zapisuje w bazie podejścia czekające w strumieniu Redis (patrz
+    `attempt_log.py`), partiami po `ATTEMPT_LOG_BATCH_SIZE`.
+    """
+    from .attempt_log import drain_attempt_log
+
+    drain_attempt_log()
@@ -1,5 +1,9 @@
 from django.urls import path
-from .views import TestListView, QuestionListView, CheckOpenAnswerView, GetTaskResultView, ReportIssueView
+from .views import (
+    TestListView, QuestionListView, CheckOpenAnswerView, CheckOpenAnswersBatchView, GetTaskResultView,
+    TaskResultsBatchView, WaitTaskResultView, GradingCacheStatsView, ReportIssueView, ScoreAttemptView,
+    MetricsView,
+)
 
 app_name = 'api_v1'
 
@@ -7,6 +11,12 @@ urlpatterns = [
     path('tests/', TestListView.as_view(), name='test-list'),
     path('questions/', QuestionListView.as_view(), name='question-list'),
     path('check_answer/', CheckOpenAnswerView.as_view(), name='check-answer'),
+    path('check_answers/', CheckOpenAnswersBatchView.as_view(), name='check-answers'),
+    path('score_attempt/', ScoreAttemptView.as_view(), name='score-attempt'),
     path('task_result/<str:task_id>/', GetTaskResultView.as_view(), name='task-result'),
+    path('task_results/', TaskResultsBatchView.as_view(), name='task-results'),
+    path('task_result/<str:task_id>/wait/', WaitTaskResultView.as_view(), name='task-result-wait'),
+    path('grading_cache/stats/', GradingCacheStatsView.as_view(), name='grading-cache-stats'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('report_issue/', ReportIssueView.as_view(), name='report-issue'),
 ]
\ No newline at end of file
@@ -1,12 +1,14 @@
+import hmac
 import os
 import json
-import random
+import uuid
 import logging
 
 from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
 from django.views.generic import View
-from django.db.models import Count, Q
+from django.utils.http import parse_etags
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
@@ -15,13 +17,28 @@ import google.generativeai as genai
 
 # Importujemy nowe serializery i modele
 from .models import Test, Question, Answer, ReportedIssue
-from .serializers import TestMetadataSerializer, QuestionSerializer, ReportedIssueSerializer
+from .serializers import TestMetadataSerializer, ReportedIssueSerializer, serialize_questions
+from .catalogue import get_catalogue_version, catalogue_etag, get_cached_test_list, set_cached_test_list
+from .sampling import sample_question_ids
+from .tag_index import TagExpressionError, parse_tag_expression, select_question_ids
+from .snapshot import get_current_snapshot
+from .quiz_sessions import QuizSessionError, create_session, get_session, is_valid_question_index, resolve_answer
+from .scoring import StaleSessionError, get_answer_keys, score_closed_answers
+from .attempt_log import build_attempt_record, record_attempt
+from .grading_cache import get_active_prompt_version, grading_cache_key, get_cached_grade, grading_cache_stats
 from .tasks import generate_ai_answer
+from .grading_batch import enqueue_for_grading
+from .task_results import get_task_metas, task_result_payload, wait_for_task_result
+from .metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from celery import group
 from celery.result import AsyncResult
 from backend_project import celery_app
 
 logger = logging.getLogger(__name__)
 
+# Najwięcej odpowiedzi lub zadań w jednym zapytaniu zbiorczym.
+MAX_BATCH_SIZE = 100
+
 # -----------------------------------------------------------------------------
 # Wprowadzenie do Widoków
 # -----------------------------------------------------------------------------
@@ -37,14 +54,16 @@ logger = logging.getLogger(__name__)
 #
 # 2.  **Optymalizacja Zapytań**:
 #     - `prefetch_related`: Używane do "dociągania" powiązanych obiektów
-#       (np. odpowiedzi i tagów dla pytań) w jednym dodatkowym zapytaniu,
-#       co eliminuje problem "N+1" i drastycznie przyspiesza działanie.
-#     - `annotate`: Używane w `TestListView` do obliczania liczby pytañ
-#       bezpośrednio w zapytaniu do bazy danych, co jest niezwykle wydajne.
+#       (np. kategorii testów) w jednym dodatkowym zapytaniu, co eliminuje
+#       problem "N+1" i drastycznie przyspiesza działanie.
+#     - Pytania quizu serializowane są bezpośrednio z krotek `values_list`
+#       (patrz `serialize_questions`), z pominięciem pól DRF.
+#     - Liczniki pytań: `TestListView` korzysta z liczników zapisanych
+#       w modelu `Test`, aktualizowanych przy każdym zapisie pytań.
 #
-# 3.  **Logika Biznesowa**: Logika filtrowania pytań ('open', 'closed', 'mixed')
-#     i losowania została zaimplementowana przy użyciu metod ORM, takich
-#     jak `.filter()`, `.order_by('?')` i `Q objects`.
+# 3.  **Logika Biznesowa**: Filtrowanie pytań ('open', 'closed', 'mixed')
+#     i losowanie odbywa się na indeksie ID pytań trzymanym w cache
+#     (patrz `sampling.py`), a z bazy pobierane są tylko wylosowane wiersze.
 #
 # 4.  **Kompatybilność**: Mimo całkowitej zmiany backendu, widoki używają
 #     serializerów, aby zwracać dane w formacie identycznym z poprzednią
@@ -73,26 +92,38 @@ class ReactAppView(View):
 class TestListView(APIView):
     """
     Widok API do listowania dostępnych testów, teraz oparty na bazie danych.
+    Odpowiedź jest trzymana w cache pod bieżącą wersją katalogu, a jej ETag
+    pozwala klientom z aktualnymi danymi otrzymać 304 bez zapytań do bazy.
     """
     def get(self, request, *args, **kwargs):
-        try:
-            # Używamy adnotacji, aby baza danych sama policzyła nam pytania
-            # dla każdego testu. Jest to bardzo wydajne.
-            tests_with_counts = Test.objects.annotate(
-                total_questions_count=Count('questions'),
-                open_questions_count=Count('questions', filter=Q(questions__question_type=Question.OPEN_ENDED)),
-                closed_questions_count=Count('questions', filter=Q(questions__question_type__in=[Question.SINGLE_CHOICE, Question.MULTIPLE_CHOICE]))
-            ).prefetch_related('categories')
-
-            # Przekazujemy queryset do serializera
-            serializer = TestMetadataSerializer(tests_with_counts, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Exception as e:
-            logger.exception("Wystąpił nieoczekiwany błąd podczas listowania testów z bazy danych.")
-            return Response(
-                {"error": "DB_LIST_ERROR", "message": "Wystąpił błąd serwera podczas pobierania listy testów."},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        version = get_catalogue_version()
+        etag = catalogue_etag(version)
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        data = get_cached_test_list(version)
+        if data is None:
+            try:
+                # Liczniki pytań są zapisane bezpośrednio w tabeli testów,
+                # więc nie potrzebujemy złączeń ani GROUP BY po pytaniach.
+                tests = Test.objects.prefetch_related('categories')
+
+                # Przekazujemy queryset do serializera
+                serializer = TestMetadataSerializer(tests, many=True)
+                data = list(serializer.data)
+            except Exception as e:
+                logger.exception("Wystąpił nieoczekiwany błąd podczas listowania testów z bazy danych.")
+                return Response(
+                    {"error": "DB_LIST_ERROR", "message": "Wystąpił błąd serwera podczas pobierania listy testów."},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+            set_cached_test_list(version, data)
+
+        # `no-cache` wymusza na przeglądarce rewalidację przy każdym żądaniu,
+        # więc nieaktualny katalog nigdy nie zostanie użyty bez pytania serwera.
+        return Response(data, status=status.HTTP_200_OK, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
 
 
 class QuestionListView(APIView):
@@ -102,115 +133,386 @@ class QuestionListView(APIView):
     def get(self, request, *args, **kwargs):
         test_ids_str = request.query_params.get('categories')
         num_questions_str = request.query_params.get('num_questions')
+        tag_expression = request.query_params.get('tags')
         mode = request.query_params.get('mode', 'mixed').lower()
+        use_session = request.query_params.get('session', 'false').lower() in ('true', '1')
 
-        if not test_ids_str or not num_questions_str:
-            return Response({"error": "MISSING_PARAMETERS", "message": "Parametry 'categories' i 'num_questions' są wymagane."}, status=status.HTTP_400_BAD_REQUEST)
+        if not (test_ids_str or tag_expression) or not num_questions_str:
+            return Response({"error": "MISSING_PARAMETERS", "message": "Parametr 'num_questions' oraz 'categories' lub 'tags' są wymagane."}, status=status.HTTP_400_BAD_REQUEST)
         
         if mode not in ['open', 'closed', 'mixed']:
             return Response({"error": "INVALID_MODE_PARAMETER", "message": "Parametr 'mode' musi mieć wartość 'open', 'closed' lub 'mixed'."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
             num_questions = int(num_questions_str)
-            test_ids = test_ids_str.split(',')
+            test_ids = [str(uuid.UUID(test_id)) for test_id in test_ids_str.split(',')] if test_ids_str else []
         except (ValueError, TypeError):
             return Response({"error": "INVALID_PARAMETER_FORMAT", "message": "Nieprawidłowy format parametrów."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Budujemy queryset pytań na podstawie wybranych testów (ich ID)
-        questions_queryset = Question.objects.filter(test__id__in=test_ids)
-
-        # Filtrujemy pytania zgodnie z wybranym trybem ('mode')
-        if mode == 'open':
-            questions_queryset = questions_queryset.filter(question_type=Question.OPEN_ENDED)
-        elif mode == 'closed':
-            questions_queryset = questions_queryset.filter(question_type__in=[Question.SINGLE_CHOICE, Question.MULTIPLE_CHOICE])
+        # Permutacje opcji zapamiętujemy tylko na potrzeby sesji quizu.
+        permutations = [] if use_session else None
+        snapshot = get_current_snapshot()
+        if tag_expression:
+            # Quiz z tematu: pytania pasujące do wyrażenia na tagach (opcjonalnie
+            # tylko z wybranych testów), wybierane z indeksu tagów w pamięci
+            # (patrz `tag_index.py`).
+            try:
+                tree = parse_tag_expression(tag_expression)
+            except TagExpressionError as e:
+                return Response({"error": "INVALID_TAG_EXPRESSION", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            question_ids = select_question_ids(tree, mode, num_questions, test_ids)
+            if snapshot is not None:
+                positions = [snapshot.position_of(question_id) for question_id in question_ids]
+                shuffled_data = snapshot.serialize([position for position in positions if position is not None], permutations=permutations)
+            else:
+                shuffled_data = serialize_questions(question_ids, permutations=permutations)
+        elif snapshot is not None:
+            # Aktualna migawka banku pytań w pamięci - bez zapytań do bazy.
+            shuffled_data = snapshot.sample_questions(test_ids, mode, num_questions, permutations=permutations)
+        else:
+            # Losujemy ID pytań z indeksu w cache (bez sortowania całej tabeli
+            # po `random()`), uwzględniając wybrane testy i tryb ('mode').
+            question_ids = sample_question_ids(test_ids, mode, num_questions)
 
-        # Optymalizacja: pobieramy z góry powiązane odpowiedzi i tagi
-        questions_queryset = questions_queryset.prefetch_related('answers', 'tags')
+            # Pobieramy z bazy tylko wylosowane pytania (wraz z odpowiedziami
+            # i tagami) i od razu budujemy z nich JSON w kolejności losowania.
+            # Opcje pytań zamkniętych są tasowane w tym samym przejściu, więc
+            # format odpowiedzi jest identyczny jak w poprzedniej wersji.
+            shuffled_data = serialize_questions(question_ids, permutations=permutations)
 
-        # Losujemy zadaną liczbę pytañ. `order_by('?')` jest kluczowe.
-        final_questions = questions_queryset.order_by('?')[:num_questions]
-        
-        if not final_questions:
+        if not shuffled_data:
              return Response({"error": "NO_QUESTIONS_FOUND", "message": f"Nie znaleziono pytań dla wybranych kategorii w trybie '{mode}'."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Serializer zajmie się resztą, włącznie z tasowaniem odpowiedzi wewnątrz pytania
-        serializer = QuestionSerializer(final_questions, many=True)
-        
-        # Opcjonalne: Ręczne tasowanie opcji, aby idealnie naśladować starą logikę.
-        # To zapewnia 100% kompatybilność z frontendem bez żadnych zmian po jego stronie.
-        shuffled_data = self.shuffle_options_in_serialized_data(serializer.data)
+        if use_session:
+            # Ocena w sesji korzysta z danych pytań po stronie serwera, więc
+            # kryteria oceny nie trafiają do przeglądarki. `correctAnswers`
+            # zostają, bo frontend ocenia pytania zamknięte lokalnie (patrz
+            # ograniczenie opisane w `quiz_sessions.py`).
+            session_id = create_session(shuffled_data, permutations)
+            for question in shuffled_data:
+                del question['gradingCriteria']
+            return Response({"session_id": session_id, "questions": shuffled_data}, status=status.HTTP_200_OK)
 
         return Response(shuffled_data, status=status.HTTP_200_OK)
 
-    def shuffle_options_in_serialized_data(self, data):
-        """
-        Tasuje opcje wewnątrz każdego pytania i aktualizuje indeksy
-        poprawnych odpowiedzi. Działa na danych już po serializacji.
-        """
-        for question in data:
-            if question.get('type') in ['single-choice', 'multiple-choice']:
-                options = question.get('options', [])
-                correct_answers_indices = question.get('correctAnswers', [])
 
-                if not options:
-                    continue
+class CheckOpenAnswerView(APIView):
+    ANSWER_FIELDS = ('userAnswer', 'gradingCriteria', 'questionText', 'maxPoints')
+
+    def post(self, request, *args, **kwargs):
+        try:
+            answer = self.parse_answer(request.data)
+        except QuizSessionError as e:
+            return Response({"error": e.code, "message": e.message}, status=e.status_code)
+        if answer is None:
+            return Response({"error": "INCOMPLETE_DATA", "message": "Brak wszystkich wymaganych pól."}, status=status.HTTP_400_BAD_REQUEST)
 
-                # Tworzymy listę par (stary_indeks, tekst_opcji)
-                indexed_options = list(enumerate(options))
-                random.shuffle(indexed_options)
+        # Identyczna (po normalizacji) odpowiedź na to samo pytanie była już
+        # oceniana - zwracamy zapisany wynik od razu, bez kolejki Celery.
+        cached = self.cached_grade(answer, get_active_prompt_version())
+        if cached is not None:
+            return self.cached_response(cached)
 
-                # Rozpakowujemy potasowane pary
-                new_indices_map, shuffled_options = zip(*indexed_options)
-                
-                # Tworzymy mapowanie stary_indeks -> nowy_indeks
-                old_to_new_index_map = {old_idx: new_idx for new_idx, old_idx in enumerate(new_indices_map)}
+        task_id, = self.enqueue([answer])
+        return Response({"task_id": task_id}, status=status.HTTP_202_ACCEPTED)
 
-                # Aktualizujemy dane pytania
-                question['options'] = list(shuffled_options)
-                question['correctAnswers'] = sorted([old_to_new_index_map[old_idx] for old_idx in correct_answers_indices])
+    def parse_answer(self, data, sessions=None):
+        """
+        Zwraca argumenty `generate_ai_answer` albo None, gdy brakuje pól.
+        Odpowiedź w sesji quizu (`sessionId`, `questionIndex`, `userAnswer`)
+        uzupełniana jest danymi pytania po stronie serwera; błędne odwołanie
+        do sesji zgłasza `QuizSessionError`.
+        """
+        if isinstance(data, dict) and data.get('sessionId') is not None:
+            if not data.get('userAnswer'):
+                return None
+            values = resolve_answer(data['sessionId'], data.get('questionIndex'), data['userAnswer'], sessions)
+        else:
+            values = [data.get(field) for field in self.ANSWER_FIELDS] if isinstance(data, dict) else [None]
+        return tuple(values) if all(values) else None
+
+    def cached_grade(self, answer, version):
+        if not version:
+            return None
+        user_answer, grading_criteria, question_text, max_points = answer
+        return get_cached_grade(grading_cache_key(user_answer, question_text, grading_criteria, max_points, version))
+
+    def enqueue(self, answers):
+        """Kolejkuje ocenę odpowiedzi i zwraca ich `task_id` w tej samej kolejności."""
+        task_ids = []
+        if settings.GRADING_BATCH_ENABLED:
+            # Odpowiedzi czekają w kolejce na ocenę zbiorczą (patrz
+            # `grading_batch.py`); przy awarii kolejki oceniamy je pojedynczo.
+            try:
+                for answer in answers:
+                    task_ids.append(enqueue_for_grading(*answer))
+            except Exception:
+                logger.warning("Nie udało się dodać odpowiedzi do kolejki oceny zbiorczej.", exc_info=True)
+
+        remaining = answers[len(task_ids):]
+        if len(remaining) == 1:
+            task_ids.append(generate_ai_answer.delay(*remaining[0]).id) # type: ignore
+        elif remaining:
+            result = group(generate_ai_answer.s(*answer) for answer in remaining).apply_async() # type: ignore
+            task_ids.extend(child.id for child in result.results)
+        return task_ids
+
+    def cached_payload(self, result):
+        """
+        Wynik z cache w formacie `GetTaskResultView`. Wynik zapisujemy też
+        w backendzie wyników Celery pod nowym `task_id`, więc klienci,
+        którzy zawsze odpytują `/task_result/`, działają bez zmian.
+        """
+        task_id = str(uuid.uuid4())
+        try:
+            celery_app.backend.store_result(task_id, result, 'SUCCESS')
+        except Exception:
+            logger.warning("Nie udało się zapisać wyniku z cache w backendzie Celery.", exc_info=True)
+        return {"task_id": task_id, "status": "SUCCESS", "data": result, "cached": True}
 
-        return data
+    def cached_response(self, result):
+        return Response(self.cached_payload(result), status=status.HTTP_200_OK)
 
-class CheckOpenAnswerView(APIView):
+    def submit_answers(self, answers):
+        """
+        Zwraca wyniki z cache ocen albo `{"task_id": ...}` zakolejkowanych
+        zadań, w kolejności `answers` (pozostałe odpowiedzi kolejkowane są
+        jedną grupą zadań), oraz informację, czy cokolwiek zakolejkowano.
+        """
+        version = get_active_prompt_version()
+        tasks = [None] * len(answers)
+        pending = []
+        for index, answer in enumerate(answers):
+            cached = self.cached_grade(answer, version)
+            if cached is not None:
+                tasks[index] = self.cached_payload(cached)
+            else:
+                pending.append(index)
+
+        for index, task_id in zip(pending, self.enqueue([answers[index] for index in pending])):
+            tasks[index] = {"task_id": task_id}
+        return tasks, bool(pending)
+
+
+class CheckOpenAnswersBatchView(CheckOpenAnswerView):
+    """
+    Wysyła do oceny wszystkie odpowiedzi otwarte testu naraz. Odpowiedzi
+    z cache ocen zwracane są od razu, pozostałe kolejkowane jako jedna
+    grupa zadań Celery. Kolejność wyników odpowiada kolejności odpowiedzi.
+    """
     def post(self, request, *args, **kwargs):
-        user_answer = request.data.get('userAnswer')
-        grading_criteria = request.data.get('gradingCriteria')
-        question_text = request.data.get('questionText')
-        max_points = request.data.get('maxPoints')
-
-        if not all([user_answer, grading_criteria, question_text, max_points]):
-            return Response({"error": "INCOMPLETE_DATA", "message": "Brak wszystkich wymaganych pól."}, status=status.HTTP_400_BAD_REQUEST)
+        items = request.data.get('answers')
+        if not isinstance(items, list) or not items:
+            return Response({"error": "MISSING_PARAMETERS", "message": "Parametr 'answers' musi być niepustą listą."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BATCH_SIZE:
+            return Response({"error": "BATCH_TOO_LARGE", "message": f"Można wysłać najwyżej {MAX_BATCH_SIZE} odpowiedzi naraz."}, status=status.HTTP_400_BAD_REQUEST)
+
+        sessions = {}
+        answers = []
+        for index, item in enumerate(items):
+            try:
+                answers.append(self.parse_answer(item, sessions))
+            except QuizSessionError as e:
+                return Response({"error": e.code, "message": f"Odpowiedź o indeksie {index}: {e.message}"}, status=e.status_code)
+        incomplete = [index for index, answer in enumerate(answers) if answer is None]
+        if incomplete:
+            return Response({"error": "INCOMPLETE_DATA", "message": f"Brak wymaganych pól w odpowiedziach o indeksach: {incomplete}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        tasks, pending = self.submit_answers(answers)
+        return Response({"tasks": tasks}, status=status.HTTP_202_ACCEPTED if pending else status.HTTP_200_OK)
+
+
+class ScoreAttemptView(CheckOpenAnswerView):
+    """
+    Ocenia całe podejście w sesji quizu: pytania zamknięte od razu, według
+    kluczy odpowiedzi w cache (patrz `scoring.py`), a odpowiedzi otwarte
+    wysyła do oceny AI tak jak `/check_answers/`.
+    """
+    def post(self, request, *args, **kwargs):
+        session_id = request.data.get('sessionId')
+        items = request.data.get('answers')
+        if not isinstance(session_id, str) or not session_id or not isinstance(items, list) or not items:
+            return Response({"error": "MISSING_PARAMETERS", "message": "Parametry 'sessionId' i 'answers' (niepusta lista) są wymagane."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BATCH_SIZE:
+            return Response({"error": "BATCH_TOO_LARGE", "message": f"Można wysłać najwyżej {MAX_BATCH_SIZE} odpowiedzi naraz."}, status=status.HTTP_400_BAD_REQUEST)
+
+        entries = get_session(session_id)
+        if entries is None:
+            return Response({"error": "SESSION_NOT_FOUND", "message": "Sesja quizu nie istnieje lub wygasła."}, status=status.HTTP_404_NOT_FOUND)
+
+        closed = []
+        closed_positions = []
+        open_items = []
+        seen = set()
+        for position, item in enumerate(items):
+            question_index = item.get('questionIndex') if isinstance(item, dict) else None
+            if not is_valid_question_index(entries, question_index) or question_index in seen:
+                return Response({"error": "INVALID_QUESTION_INDEX", "message": f"Nieprawidłowy lub powtórzony indeks pytania w odpowiedzi o indeksie {position}."}, status=status.HTTP_400_BAD_REQUEST)
+            seen.add(question_index)
+            if 'selected' in item:
+                closed.append((question_index, item['selected']))
+                closed_positions.append(position)
+            else:
+                open_items.append({'sessionId': session_id, 'questionIndex': question_index, 'userAnswer': item.get('userAnswer')})
+
+        keys = get_answer_keys([question_id for question_id, _ in entries])
+        try:
+            closed_results = score_closed_answers(entries, closed, keys)
+        except StaleSessionError as e:
+            return Response({"error": "SESSION_STALE", "message": f"Pytanie w odpowiedzi o indeksie {closed_positions[e.args[0]]} zmieniło się po utworzeniu sesji. Rozpocznij quiz ponownie."}, status=status.HTTP_409_CONFLICT)
+        except ValueError as e:
+            return Response({"error": "INVALID_ANSWER", "message": f"Nieprawidłowy wybór opcji w odpowiedzi o indeksie {closed_positions[e.args[0]]}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        sessions = {session_id: entries}
+        answers = []
+        for item in open_items:
+            try:
+                answer = self.parse_answer(item, sessions)
+            except QuizSessionError as e:
+                return Response({"error": e.code, "message": f"Pytanie o indeksie {item['questionIndex']}: {e.message}"}, status=e.status_code)
+            if answer is None:
+                return Response({"error": "INCOMPLETE_DATA", "message": f"Brak odpowiedzi na pytanie o indeksie {item['questionIndex']}."}, status=status.HTTP_400_BAD_REQUEST)
+            answers.append(answer)
+        tasks, pending = self.submit_answers(answers)
+        score = sum(result['correct'] for result in closed_results)
+        max_score = sum(1 for key in keys.values() if key[0] != Question.OPEN_ENDED)
+
+        attempt_id = self.record(session_id, entries, score, max_score, closed, closed_results, open_items, tasks)
+        return Response({
+            "attempt_id": attempt_id,
+            "score": score,
+            "max_score": max_score,
+            "closed": closed_results,
+            "open": [{"questionIndex": item['questionIndex'], **task} for item, task in zip(open_items, tasks)],
+        }, status=status.HTTP_202_ACCEPTED if pending else status.HTTP_200_OK)
+
+    def record(self, session_id, entries, score, max_score, closed, closed_results, open_items, tasks):
+        """
+        Przekazuje podejście do zapisu z opóźnieniem (patrz `attempt_log.py`)
+        i zwraca jego ID albo None, gdy nie udało się go przyjąć.
+        """
+        answers = []
+        for (question_index, selected), result in zip(closed, closed_results):
+            question_id, permutation = entries[question_index]
+            answers.append({
+                'question_id': question_id,
+                'question_index': question_index,
+                'selected': sorted(permutation[index] for index in selected) if permutation else sorted(selected),
+                'is_correct': result['correct'],
+            })
+        for item, task in zip(open_items, tasks):
+            answers.append({
+                'question_id': entries[item['questionIndex']][0],
+                'question_index': item['questionIndex'],
+                'user_answer': item['userAnswer'],
+                'task_id': task['task_id'],
+            })
+
+        attempt = build_attempt_record(session_id, score, max_score, answers)
+        try:
+            record_attempt(attempt)
+        except Exception:
+            logger.exception("Nie udało się zapisać podejścia %s.", attempt['id'])
+            return None
+        return attempt['id']
 
-        task = generate_ai_answer.delay(user_answer, grading_criteria, question_text, max_points) # type: ignore
-        return Response({"task_id": task.id}, status=status.HTTP_202_ACCEPTED)
 
 class GetTaskResultView(APIView):
     def get(self, request, task_id, *args, **kwargs):
-        logger.debug(f"GET_TASK_RESULT: Checking result for task_id: {task_id}")
         # Directly query the result backend to avoid any state caching issues
-        backend = celery_app.backend
-        meta = backend.get_task_meta(task_id)
-        logger.debug(f"GET_TASK_RESULT: Raw meta from backend: {meta}")
-
-        if meta:
-            response_data = {
-                "status": meta.get('status', 'UNKNOWN'),
-                "task_id": task_id,
-                "data": meta.get('result')
-            }
-        else:
-            # If there's no metadata, the task is likely still pending or unknown
-            response_data = {
-                "status": "PENDING",
-                "task_id": task_id,
-                "data": None
-            }
-        
-        logger.debug(f"GET_TASK_RESULT: Sending response: {response_data}")
+        meta = celery_app.backend.get_task_meta(task_id)
+        response_data = task_result_payload(task_id, meta)
+        logger.debug("GET_TASK_RESULT: %s", response_data)
         return Response(response_data, status=status.HTTP_200_OK)
 
 
+class TaskResultsBatchView(APIView):
+    """
+    Stan wielu zadań jednym zapytaniem: `{"task_ids": [...]}` ->
+    `{"results": [...]}` w formacie `GetTaskResultView`, w tej samej
+    kolejności. Backend wyników w Redisie odczytywany jest jednym MGET.
+    """
+    def post(self, request, *args, **kwargs):
+        task_ids = request.data.get('task_ids')
+        if not isinstance(task_ids, list) or not task_ids or not all(isinstance(task_id, str) and task_id for task_id in task_ids):
+            return Response({"error": "MISSING_PARAMETERS", "message": "Parametr 'task_ids' musi być niepustą listą identyfikatorów zadań."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(task_ids) > MAX_BATCH_SIZE:
+            return Response({"error": "BATCH_TOO_LARGE", "message": f"Można sprawdzić najwyżej {MAX_BATCH_SIZE} zadań naraz."}, status=status.HTTP_400_BAD_REQUEST)
+
+        metas = get_task_metas(task_ids)
+        return Response({"results": [task_result_payload(task_id, meta) for task_id, meta in zip(task_ids, metas)]}, status=status.HTTP_200_OK)
+
+
+class WaitTaskResultView(APIView):
+    """
+    Long-polling wyniku zadania: odpowiada w chwili zakończenia zadania
+    albo po `timeout` sekundach (najwyżej `TASK_RESULT_WAIT_TIMEOUT`)
+    z bieżącym stanem. Format odpowiedzi jak w `GetTaskResultView`; kod
+    202 oznacza, że serwer nie czekał (limit `TASK_RESULT_MAX_WAITERS`).
+    """
+    def get(self, request, task_id, *args, **kwargs):
+        try:
+            timeout = float(request.query_params.get('timeout', settings.TASK_RESULT_WAIT_TIMEOUT))
+        except ValueError:
+            return Response({"error": "INVALID_PARAMETER_FORMAT", "message": "Parametr 'timeout' musi być liczbą sekund."}, status=status.HTTP_400_BAD_REQUEST)
+        timeout = min(max(timeout, 0.0), settings.TASK_RESULT_WAIT_TIMEOUT)
+
+        meta = wait_for_task_result(task_id, timeout)
+        if meta is None:
+            # Brak wolnych miejsc na czekanie - bieżący stan od razu, a klient
+            # wraca do zwykłego odpytywania `/task_result/`.
+            meta = celery_app.backend.get_task_meta(task_id)
+            response = Response(task_result_payload(task_id, meta), status=status.HTTP_202_ACCEPTED)
+            response['Retry-After'] = '2'
+            return response
+        return Response(task_result_payload(task_id, meta), status=status.HTTP_200_OK)
+
+
+def monitoring_access_status(request):
+    """
+    Kod odmowy dostępu do endpointów monitoringu albo None. Wymagany jest
+    nagłówek `Authorization: Bearer <token>` z `METRICS_TOKEN`; bez
+    ustawionego tokenu endpointy nie istnieją (404).
+    """
+    if not settings.METRICS_TOKEN:
+        return status.HTTP_404_NOT_FOUND
+    expected = f'Bearer {settings.METRICS_TOKEN}'
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+        return status.HTTP_401_UNAUTHORIZED
+    return None
+
+
+class GradingCacheStatsView(APIView):
+    """
+    Widok API zwracający liczniki cache ocen AI (trafienia, chybienia,
+    współczynnik trafień, usunięte wpisy, liczba wpisów). Dostęp jak do
+    `/metrics/` (patrz `monitoring_access_status`).
+    """
+    def get(self, request, *args, **kwargs):
+        denied = monitoring_access_status(request)
+        if denied is not None:
+            return Response(status=denied)
+        try:
+            stats = grading_cache_stats()
+        except Exception:
+            logger.warning("Nie udało się odczytać liczników cache ocen.", exc_info=True)
+            return Response({"enabled": True, "error": "CACHE_UNAVAILABLE", "message": "Cache ocen jest chwilowo niedostępny."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(stats, status=status.HTTP_200_OK)
+
+
+class MetricsView(View):
+    """
+    Metryki procesu w tekstowym formacie Prometheusa (patrz `metrics.py`
+    i `middleware.py`). Dostęp tylko z tokenem `METRICS_TOKEN` (patrz
+    `monitoring_access_status`).
+    """
+    def get(self, request, *args, **kwargs):
+        denied = monitoring_access_status(request)
+        if denied is not None:
+            return HttpResponse(status=denied)
+        return HttpResponse(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 class ReportIssueView(APIView):
     """
     Widok API do tworzenia nowego zgłoszenia problemu.
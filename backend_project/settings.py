@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api_v1.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -99,6 +100,127 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# W produkcji cache jest współdzielony przez wszystkie procesy (gunicorn,
+# celery, komendy zarządzające) w Redisie. Bez REDIS_CACHE_URL używamy
+# lokalnej pamięci procesu: każdy proces ma wtedy własną kopię, a zmiany
+# wprowadzone w innym procesie (import, panel admina, worker Celery) widać
+# dopiero po wygaśnięciu wpisów - patrz limity czasu poniżej.
+if os.environ.get('REDIS_CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Czas życia (w sekundach) indeksu ID pytań używanego przy losowaniu.
+# Indeks jest unieważniany sygnałami przy każdej zmianie pytań, a limit
+# czasu jest jedynie zabezpieczeniem dla cache lokalnego w procesie.
+QUESTION_INDEX_CACHE_TIMEOUT = int(os.environ.get('QUESTION_INDEX_CACHE_TIMEOUT', 300))
+
+# Czas życia (w sekundach) kopii numeru wersji katalogu w cache. Numer
+# trzymany jest w bazie; bez współdzielonego cache podbicie z innego procesu
+# widać najpóźniej po tym czasie (patrz `api_v1/catalogue.py`).
+CATALOGUE_VERSION_TIMEOUT = int(os.environ.get('CATALOGUE_VERSION_TIMEOUT', 5))
+
+# Czas życia (w sekundach) odpowiedzi listy testów zapisanej w cache pod
+# bieżącą wersją katalogu (patrz `api_v1/catalogue.py`).
+CATALOGUE_CACHE_TIMEOUT = int(os.environ.get('CATALOGUE_CACHE_TIMEOUT', 300))
+
+# Cache wyników oceny odpowiedzi otwartych (patrz `api_v1/grading_cache.py`).
+# Bez GRADING_CACHE_REDIS_URL (i REDIS_CACHE_URL) wyniki trzymane są w pamięci
+# procesu. GRADING_CACHE_TTL = 0 wyłącza cache.
+GRADING_CACHE_REDIS_URL = os.environ.get('GRADING_CACHE_REDIS_URL', os.environ.get('REDIS_CACHE_URL'))
+GRADING_CACHE_TTL = int(os.environ.get('GRADING_CACHE_TTL', 24 * 60 * 60))
+GRADING_CACHE_MAX_ENTRIES = int(os.environ.get('GRADING_CACHE_MAX_ENTRIES', 50000))
+# Czas życia (w sekundach) wersji aktywnego promptu w cache. Ogranicza, jak
+# długo worker bez współdzielonego cache używa promptu sprzed edycji w adminie.
+GRADING_PROMPT_VERSION_TIMEOUT = int(os.environ.get('GRADING_PROMPT_VERSION_TIMEOUT', 5))
+
+# Zbiorcze ocenianie odpowiedzi otwartych (patrz `api_v1/grading_batch.py`).
+# Odpowiedzi zbierane są przez GRADING_BATCH_WINDOW sekund (lub do
+# GRADING_BATCH_SIZE sztuk) i oceniane jednym wywołaniem modelu. Odpowiedzi
+# zdjęte z kolejki, ale nieocenione przez GRADING_BATCH_CLAIM_IDLE sekund
+# (np. po awarii workera), przejmuje kolejne opróżnienie kolejki. Kolejka
+# wymaga Redisa; bez niego odpowiedzi oceniane są pojedynczo (kolejka
+# w pamięci procesu działa tylko przy CELERY_TASK_ALWAYS_EAGER).
+GRADING_BATCH_ENABLED = os.environ.get('GRADING_BATCH_ENABLED', 'False').lower() == 'true'
+GRADING_BATCH_SIZE = int(os.environ.get('GRADING_BATCH_SIZE', 10))
+GRADING_BATCH_WINDOW = float(os.environ.get('GRADING_BATCH_WINDOW', 0.5))
+GRADING_BATCH_REDIS_URL = os.environ.get('GRADING_BATCH_REDIS_URL', os.environ.get('REDIS_CACHE_URL'))
+GRADING_BATCH_CLAIM_IDLE = float(os.environ.get('GRADING_BATCH_CLAIM_IDLE', 120))
+
+# Asynchroniczne wywołania modelu przy ocenie zbiorczej (patrz
+# `api_v1/async_grading.py`). GRADING_ASYNC_CONCURRENCY = 1 oznacza ocenę
+# partia po partii. GRADING_RATE_LIMIT to limit zapytań na sekundę na proces
+# workera (0 = bez limitu). Błędy 429/5xx ponawiane są GRADING_MAX_RETRIES
+# razy z losowym opóźnieniem rosnącym od GRADING_RETRY_BASE_DELAY sekund.
+GRADING_ASYNC_CONCURRENCY = int(os.environ.get('GRADING_ASYNC_CONCURRENCY', 1))
+GRADING_RATE_LIMIT = float(os.environ.get('GRADING_RATE_LIMIT', 0))
+GRADING_RATE_BURST = int(os.environ.get('GRADING_RATE_BURST', 10))
+GRADING_MAX_RETRIES = int(os.environ.get('GRADING_MAX_RETRIES', 3))
+GRADING_RETRY_BASE_DELAY = float(os.environ.get('GRADING_RETRY_BASE_DELAY', 0.5))
+
+# Najdłuższy czas (w sekundach), przez jaki `/task_result/<task_id>/wait/`
+# czeka na wynik zadania (patrz `api_v1/task_results.py`). Musi być krótszy
+# niż limity czasu proxy (nginx `proxy_read_timeout`, domyślnie 60 s).
+TASK_RESULT_WAIT_TIMEOUT = float(os.environ.get('TASK_RESULT_WAIT_TIMEOUT', 25))
+# Najwięcej żądań `/wait/` czekających naraz w jednym procesie web. Każde
+# zajmuje wątek gunicorna, więc limit musi być mniejszy niż `--threads`,
+# aby zostały wątki dla pozostałych endpointów. Ponad limitem `/wait/`
+# odpowiada od razu kodem 202, a klient odpytuje `/task_result/`.
+TASK_RESULT_MAX_WAITERS = int(os.environ.get('TASK_RESULT_MAX_WAITERS', 96))
+
+# Katalog migawek banku pytań (patrz `api_v1/snapshot.py`). Gdy ustawiony,
+# `import_quizzes` buduje po imporcie migawkę, z której `/questions/` losuje
+# pytania bez zapytań do bazy. Brak wartości wyłącza migawki.
+QUIZ_SNAPSHOT_DIR = os.environ.get('QUIZ_SNAPSHOT_DIR') or None
+
+# Czas życia (w sekundach) sesji quizu po stronie serwera (patrz
+# `api_v1/quiz_sessions.py`) i zapamiętanych danych pytań do oceny.
+QUIZ_SESSION_TTL = int(os.environ.get('QUIZ_SESSION_TTL', 6 * 60 * 60))
+
+# Zapis podejść z opóźnieniem (patrz `api_v1/attempt_log.py`). Podejścia
+# czekają w strumieniu Redis i są zapisywane partiami po ATTEMPT_LOG_BATCH_SIZE
+# (najpóźniej po ATTEMPT_LOG_WINDOW sekundach). Wpisy niepotwierdzone przez
+# ATTEMPT_LOG_CLAIM_IDLE sekund przejmuje inny worker. Bez Redisa podejścia
+# zapisywane są od razu. W produkcji strumień powinien mieć własną bazę Redis
+# (nie bazę cache) z włączonym AOF - patrz `docker-compose.yml`.
+ATTEMPT_LOG_REDIS_URL = os.environ.get('ATTEMPT_LOG_REDIS_URL', os.environ.get('REDIS_CACHE_URL'))
+ATTEMPT_LOG_BATCH_SIZE = int(os.environ.get('ATTEMPT_LOG_BATCH_SIZE', 500))
+ATTEMPT_LOG_WINDOW = float(os.environ.get('ATTEMPT_LOG_WINDOW', 1.0))
+ATTEMPT_LOG_CLAIM_IDLE = float(os.environ.get('ATTEMPT_LOG_CLAIM_IDLE', 60))
+# Wpis, którego nie udało się zapisać po tylu dostarczeniach, trafia do
+# strumienia błędnych wpisów (`attempt_log:dead`) zamiast wracać bez końca.
+ATTEMPT_LOG_MAX_DELIVERIES = int(os.environ.get('ATTEMPT_LOG_MAX_DELIVERIES', 5))
+
+# Pomiar żądań (patrz `api_v1/middleware.py`): nagłówek `Server-Timing`
+# i histogramy per widok na `/api/v1/metrics/`. Endpoint metryk wymaga
+# nagłówka `Authorization: Bearer <token>` z METRICS_TOKEN, a bez tokenu jest
+# wyłączony (404). Nginx i tak nie przepuszcza go z zewnątrz.
+REQUEST_METRICS_ENABLED = os.environ.get('REQUEST_METRICS_ENABLED', 'True').lower() == 'true'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
+# Telemetria oceniania (patrz `api_v1/grading_telemetry.py`). Gdy ustawiono
+# GRADING_METRICS_DIR, każdy proces workera Celery zapisuje tam swoje metryki
+# dla kolektora plików tekstowych Prometheusa, najczęściej co
+# GRADING_METRICS_INTERVAL sekund.
+GRADING_METRICS_DIR = os.environ.get('GRADING_METRICS_DIR') or None
+GRADING_METRICS_INTERVAL = float(os.environ.get('GRADING_METRICS_INTERVAL', 15))
+
+# Lokalny zamiennik Gemini (`api_v1/fake_model.py`) do benchmarków i testów
+# obciążeniowych. Nigdy nie włączaj w produkcji.
+GRADING_FAKE_MODEL = os.environ.get('GRADING_FAKE_MODEL', 'False').lower() == 'true'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -224,4 +346,6 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+# Wykonywanie zadań od razu w procesie wywołującym (development bez workera).
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False').lower() == 'true'
 # ===================================================================
\ No newline at end of file
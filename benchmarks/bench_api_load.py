@@ -0,0 +1,237 @@
+"""
+Test obciążeniowy API quizu: `/tests/`, `/questions/` i `/check_answer/`.
+
+Dla każdego rozmiaru banku pytań generuje syntetyczne pliki quizów,
+importuje je komendą `import_quizzes` (tak jak w produkcji) i wysyła
+żądania do endpointów z C wątków naraz, przez pełny stos Django (bez
+sieci). Ocena odpowiedzi otwartych wykonywana jest od razu w żądaniu
+(Celery w trybie eager) przez `FakeGenerativeModel`, więc benchmark
+działa bez brokera i klucza API:
+
+    python -m benchmarks.bench_api_load --sizes 1000 10000 --concurrency 1 8 --output wyniki.json
+
+Dla każdej kombinacji zapisywane są opóźnienia p50/p95/p99,
+przepustowość oraz liczba i czas zapytań SQL na żądanie (z nagłówka
+`Server-Timing`, patrz `api_v1/middleware.py`). Z `--compare` wyniki
+porównywane są z plikiem JSON z wcześniejszego uruchomienia (np. z innego
+commita).
+"""
+import argparse
+import io
+import itertools
+import json
+import random
+import re
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from unittest.mock import patch
+
+from benchmarks.common import benchmark_database, percentile, setup_django, write_quiz_files, write_results
+
+ENDPOINTS = ('tests', 'questions', 'check_answer')
+SERVER_TIMING_RE = re.compile(r'db;dur=([\d.]+);desc="(\d+) queries"')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_load(send, num_requests, concurrency):
+    """
+    Wysyła `num_requests` żądań funkcją `send(client)` z `concurrency`
+    wątków (każdy z własnym klientem testowym i połączeniem z bazą).
+    """
+    from django.db import connections
+    from django.test import Client
+
+    counter = itertools.count()
+    latencies, queries, db_times = [], [], []
+    errors = []
+
+    def worker():
+        client = Client()
+        try:
+            while next(counter) < num_requests:
+                start = time.perf_counter()
+                response = send(client)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+                match = SERVER_TIMING_RE.search(response.get('Server-Timing', ''))
+                if match:
+                    db_times.append(float(match.group(1)))
+                    queries.append(int(match.group(2)))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(latencies[-1], 3),
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+        'max_queries': max(queries) if queries else None,
+        'db_ms_per_request': round(statistics.fmean(db_times), 3) if db_times else None,
+    }
+
+
+def make_senders(test_ids, sessions, quiz_size):
+    """Funkcje wysyłające jedno żądanie do każdego z endpointów."""
+
+    def tests(client):
+        return client.get('/api/v1/tests/')
+
+    def questions(client):
+        categories = random.sample(test_ids, min(3, len(test_ids)))
+        return client.get('/api/v1/questions/', {
+            'categories': ','.join(categories), 'num_questions': quiz_size,
+            'mode': random.choice(('mixed', 'closed', 'open')), 'session': 'true',
+        })
+
+    def check_answer(client):
+        session_id, size = random.choice(sessions)
+        # Unikalna odpowiedź - cache ocen nie skraca ścieżki do modelu.
+        return client.post('/api/v1/check_answer/', {
+            'sessionId': session_id, 'questionIndex': random.randrange(size), 'userAnswer': f"Odpowiedź {uuid.uuid4()}",
+        }, content_type='application/json')
+
+    return {'tests': tests, 'questions': questions, 'check_answer': check_answer}
+
+
+def create_sessions(test_ids, count, quiz_size):
+    """Sesje quizów z samymi pytaniami otwartymi: lista `(session_id, liczba pytań)`."""
+    from django.test import Client
+
+    client = Client()
+    sessions = []
+    for _ in range(count):
+        data = client.get('/api/v1/questions/', {
+            'categories': random.choice(test_ids), 'num_questions': quiz_size, 'mode': 'open', 'session': 'true',
+        }).json()
+        if data['questions']:
+            sessions.append((data['session_id'], len(data['questions'])))
+    return sessions
+
+
+def compare(results, baseline_path):
+    """Wypisuje zmianę p95 i przepustowości względem wcześniejszego pliku wyników."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {(r['questions'], r['endpoint'], r['concurrency']): r for r in baseline['results']}
+    print(f"\nPorównanie z {baseline_path} (commit {baseline.get('commit')}):")
+    for result in results:
+        before = previous.get((result['questions'], result['endpoint'], result['concurrency']))
+        if before is None:
+            continue
+        p95 = (result['p95_ms'] / before['p95_ms'] - 1) * 100 if before['p95_ms'] else 0.0
+        rps = (result['requests_per_second'] / before['requests_per_second'] - 1) * 100 if before['requests_per_second'] else 0.0
+        print(
+            f"{result['questions']:>8} pytań | {result['endpoint']:<12} | C={result['concurrency']:<3}"
+            f" | p95 {p95:+6.1f}% | żądania/s {rps:+6.1f}%"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='Rozmiary banku pytań.')
+    parser.add_argument('--files', type=int, default=20, help='Liczba plików (testów), na które dzielony jest bank pytań.')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS), help='Mierzone endpointy.')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8], help='Liczby wątków wysyłających żądania naraz.')
+    parser.add_argument('--requests', type=int, default=500, help='Liczba żądań na kombinację.')
+    parser.add_argument('--warmup', type=int, default=20, help='Liczba żądań rozgrzewających (poza pomiarem).')
+    parser.add_argument('--quiz-size', type=int, default=20, help='Liczba pytań w losowanym quizie.')
+    parser.add_argument('--sessions', type=int, default=50, help='Liczba sesji quizu używanych przez `/check_answer/`.')
+    parser.add_argument('--model-latency', type=float, default=0.2, help='Czas odpowiedzi zastępczego modelu (s).')
+    parser.add_argument('--seed', type=int, default=0, help='Ziarno generatora losowego.')
+    parser.add_argument('--output', type=str, help='Opcjonalna ścieżka pliku JSON z wynikami.')
+    parser.add_argument('--compare', type=str, help='Plik JSON z wcześniejszego uruchomienia do porównania.')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    setup_django()
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.test import override_settings
+    from django.test.utils import setup_test_environment
+    from api_v1 import sampling
+    from api_v1.fake_model import FakeGenerativeModel
+    from backend_project import celery_app
+
+    setup_test_environment()
+    # Ocena w żądaniu (bez brokera) zastępczym modelem; każdy wątek ma
+    # własnego klienta modelu, jak proces workera.
+    celery_app.conf.task_always_eager = True
+    fake_model = patch('api_v1.tasks.build_model', lambda: FakeGenerativeModel(latency=args.model_latency, per_item_latency=0))
+    caches = settings.CACHES
+    if caches['default']['BACKEND'].endswith('LocMemCache'):
+        # Domyślny limit 300 wpisów LocMemCache usuwałby sesje quizów.
+        caches = {'default': {**caches['default'], 'OPTIONS': {'MAX_ENTRIES': 10 ** 7}}}
+
+    results = []
+    with fake_model, override_settings(
+        CACHES=caches, GRADING_FAKE_MODEL=True, GRADING_BATCH_ENABLED=False, QUIZ_SNAPSHOT_DIR=None, ATTEMPT_LOG_REDIS_URL=None,
+    ):
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory() as tmp, benchmark_database():
+                cache.clear()
+                sampling._local_indexes.clear()
+                write_quiz_files(tmp, args.files, max(size // args.files, 1))
+                call_command('import_quizzes', tmp, stdout=io.StringIO(), stderr=io.StringIO())
+
+                from api_v1.models import Test
+                test_ids = [str(test_id) for test_id in Test.objects.values_list('id', flat=True)]
+                sessions = create_sessions(test_ids, args.sessions, args.quiz_size)
+                senders = make_senders(test_ids, sessions, args.quiz_size)
+
+                for endpoint in args.endpoints:
+                    for concurrency in args.concurrency:
+                        run_load(senders[endpoint], args.warmup, concurrency)
+                        result = {'questions': size, 'endpoint': endpoint, 'concurrency': concurrency}
+                        result.update(run_load(senders[endpoint], args.requests, concurrency))
+                        results.append(result)
+                        print(
+                            f"{size:>8} pytań | {endpoint:<12} | C={concurrency:<3}"
+                            f" | {result['requests_per_second']:>8.1f} żądań/s"
+                            f" | p50 {result['p50_ms']:>8.2f} ms | p95 {result['p95_ms']:>8.2f} ms | p99 {result['p99_ms']:>8.2f} ms"
+                            f" | {result['queries_per_request']} zapytań/żądanie | błędy {result['errors']}"
+                        )
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.output:
+        write_results(args.output, {
+            'benchmark': 'api_load',
+            'commit': git_commit(),
+            'parameters': {
+                'files': args.files, 'requests': args.requests, 'warmup': args.warmup, 'quiz_size': args.quiz_size,
+                'sessions': args.sessions, 'model_latency': args.model_latency, 'seed': args.seed,
+                'database': settings.DATABASES['default']['ENGINE'],
+            },
+            'results': results,
+        })
+
+
+if __name__ == '__main__':
+    main()
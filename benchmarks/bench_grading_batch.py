@@ -0,0 +1,107 @@
+"""
+Benchmark zbiorczego oceniania odpowiedzi otwartych: jedno wywołanie
+modelu na odpowiedź kontra partie po B odpowiedzi (`grading_batch.py`).
+
+Zamiast Gemini używany jest `FakeGenerativeModel` ze stałym kosztem
+wywołania i kosztem każdej ocenianej odpowiedzi, więc benchmark działa
+bez sieci i klucza API. Wszystkie odpowiedzi napływają jednocześnie;
+opóźnienie odpowiedzi to czas od startu do zapisania jej oceny:
+
+    python -m benchmarks.bench_grading_batch --answers 200 --batch-sizes 5 10 20
+
+Z `--concurrency C` każdy wariant mierzony jest też w trybie
+asynchronicznym (`AsyncGrader`), z C zapytaniami w toku naraz.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import percentile, setup_django, write_results
+
+
+def run(answers, batch_size, model, prompt_config, concurrency=1):
+    from api_v1.async_grading import AsyncGrader, run as run_async
+    from api_v1.grading_batch import grade_batch, grade_batch_async
+
+    batches = [answers[offset:offset + batch_size] for offset in range(0, len(answers), batch_size)]
+    completed = []
+
+    def record(results):
+        done_ms = (time.perf_counter() - start) * 1000
+        completed.extend(done_ms for result in results if result is not None)
+
+    async def grade_concurrently():
+        grader = AsyncGrader(model, concurrency)
+
+        async def grade(batch):
+            record(await grade_batch_async(grader, prompt_config, batch))
+
+        await asyncio.gather(*(grade(batch) for batch in batches))
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        run_async(grade_concurrently())
+    else:
+        for batch in batches:
+            record(grade_batch(model, prompt_config, batch))
+    elapsed = time.perf_counter() - start
+    completed.sort()
+    return {
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'graded': len(completed),
+        'model_calls': model.calls,
+        'seconds': round(elapsed, 3),
+        'answers_per_second': round(len(completed) / elapsed, 1),
+        'latency_p50_ms': round(percentile(completed, 50), 1),
+        'latency_p95_ms': round(percentile(completed, 95), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--answers', type=int, default=200, help='Liczba ocenianych odpowiedzi.')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[5, 10, 20], help='Rozmiary partii.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Koszt jednego wywołania modelu (s).')
+    parser.add_argument('--per-item-latency', type=float, default=0.005, help='Koszt każdej odpowiedzi w prompcie (s).')
+    parser.add_argument('--concurrency', type=int, default=0, help='Liczba zapytań w toku w trybie asynchronicznym (0 = bez tego trybu).')
+    parser.add_argument('--output', type=str, help='Opcjonalna ścieżka pliku JSON z wynikami.')
+    args = parser.parse_args()
+
+    setup_django()
+    from api_v1.fake_model import FakeGenerativeModel
+    from api_v1.models import PromptConfiguration
+
+    prompt_config = PromptConfiguration(
+        name='benchmark',
+        prompt_text="Pytanie: {question_text}\nKryteria: {grading_criteria}\nMaks. punktów: {max_points}\nOdpowiedź: {user_answer}",
+    )
+    answers = [
+        {
+            'task_id': str(i),
+            'user_answer': f"Odpowiedź ucznia numer {i}.",
+            'grading_criteria': 'Wskazanie mitochondrium.',
+            'question_text': 'Centrum energetyczne komórki?',
+            'max_points': 2,
+        }
+        for i in range(args.answers)
+    ]
+
+    results = []
+    modes = [1] + ([args.concurrency] if args.concurrency > 1 else [])
+    for concurrency in modes:
+        for batch_size in [1] + args.batch_sizes:
+            model = FakeGenerativeModel(latency=args.latency, per_item_latency=args.per_item_latency)
+            row = run(answers, batch_size, model, prompt_config, concurrency)
+            results.append(row)
+            print(
+                f"B={batch_size:>3} C={concurrency:>3} | {row['model_calls']:>4} wywołań | {row['answers_per_second']:>7.1f} odp/s"
+                f" | p50 {row['latency_p50_ms']:>8.1f} ms | p95 {row['latency_p95_ms']:>8.1f} ms"
+            )
+
+    if args.output:
+        write_results(args.output, {'benchmark': 'grading_batch', 'answers': args.answers, 'results': results})
+
+
+if __name__ == '__main__':
+    main()
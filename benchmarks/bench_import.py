@@ -0,0 +1,50 @@
+"""
+Benchmark przepustowości komendy `import_quizzes` (pytania na sekundę).
+
+Generuje syntetyczne pliki quizów, importuje je do tymczasowej bazy
+i mierzy czas importu (pierwszy import oraz ponowny import tych samych
+plików, który zastępuje istniejące pytania):
+
+    python -m benchmarks.bench_import --files 1 --questions 5000
+"""
+import argparse
+import io
+import tempfile
+import time
+
+from benchmarks.common import benchmark_database, setup_django, write_quiz_files, write_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=1, help='Liczba plików quizów.')
+    parser.add_argument('--questions', type=int, default=5000, help='Liczba pytań w każdym pliku.')
+    parser.add_argument('--output', type=str, help='Opcjonalna ścieżka pliku JSON z wynikami.')
+    args, command_args = parser.parse_known_args()
+
+    setup_django()
+    from django.core.management import call_command
+
+    total_questions = args.files * args.questions
+    results = {'benchmark': 'import', 'files': args.files, 'questions_per_file': args.questions, 'extra_args': command_args, 'runs': []}
+
+    with tempfile.TemporaryDirectory() as tmp, benchmark_database():
+        write_quiz_files(tmp, args.files, args.questions)
+        for label in ('first_import', 're_import'):
+            start = time.perf_counter()
+            call_command('import_quizzes', tmp, *command_args, stdout=io.StringIO(), stderr=io.StringIO())
+            elapsed = time.perf_counter() - start
+            run = {
+                'run': label,
+                'seconds': round(elapsed, 3),
+                'questions_per_second': round(total_questions / elapsed, 1),
+            }
+            results['runs'].append(run)
+            print(f"{label:>12}: {total_questions} pytań w {elapsed:.2f} s -> {run['questions_per_second']:.0f} pytań/s")
+
+    if args.output:
+        write_results(args.output, results)
+
+
+if __name__ == '__main__':
+    main()
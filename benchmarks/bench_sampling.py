@@ -0,0 +1,68 @@
+"""
+Benchmark losowania pytań: `order_by('?')` kontra indeks ID w cache.
+
+Porównuje czas wyboru i pobrania N pytań (bez serializacji) dla banków
+o różnych rozmiarach, a osobno czas budowy indeksu ID (`build_question_index`),
+który przy `question_sampling_idx` jest skanem samego indeksu:
+
+    python -m benchmarks.bench_sampling --sizes 10000 100000 1000000 --text-size 500
+"""
+import argparse
+import random
+
+from benchmarks.common import benchmark_database, measure, seed_question_bank, setup_django, write_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='Rozmiary banku pytań.')
+    parser.add_argument('--num-questions', type=int, default=50, help='Liczba losowanych pytań (N).')
+    parser.add_argument('--tests', type=int, default=10, help='Liczba testów, na które rozkładany jest bank.')
+    parser.add_argument('--select-tests', type=int, default=3, help='Liczba testów wybieranych w zapytaniu.')
+    parser.add_argument('--text-size', type=int, default=0, help='Liczba znaków dopisywanych do treści i wyjaśnienia pytań.')
+    parser.add_argument('--repeat', type=int, default=20, help='Liczba powtórzeń pomiaru.')
+    parser.add_argument('--output', type=str, help='Opcjonalna ścieżka pliku JSON z wynikami.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import cache
+    from api_v1.models import Question
+    from api_v1.sampling import build_question_index, fetch_questions, sample_question_ids
+
+    results = []
+    for size in args.sizes:
+        with benchmark_database():
+            cache.clear()
+            test_ids = seed_question_bank(size, num_tests=args.tests, text_size=args.text_size)
+            selected = random.sample(test_ids, min(args.select_tests, len(test_ids)))
+
+            def order_by_random():
+                return list(Question.objects.filter(test__id__in=selected).order_by('?')[:args.num_questions])
+
+            def indexed_sampling():
+                return fetch_questions(sample_question_ids(selected, 'mixed', args.num_questions))
+
+            cache.clear()
+            cold = measure(indexed_sampling, repeat=1, warmup=0)
+            row = {
+                'size': size,
+                'num_questions': args.num_questions,
+                'order_by_random': measure(order_by_random, repeat=args.repeat),
+                'index_build': measure(lambda: build_question_index(selected), repeat=args.repeat),
+                'indexed_cold': cold,
+                'indexed_warm': measure(indexed_sampling, repeat=args.repeat),
+            }
+            results.append(row)
+            print(
+                f"{size:>9} pytań | order_by('?') p50 {row['order_by_random']['p50_ms']:>9.2f} ms"
+                f" | budowa indeksu p50 {row['index_build']['p50_ms']:>8.2f} ms"
+                f" | indeks (zimny) {cold['p50_ms']:>9.2f} ms"
+                f" | indeks (ciepły) p50 {row['indexed_warm']['p50_ms']:>7.2f} ms"
+            )
+
+    if args.output:
+        write_results(args.output, {'benchmark': 'sampling', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark oceny podejść po stronie serwera (`/score_attempt/`).
+
+Tworzy bank pytań zamkniętych, sesje quizu po N pytań i dla każdej sesji
+losowe podejście. Mierzy przepustowość samej oceny (klucze odpowiedzi
+w pamięci procesu, `scoring.score_closed_answers`) oraz całego endpointu
+wywoływanego w jednym procesie (bez sieci):
+
+    python -m benchmarks.bench_scoring --questions 10000 --attempt-size 50 --attempts 2000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import benchmark_database, seed_question_bank, setup_django, write_results
+
+
+def throughput(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - start
+    return {'attempts': len(items), 'seconds': round(elapsed, 3), 'attempts_per_second': round(len(items) / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=10000, help='Rozmiar banku pytań.')
+    parser.add_argument('--attempt-size', type=int, default=50, help='Liczba pytań w podejściu.')
+    parser.add_argument('--attempts', type=int, default=2000, help='Liczba ocenianych podejść.')
+    parser.add_argument('--sessions', type=int, default=100, help='Liczba różnych sesji quizu.')
+    parser.add_argument('--output', type=str, help='Opcjonalna ścieżka pliku JSON z wynikami.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.test import Client, override_settings
+    from django.test.utils import setup_test_environment
+    from api_v1.quiz_sessions import get_session
+    from api_v1.scoring import get_answer_keys, score_closed_answers
+
+    setup_test_environment()
+    caches = settings.CACHES
+    if caches['default']['BACKEND'].endswith('LocMemCache'):
+        # Domyślny limit 300 wpisów LocMemCache usuwałby sesje i klucze odpowiedzi.
+        caches = {'default': {**caches['default'], 'OPTIONS': {'MAX_ENTRIES': 10 ** 7}}}
+    with override_settings(CACHES=caches), benchmark_database():
+        cache.clear()
+        test_ids = seed_question_bank(args.questions, num_tests=10, open_ratio=0, answers_per_question=4)
+        client = Client()
+        sessions = []
+        for _ in range(args.sessions):
+            response = client.get('/api/v1/questions/', {
+                'categories': ','.join(test_ids), 'num_questions': args.attempt_size, 'mode': 'closed', 'session': 'true',
+            })
+            sessions.append(response.json()['session_id'])
+
+        attempts = []
+        for i in range(args.attempts):
+            session_id = sessions[i % len(sessions)]
+            answers = [{'questionIndex': index, 'selected': [random.randrange(4)]} for index in range(args.attempt_size)]
+            attempts.append({'sessionId': session_id, 'answers': answers})
+
+        def score_in_process(attempt):
+            entries = get_session(attempt['sessionId'])
+            keys = get_answer_keys([question_id for question_id, _ in entries])
+            return score_closed_answers(entries, [(answer['questionIndex'], answer['selected']) for answer in attempt['answers']], keys)
+
+        def score_endpoint(attempt):
+            response = client.post('/api/v1/score_attempt/', attempt, content_type='application/json')
+            assert response.status_code == 200, response.content
+
+        # Rozgrzewka: klucze odpowiedzi wszystkich sesji trafiają do pamięci procesu.
+        for attempt in attempts[:len(sessions)]:
+            score_in_process(attempt)
+        results = {
+            'questions': args.questions,
+            'attempt_size': args.attempt_size,
+            'scoring': throughput(score_in_process, attempts),
+            'endpoint': throughput(score_endpoint, attempts),
+        }
+        print(
+            f"{args.attempt_size} pytań/podejście | ocena {results['scoring']['attempts_per_second']:>9.1f} podejść/s"
+            f" | endpoint {results['endpoint']['attempts_per_second']:>8.1f} podejść/s"
+        )
+
+    if args.output:
+        write_results(args.output, {'benchmark': 'scoring', 'results': [results]})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Mikrobenchmark serializacji pytań quizu: `QuestionSerializer` (DRF)
+z tasowaniem opcji kontra `serialize_questions` (krotki `values_list`).
+
+Bank pytań (z odpowiedziami i tagami) zasilany jest komendą
+`import_quizzes`. Oba warianty mierzone są łącznie z pobraniem danych
+z bazy, a przed pomiarem sprawdzana jest identyczność wygenerowanego JSON:
+
+    python -m benchmarks.bench_serialization --questions 200
+"""
+import argparse
+import io
+import random
+import tempfile
+
+from benchmarks.common import benchmark_database, measure, setup_django, shuffle_serialized_options, write_quiz_files, write_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, nargs='+', default=[50, 200], help='Liczby serializowanych pytań (rozmiary quizu).')
+    parser.add_argument('--bank', type=int, default=5000, help='Liczba pytań w banku.')
+    parser.add_argument('--repeat', type=int, default=50, help='Liczba powtórzeń pomiaru.')
+    parser.add_argument('--output', type=str, help='Opcjonalna ścieżka pliku JSON z wynikami.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+    from rest_framework.renderers import JSONRenderer
+    from api_v1.models import Question
+    from api_v1.sampling import fetch_questions
+    from api_v1.serializers import QuestionSerializer, serialize_questions
+    renderer = JSONRenderer()
+
+    def drf_serializer(ids):
+        questions = fetch_questions(ids, Question.objects.prefetch_related('answers', 'tags'))
+        return shuffle_serialized_options(QuestionSerializer(questions, many=True).data)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, benchmark_database():
+        write_quiz_files(tmp, 1, args.bank)
+        call_command('import_quizzes', tmp, stdout=io.StringIO(), stderr=io.StringIO())
+        all_ids = [str(question_id) for question_id in Question.objects.values_list('id', flat=True)]
+
+        for size in args.questions:
+            ids = random.sample(all_ids, min(size, len(all_ids)))
+
+            random.seed(size)
+            expected = renderer.render(drf_serializer(ids))
+            random.seed(size)
+            identical = renderer.render(serialize_questions(ids)) == expected
+
+            row = {
+                'questions': len(ids),
+                'identical_json': identical,
+                'drf_serializer': measure(lambda: drf_serializer(ids), repeat=args.repeat),
+                'fast_serializer': measure(lambda: serialize_questions(ids), repeat=args.repeat),
+            }
+            row['speedup_p50'] = round(row['drf_serializer']['p50_ms'] / row['fast_serializer']['p50_ms'], 2)
+            results.append(row)
+            print(
+                f"{len(ids):>5} pytań | DRF p50 {row['drf_serializer']['p50_ms']:>8.2f} ms"
+                f" | values_list p50 {row['fast_serializer']['p50_ms']:>7.2f} ms"
+                f" | x{row['speedup_p50']:.1f} | identyczny JSON: {'tak' if identical else 'NIE'}"
+            )
+
+    if args.output:
+        write_results(args.output, {'benchmark': 'serialization', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark losowania quizu: indeks ID w cache + pobranie wylosowanych pytań
+z bazy (`sample_question_ids` + `serialize_questions`) kontra migawka banku
+pytań zmapowana w pamięć (`api_v1/snapshot.py`).
+
+Mierzy czas zbudowania pełnej odpowiedzi `/questions/` (z odpowiedziami
+i tasowaniem opcji), czas budowania migawki i jej rozmiar:
+
+    python -m benchmarks.bench_snapshot --sizes 10000 100000
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from benchmarks.common import benchmark_database, measure, seed_question_bank, setup_django, write_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Rozmiary banku pytań.')
+    parser.add_argument('--num-questions', type=int, default=50, help='Liczba losowanych pytań (N).')
+    parser.add_argument('--tests', type=int, default=10, help='Liczba testów, na które rozkładany jest bank.')
+    parser.add_argument('--select-tests', type=int, default=3, help='Liczba testów wybieranych w zapytaniu.')
+    parser.add_argument('--answers', type=int, default=4, help='Liczba odpowiedzi na pytanie zamknięte.')
+    parser.add_argument('--repeat', type=int, default=50, help='Liczba powtórzeń pomiaru.')
+    parser.add_argument('--output', type=str, help='Opcjonalna ścieżka pliku JSON z wynikami.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import cache
+    from api_v1.sampling import sample_question_ids
+    from api_v1.serializers import serialize_questions
+    from api_v1.snapshot import QuizSnapshot, build_snapshot
+
+    results = []
+    for size in args.sizes:
+        with benchmark_database(), tempfile.TemporaryDirectory() as snapshot_dir:
+            cache.clear()
+            test_ids = seed_question_bank(size, num_tests=args.tests, answers_per_question=args.answers)
+            selected = random.sample(test_ids, min(args.select_tests, len(test_ids)))
+
+            start = time.perf_counter()
+            path = build_snapshot(snapshot_dir)
+            build_seconds = time.perf_counter() - start
+            snapshot = QuizSnapshot(path)
+
+            def database():
+                return serialize_questions(sample_question_ids(selected, 'mixed', args.num_questions))
+
+            def from_snapshot():
+                return snapshot.sample_questions(selected, 'mixed', args.num_questions)
+
+            row = {
+                'size': size,
+                'num_questions': args.num_questions,
+                'database': measure(database, repeat=args.repeat),
+                'snapshot': measure(from_snapshot, repeat=args.repeat),
+                'snapshot_build_seconds': round(build_seconds, 3),
+                'snapshot_bytes': path.stat().st_size,
+            }
+            results.append(row)
+            print(
+                f"{size:>9} pytań | baza p50 {row['database']['p50_ms']:>8.2f} ms"
+                f" | migawka p50 {row['snapshot']['p50_ms']:>7.2f} ms"
+                f" | budowa {build_seconds:>6.2f} s | {row['snapshot_bytes'] / 2**20:>7.1f} MiB"
+            )
+
+    if args.output:
+        write_results(args.output, {'benchmark': 'snapshot', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark quizów z tematu: filtr tagów w bazie kontra indeks tagów.
+
+Porównuje czas wyboru N pytań pasujących do wyrażenia na tagach (bez
+serializacji) dla banków o różnych rozmiarach: zapytanie ze złączeniami
+przez tabelę M2M `Question.tags` i `order_by('?')` kontra
+`select_question_ids` (patrz `api_v1/tag_index.py`). Osobno mierzony jest
+czas budowy indeksu (`build_tag_index`):
+
+    python -m benchmarks.bench_tag_index --sizes 10000 100000 --tags 50
+"""
+import argparse
+import random
+
+from benchmarks.common import benchmark_database, measure, seed_question_bank, setup_django, write_results
+
+
+def seed_tags(num_tags, tags_per_question, batch_size=20000):
+    """Przypisuje każdemu pytaniu `tags_per_question` losowych tagów z puli `num_tags`."""
+    from api_v1.models import Question, Tag
+
+    tags = Tag.objects.bulk_create([Tag(name=f"tag-{i}") for i in range(num_tags)])
+    through = Question.tags.through
+    rows = []
+    for question_id in Question.objects.values_list('id', flat=True).iterator():
+        rows.extend(through(question_id=question_id, tag_id=tag.id) for tag in random.sample(tags, tags_per_question))
+        if len(rows) >= batch_size:
+            through.objects.bulk_create(rows)
+            rows = []
+    through.objects.bulk_create(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Rozmiary banku pytań.')
+    parser.add_argument('--num-questions', type=int, default=20, help='Liczba losowanych pytań (N).')
+    parser.add_argument('--tests', type=int, default=10, help='Liczba testów, na które rozkładany jest bank.')
+    parser.add_argument('--tags', type=int, default=50, help='Liczba tagów w puli.')
+    parser.add_argument('--tags-per-question', type=int, default=3, help='Liczba tagów każdego pytania.')
+    parser.add_argument('--repeat', type=int, default=50, help='Liczba powtórzeń pomiaru.')
+    parser.add_argument('--output', type=str, help='Opcjonalna ścieżka pliku JSON z wynikami.')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import cache
+    from django.db.models import Q
+    from api_v1 import tag_index
+    from api_v1.models import Question
+
+    expressions = {'and': "tag-1 & tag-2", 'or_and': "(tag-1 | tag-2) & tag-3"}
+    filters = {
+        'and': lambda qs: qs.filter(tags__name='tag-1').filter(tags__name='tag-2'),
+        'or_and': lambda qs: qs.filter(Q(tags__name='tag-1') | Q(tags__name='tag-2')).filter(tags__name='tag-3').distinct(),
+    }
+
+    results = []
+    for size in args.sizes:
+        with benchmark_database():
+            cache.clear()
+            tag_index._local_index['entry'] = None
+            seed_question_bank(size, num_tests=args.tests)
+            seed_tags(args.tags, args.tags_per_question)
+
+            for name, expression in expressions.items():
+                def database_filter():
+                    return list(filters[name](Question.objects.all()).order_by('?').values_list('id', flat=True)[:args.num_questions])
+
+                def indexed():
+                    return tag_index.select_question_ids(expression, 'mixed', args.num_questions)
+
+                cache.clear()
+                tag_index._local_index['entry'] = None
+                cold = measure(indexed, repeat=1, warmup=0)
+                row = {
+                    'size': size,
+                    'expression': expression,
+                    'num_questions': args.num_questions,
+                    'database_filter': measure(database_filter, repeat=args.repeat),
+                    'index_build': measure(tag_index.build_tag_index, repeat=min(args.repeat, 5), warmup=0),
+                    'indexed_cold': cold,
+                    'indexed_warm': measure(indexed, repeat=args.repeat),
+                }
+                results.append(row)
+                print(
+                    f"{size:>9} pytań | {expression:<24} | filtr w bazie p50 {row['database_filter']['p50_ms']:>9.2f} ms"
+                    f" | budowa indeksu p50 {row['index_build']['p50_ms']:>9.2f} ms"
+                    f" | indeks (zimny) {cold['p50_ms']:>9.2f} ms"
+                    f" | indeks (ciepły) p50 {row['indexed_warm']['p50_ms']:>7.3f} ms"
+                )
+
+    if args.output:
+        write_results(args.output, {'benchmark': 'tag_index', 'results': results})
+
+
+if __name__ == '__main__':
+    main()
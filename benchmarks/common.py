@@ -0,0 +1,175 @@
+"""
+Wspólne narzędzia dla skryptów benchmarków.
+
+Benchmarki uruchamiamy jako moduły z katalogu głównego projektu, np.:
+
+    python -m benchmarks.bench_sampling --sizes 10000 100000
+
+Każdy benchmark pracuje na osobnej, tymczasowej bazie testowej (tak jak
+`manage.py test`), więc nie narusza danych w bazie deweloperskiej.
+"""
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import django
+
+
+def setup_django():
+    """Konfiguruje Django na potrzeby samodzielnego skryptu."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend_project.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key')
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Tworzy tymczasową bazę testową (dla SQLite w pamięci, dla PostgreSQL
+    `test_<nazwa>`) i usuwa ją po zakończeniu benchmarku.
+    """
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def seed_question_bank(num_questions, num_tests=10, open_ratio=0.2, answers_per_question=0, batch_size=5000, text_size=0):
+    """
+    Wypełnia bazę syntetycznym bankiem pytań rozłożonym równo na `num_tests`
+    testów. Co `1 / open_ratio`-te pytanie jest otwarte. `text_size` to
+    liczba znaków dopisywanych do treści i wyjaśnienia każdego pytania
+    (szerokie wiersze jak w prawdziwych bankach). Zwraca listę ID
+    utworzonych testów.
+    """
+    from api_v1.models import Answer, Question, Test
+
+    tests = Test.objects.bulk_create([Test(title=f"Benchmark {i}") for i in range(num_tests)])
+    open_every = int(1 / open_ratio) if open_ratio else 0
+    padding = ' ' + 'x' * text_size if text_size else ''
+
+    questions, answers = [], []
+    for i in range(num_questions):
+        is_open = open_every and i % open_every == 0
+        question = Question(
+            id=uuid.uuid4(),
+            test=tests[i % num_tests],
+            text=f"Pytanie benchmarkowe {i}{padding}",
+            explanation=f"Wyjaśnienie {i}{padding}" if padding else None,
+            question_type=Question.OPEN_ENDED if is_open else Question.SINGLE_CHOICE,
+            grading_criteria=f"Kryteria{padding}" if is_open else None,
+            max_points=5 if is_open else None,
+        )
+        questions.append(question)
+        if not is_open:
+            answers.extend(
+                Answer(question=question, text=f"Opcja {j}", is_correct=(j == 0))
+                for j in range(answers_per_question)
+            )
+        if len(questions) >= batch_size:
+            Question.objects.bulk_create(questions)
+            Answer.objects.bulk_create(answers)
+            questions, answers = [], []
+    Question.objects.bulk_create(questions)
+    Answer.objects.bulk_create(answers)
+    return [str(test.id) for test in tests]
+
+
+def make_quiz_data(num_questions, scope="Benchmark", category="Benchmark", open_ratio=0.2, options=4, tags_pool=50):
+    """
+    Buduje słownik quizu w formacie plików importu (patrz `docs/EN_QUESTIONS.md`).
+    """
+    open_every = int(1 / open_ratio) if open_ratio else 0
+    questions = []
+    for i in range(num_questions):
+        tags = [f"tag-{i % tags_pool}", f"tag-{(i * 7) % tags_pool}"]
+        if open_every and i % open_every == 0:
+            questions.append({
+                "id": i, "questionText": f"{scope}: pytanie otwarte {i}", "type": "open-ended", "tags": tags,
+                "gradingCriteria": "Kryteria oceny", "maxPoints": 5, "explanation": "Wyjaśnienie",
+            })
+        else:
+            questions.append({
+                "id": i, "questionText": f"{scope}: pytanie {i}", "type": "single-choice", "tags": tags,
+                "options": [f"Opcja {j}" for j in range(options)], "correctAnswers": [i % options],
+                "explanation": "Wyjaśnienie",
+            })
+    return {"category": category, "scope": scope, "version": "1.0", "questions": questions}
+
+
+def write_quiz_files(directory, num_files, questions_per_file, **kwargs):
+    """Zapisuje `num_files` syntetycznych plików quizów i zwraca ich ścieżki."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(num_files):
+        path = directory / f"quiz_{i:05d}.json"
+        data = make_quiz_data(questions_per_file, scope=f"Benchmark {i}", category=f"Kategoria {i % 5}", **kwargs)
+        with path.open('w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        paths.append(path)
+    return paths
+
+
+def shuffle_serialized_options(data, rng=random):
+    """
+    Tasuje opcje pytań zamkniętych w danych z `QuestionSerializer`
+    i przelicza indeksy poprawnych odpowiedzi. Wzorzec formatu (i zużycia
+    `rng`) dla `serialize_questions`, używany w testach i benchmarku
+    serializacji.
+    """
+    for question in data:
+        if question.get('type') in ('single-choice', 'multiple-choice') and question.get('options'):
+            indexed_options = list(enumerate(question['options']))
+            rng.shuffle(indexed_options)
+            old_indices, shuffled_options = zip(*indexed_options)
+            old_to_new = {old_index: new_index for new_index, old_index in enumerate(old_indices)}
+            question['options'] = list(shuffled_options)
+            question['correctAnswers'] = sorted(old_to_new[old_index] for old_index in question.get('correctAnswers', []))
+    return data
+
+
+def measure(func, repeat=20, warmup=2):
+    """
+    Wywołuje `func` `repeat` razy i zwraca statystyki czasu w milisekundach.
+    """
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'runs': repeat,
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def percentile(sorted_samples, pct):
+    """Percentyl metodą najbliższej pozycji dla posortowanej listy próbek."""
+    if not sorted_samples:
+        return 0.0
+    position = max(0, min(len(sorted_samples) - 1, round(pct / 100 * len(sorted_samples)) - 1))
+    return sorted_samples[position]
+
+
+def write_results(path, results):
+    """Zapisuje wyniki benchmarku jako JSON (np. do porównań między commitami)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open('w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
@@ -32,30 +32,45 @@ const OpenEndedQuestionUI = () => {
 
         try {
             const taskResponse = await useTestStore.getState().checkOpenAnswer(userAnswer);
+
+            // Wynik z cache ocen jest zwracany od razu - nie trzeba odpytywać serwera.
+            if (taskResponse.status === 'SUCCESS') {
+                useTestStore.getState().setLastAnswerFeedback(taskResponse.data, question.id);
+                return;
+            }
+
             const taskId = taskResponse.task_id;
 
             if (!taskId) {
                 throw new Error("Nie otrzymano ID zadania od serwera.");
             }
 
-            const intervalId = setInterval(async () => {
+            // Serwer odpowiada w chwili zakończenia oceny (long-polling). Gdy
+            // `/wait/` jest niedostępne lub przeciążone (202), wracamy do
+            // odpytywania co 2 sekundy.
+            const fetchResult = async () => {
                 try {
-                    const resultResponse = await useTestStore.getState().getTaskResult(taskId);
-                    
-                    if (resultResponse.status === 'SUCCESS' || resultResponse.status === 'FAILURE') {
-                        clearInterval(intervalId);
-                        
-                        if (resultResponse.status === 'SUCCESS') {
-                            useTestStore.getState().setLastAnswerFeedback(resultResponse.data, question.id);
-                        } else {
-                            throw new Error(resultResponse.data || "Wystąpił błąd podczas przetwarzania zadania.");
-                        }
-                    }
-                } catch (error) {
-                    clearInterval(intervalId);
-                    useTestStore.getState().setError({ message: error.message || 'Błąd podczas sprawdzania wyniku zadania.' });
+                    return await useTestStore.getState().waitForTaskResult(taskId);
+                } catch {
+                    await new Promise(resolve => setTimeout(resolve, 2000));
+                    return useTestStore.getState().getTaskResult(taskId);
+                }
+            };
+
+            try {
+                let resultResponse = await fetchResult();
+                while (resultResponse.status !== 'SUCCESS' && resultResponse.status !== 'FAILURE') {
+                    resultResponse = await fetchResult();
                 }
-            }, 2000);
+
+                if (resultResponse.status === 'SUCCESS') {
+                    useTestStore.getState().setLastAnswerFeedback(resultResponse.data, question.id);
+                } else {
+                    throw new Error(resultResponse.data || "Wystąpił błąd podczas przetwarzania zadania.");
+                }
+            } catch (error) {
+                useTestStore.getState().setError({ message: error.message || 'Błąd podczas sprawdzania wyniku zadania.' });
+            }
 
         } catch (error) {
              useTestStore.getState().setError({ message: error.message || 'Nie udało się rozpocząć zadania oceny.' });
@@ -16,7 +16,7 @@ vi.mock('../services/api', () => ({
       { category: 'Biologia', scope: 'Komórka', version: '1.2', test_id: 'biologia_komorka', question_counts: { total: 5, closed: 5, open: 0 } },
     ]
   })),
-  getQuestions: vi.fn(() => Promise.resolve({ data: [{id: 'q1', questionText: 'Test Question'}] })),
+  getQuestions: vi.fn(() => Promise.resolve({ data: { session_id: 's1', questions: [{id: 'q1', questionText: 'Test Question'}] } })),
 }));
 
 
@@ -108,7 +108,8 @@ describe('TestSetupPage - Scenariusze interakcji użytkownika', () => {
     expect(getQuestions).toHaveBeenCalledWith({
       categories: 'historia_polska',
       num_questions: 5,
-      mode: 'closed'
+      mode: 'closed',
+      session: true
     });
   });
 });
\ No newline at end of file
@@ -65,6 +65,8 @@ export const getAvailableTests = () => {
  * @param {string} params.categories - ID kategorii oddzielone przecinkami.
  * @param {number} params.num_questions - Żądana liczba pytań.
  * @param {string} params.mode - Tryb pytań ('closed', 'open', 'mixed').
+ * @param {boolean} params.session - Gdy true, serwer tworzy sesję quizu i zwraca
+ *   `{ session_id, questions }` (bez kryteriów oceny pytań otwartych).
  * @returns {Promise} Obietnica z odpowiedzią API zawierającą pytania.
  */
 export const getQuestions = (params) => {
@@ -75,10 +77,11 @@ export const getQuestions = (params) => {
 /**
  * Wysyła odpowiedź na pytanie otwarte do oceny przez AI.
  * @param {object} payload - Dane do wysłania.
- * @param {string} payload.questionText - Treść pytania.
+ * @param {string} payload.sessionId - ID sesji quizu zwrócone przez getQuestions.
+ * @param {number} payload.questionIndex - Indeks pytania w sesji quizu.
  * @param {string} payload.userAnswer - Odpowiedź udzielona przez użytkownika.
- * @param {string} payload.gradingCriteria - Kryteria oceny zdefiniowane dla pytania.
- * @param {number} payload.maxPoints - Maksymalna liczba punktów za pytanie.
+ *   Bez sesji zamiast `sessionId` i `questionIndex` wysyłane są `questionText`,
+ *   `gradingCriteria` i `maxPoints`.
  * @returns {Promise} Obietnica z odpowiedzią API zawierającą ocenę.
  */
 export const checkOpenAnswer = (payload) => {
@@ -94,6 +97,20 @@ export const getTaskResult = (taskId) => {
     return apiClient.get(`/task_result/${taskId}/`);
 };
 
+/**
+ * Czeka na wynik zadania asynchronicznego (long-polling). Serwer odpowiada
+ * w chwili zakończenia zadania albo po `timeout` sekundach z bieżącym stanem.
+ * @param {string} taskId - ID zadania zwrócone przez checkOpenAnswer.
+ * @param {number} timeout - Maksymalny czas oczekiwania w sekundach.
+ * @returns {Promise} Obietnica z odpowiedzią API zawierającą status i ewentualne dane.
+ */
+export const waitForTaskResult = (taskId, timeout = 25) => {
+    return apiClient.get(`/task_result/${taskId}/wait/`, {
+        params: { timeout },
+        timeout: (timeout + 10) * 1000,
+    });
+};
+
 
 /**
  * Wysyła zgłoszenie problemu dotyczącego pytania lub oceny.
@@ -1,5 +1,5 @@
 import { create } from 'zustand';
-import { getAvailableTests, getQuestions, checkOpenAnswer as checkOpenAnswerApi, getTaskResult as getTaskResultApi } from '../services/api';
+import { getAvailableTests, getQuestions, checkOpenAnswer as checkOpenAnswerApi, getTaskResult as getTaskResultApi, waitForTaskResult as waitForTaskResultApi } from '../services/api';
 
 const initialTheme = localStorage.getItem('theme') || 'dark';
 
@@ -13,6 +13,7 @@ const useTestStore = create((set, get) => ({
     questionMode: 'closed',
 
     currentQuestions: [],
+    sessionId: null, // ID sesji quizu po stronie serwera (ocena bez odsyłania danych pytań)
     currentQuestionIndex: 0,
     userAnswers: {},
     score: 0,
@@ -65,10 +66,12 @@ const useTestStore = create((set, get) => ({
             const response = await getQuestions({
                 categories: selectedCategories.join(','),
                 num_questions: numQuestionsConfig,
-                mode: questionMode 
+                mode: questionMode,
+                session: true
             });
             set({
-                currentQuestions: response.data,
+                currentQuestions: response.data.questions,
+                sessionId: response.data.session_id,
                 isLoading: false,
                 testStartTime: new Date(),
                 isTimerRunning: true, // Start timer when questions are loaded
@@ -128,11 +131,11 @@ const useTestStore = create((set, get) => ({
             }
         }));
 
+        // Dane pytania (treść, kryteria, punkty) serwer bierze z sesji quizu.
         const payload = {
-            questionText: question.questionText,
-            userAnswer: userAnswer,
-            gradingCriteria: question.gradingCriteria,
-            maxPoints: question.maxPoints
+            sessionId: get().sessionId,
+            questionIndex: currentQuestionIndex,
+            userAnswer: userAnswer
         };
         
         const response = await checkOpenAnswerApi(payload);
@@ -144,6 +147,15 @@ const useTestStore = create((set, get) => ({
         return response.data; // Zwracamy { status: '...', data: '...' }
     },
 
+    waitForTaskResult: async (taskId) => {
+        const response = await waitForTaskResultApi(taskId);
+        if (response.status === 202) {
+            // Serwer nie ma wolnych miejsc na czekanie - wracamy do odpytywania.
+            throw new Error('Long-polling jest chwilowo niedostępny.');
+        }
+        return response.data; // Ten sam format co getTaskResult
+    },
+
     setLastAnswerFeedback: (feedbackData, questionId) => {
         const { score, feedback } = feedbackData;
         const { currentQuestions } = get();
@@ -199,6 +211,7 @@ const useTestStore = create((set, get) => ({
         view: 'home', 
         selectedCategories: [], 
         currentQuestions: [],
+        sessionId: null,
         currentQuestionIndex: 0, 
         userAnswers: {}, 
         score: 0,